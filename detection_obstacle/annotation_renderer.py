@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from detection_set import DetectionSet
+
+# ---------------------------------------------------------
+# RENDU DES ANNOTATIONS (boîtes, étiquettes, tableau de bord)
+# ---------------------------------------------------------
+# Même rendu que l'ancien annotate_frame, pixel pour pixel, mais:
+#  - les étiquettes (texte + fond coloré) sont rendues une seule fois par
+#    (texte, couleur) puis copiées à l'aide d'un masque (sprites en cache);
+#  - le tableau de bord est mis en cache par valeur des compteurs;
+#  - le dessin peut se faire sur place (in_place) ou dans un tampon réutilisé
+#    (out), sans allouer une nouvelle image à chaque appel;
+#  - une carte de segmentation peut être superposée en transparence, en un seul
+#    mélange vectorisé (overlay).
+# detector_module.annotate_frame délègue à ce module; annotate_frame_jpeg
+# encode directement le résultat en octets JPEG (aucun accès disque).
+
+LABEL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+LABEL_FONT_SCALE = 0.5
+LABEL_FONT_THICKNESS = 2
+# Marge autour des sprites: le texte Hershey peut déborder du fond coloré
+SPRITE_MARGIN = 12
+# Nombre maximal de sprites d'étiquettes et de tableaux de bord gardés en cache
+MAX_CACHED_LABELS = 1024
+MAX_CACHED_PANELS = 64
+
+# Lignes du tableau de bord: (texte, position, échelle, couleur, épaisseur)
+_PANEL_LINES = (
+    ("Obstacles critiques (P1): {p1}", (20, 30), 0.6, (0, 0, 255), 2),
+    ("Obstacles importants (P2): {p2}", (20, 60), 0.6, (0, 165, 255), 2),
+    ("Obstacles moderes (P3): {p3}", (20, 90), 0.6, (0, 255, 255), 2),
+    ("YOLO: {yolo} | Mapillary: {mapillary}", (20, 130), 0.5, (255, 255, 255), 1),
+)
+_PANEL_BOX = ((10, 10), (350, 150))
+
+
+class _Sprite:
+    """Image pré-rendue et son masque, positionnée par rapport à un point d'ancrage."""
+
+    def __init__(self, image, mask, dx, dy):
+        self.image = image
+        self.mask = mask
+        self.dx = dx # Décalage du coin haut-gauche par rapport à l'ancrage
+        self.dy = dy
+
+    def blit(self, out, x, y):
+        """Copie le sprite dans `out` (découpé aux bords de l'image)."""
+        h, w = self.mask.shape
+        height, width = out.shape[:2]
+        left, top = x + self.dx, y + self.dy
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + w, width), min(top + h, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        sx, sy = x0 - left, y0 - top
+        # cv2.copyTo écrit directement dans la vue de `out` (bien plus rapide qu'un np.copyto masqué)
+        cv2.copyTo(self.image[sy:sy + y1 - y0, sx:sx + x1 - x0],
+                   self.mask[sy:sy + y1 - y0, sx:sx + x1 - x0], out[y0:y1, x0:x1])
+
+
+def _render_sprite(width, height, origin, draw):
+    """Rend `draw(canvas, color_or_none)` sur une image et sur un masque de même taille."""
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    draw(image, None)
+    draw(mask, 255)
+    return _Sprite(image, mask, -origin[0], -origin[1])
+
+
+class AnnotationRenderer:
+    """Rendu des annotations avec sprites d'étiquettes et tableau de bord en cache (thread-safe)."""
+
+    def __init__(self, default_colors):
+        self.default_colors = default_colors # priorité -> couleur BGR
+        self._labels = OrderedDict()
+        self._panels = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Sprites -----------------------------------------------------
+
+    def _cached(self, cache, key, limit, build):
+        with self._lock:
+            sprite = cache.get(key)
+            if sprite is not None:
+                cache.move_to_end(key)
+                return sprite
+        sprite = build()
+        with self._lock:
+            cache[key] = sprite
+            if len(cache) > limit:
+                cache.popitem(last=False)
+        return sprite
+
+    def label_sprite(self, text, color):
+        """Étiquette (fond coloré + texte blanc), ancrée au coin haut-gauche de la boîte."""
+        def build():
+            (text_w, text_h), _ = cv2.getTextSize(text, LABEL_FONT, LABEL_FONT_SCALE, LABEL_FONT_THICKNESS)
+            m = SPRITE_MARGIN
+            # Ancrage (x1, y1) de la boîte placé en (m, m + text_h + 10) dans le sprite
+            ax, ay = m, m + text_h + 10
+
+            def draw(canvas, fill):
+                cv2.rectangle(canvas, (ax, ay - text_h - 10), (ax + text_w + 5, ay), fill or color, -1)
+                cv2.putText(canvas, text, (ax + 2, ay - 5), LABEL_FONT, LABEL_FONT_SCALE,
+                            fill or (255, 255, 255), LABEL_FONT_THICKNESS)
+
+            return _render_sprite(text_w + 6 + 2 * m, text_h + 11 + 2 * m, (ax, ay), draw)
+
+        return self._cached(self._labels, (text, tuple(int(c) for c in color)), MAX_CACHED_LABELS, build)
+
+    def panel_sprite(self, counts):
+        """Tableau de bord des compteurs, ancré en (0, 0) de l'image."""
+        def build():
+            texts = [line[0].format(**counts) for line in _PANEL_LINES]
+            right = max([_PANEL_BOX[1][0]] + [
+                line[1][0] + cv2.getTextSize(text, LABEL_FONT, line[2], line[4])[0][0]
+                for text, line in zip(texts, _PANEL_LINES)
+            ]) + SPRITE_MARGIN
+
+            def draw(canvas, fill):
+                cv2.rectangle(canvas, _PANEL_BOX[0], _PANEL_BOX[1], fill or (0, 0, 0), -1)
+                for text, (_, position, scale, color, thickness) in zip(texts, _PANEL_LINES):
+                    cv2.putText(canvas, text, position, LABEL_FONT, scale, fill or color, thickness)
+
+            return _render_sprite(right, _PANEL_BOX[1][1] + SPRITE_MARGIN, (0, 0), draw)
+
+        return self._cached(self._panels, tuple(sorted(counts.items())), MAX_CACHED_PANELS, build)
+
+    # --- Rendu -------------------------------------------------------
+
+    def render(self, frame, obstacles, overlay=None, overlay_alpha=0.4, out=None, in_place=False):
+        """
+        Dessine les annotations et retourne l'image annotée.
+        - in_place=True: dessine directement dans `frame`;
+        - out: tampon réutilisé (même forme que `frame`), sinon une copie est allouée;
+        - overlay: (carte de segmentation, couleurs par classe (N, 3) uint8, masque par classe (N,) bool).
+        """
+        if in_place:
+            annotated = frame
+        elif out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+            np.copyto(out, frame)
+            annotated = out
+        else:
+            annotated = frame.copy()
+
+        if overlay is not None:
+            blend_segmentation(annotated, *overlay, alpha=overlay_alpha)
+
+        # Colonnes lues une seule fois (DetectionSet; une liste d'obstacles est convertie)
+        detections = DetectionSet.from_obstacles(obstacles)
+        colors = detections.resolved_colors(self.default_colors).tolist()
+        for (x1, y1, x2, y2), name, priority, color in zip(
+                detections.boxes.tolist(), detections.class_names(), detections.priority.tolist(), colors):
+            color = tuple(color)
+            # Épaisseur dépendante de la priorité (P1 = plus visible)
+            thickness = 4 if priority == 1 else (3 if priority == 2 else 2)
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), color, thickness)
+            self.label_sprite(f"{name} P{priority}", color).blit(annotated, x1, y1)
+
+        stats = detections.priority_counts()
+        sources = detections.source_counts()
+        counts = {'p1': int(stats[1]), 'p2': int(stats[2]), 'p3': int(stats[3]),
+                  'yolo': sources['yolo'], 'mapillary': sources['mapillary']}
+        self.panel_sprite(counts).blit(annotated, 0, 0)
+        return annotated
+
+
+def segmentation_palette(id2label, obstacles_config):
+    """Couleurs par identifiant de classe (N, 3) et masque des classes d'obstacles (N,)."""
+    max_id = max((int(class_id) for class_id in id2label), default=0)
+    colors = np.zeros((max_id + 1, 3), dtype=np.uint8)
+    mask = np.zeros(max_id + 1, dtype=bool)
+    for class_id, class_name in id2label.items():
+        if class_name in obstacles_config:
+            colors[int(class_id)] = obstacles_config[class_name]['color']
+            mask[int(class_id)] = True
+    return colors, mask
+
+
+def blend_segmentation(image, seg_map, colors, mask, alpha=0.4):
+    """
+    Superpose en transparence les classes d'obstacles de la carte (sur place, un seul mélange).
+    Couleurs et masque sont lus à la résolution de la carte puis agrandis (plus proche voisin);
+    les identifiants absents de la palette ne sont pas superposés.
+    """
+    height, width = image.shape[:2]
+    seg_map = np.asarray(seg_map)
+    size = max(256, int(seg_map.max()) + 1 if seg_map.size else 0)
+    color_lut = np.zeros((size, 3), dtype=np.uint8)
+    mask_lut = np.zeros(size, dtype=np.uint8)
+    color_lut[:len(colors)] = colors
+    mask_lut[:len(mask)] = np.where(mask, 255, 0)
+
+    if seg_map.dtype == np.uint8:
+        class_colors = cv2.LUT(cv2.merge([seg_map] * 3), color_lut.reshape(256, 1, 3))
+        pixel_mask = cv2.LUT(seg_map, mask_lut)
+    else:
+        class_colors, pixel_mask = color_lut[seg_map], mask_lut[seg_map]
+    if seg_map.shape[:2] != (height, width):
+        class_colors = cv2.resize(class_colors, (width, height), interpolation=cv2.INTER_NEAREST)
+        pixel_mask = cv2.resize(pixel_mask, (width, height), interpolation=cv2.INTER_NEAREST)
+    if not cv2.countNonZero(pixel_mask):
+        return image
+    blended = cv2.addWeighted(image, 1.0 - alpha, class_colors, alpha, 0)
+    cv2.copyTo(blended, pixel_mask, image)
+    return image
@@ -1,10 +1,33 @@
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, Response, jsonify, send_file, send_from_directory, request, stream_with_context
+from werkzeug.utils import secure_filename
 import os
 import cv2
 import json
+import base64
+import hashlib
+import time
+import uuid
+from collections import deque
+from urllib.parse import quote
 
 # Importez vos fonctions clés depuis le module de détection
-from detector_module import detect_obstacles_combined, annotate_frame, export_detections_json
+from detector_module import (
+    detect_obstacles_combined, detect_obstacles_batch, detect_obstacles_progressive, merge_detections,
+    detect_obstacles_transient, cached_detection, annotate_frame, stored_seg_map,
+    build_detections_report, detections_json_path, annotate_frame_jpeg, pack_detections,
+    detection_config_fingerprint, DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, CASCADE_ENABLED, cascade_policy, detection_cache,
+    model_registry, start_model_warmup
+)
+from detection_cache import DetectionCache
+from cascade_policy import FULL
+from image_catalog import ImageCatalog, CATALOG_PAGE_SIZE, CATALOG_MAX_PAGE_SIZE, CATALOG_SORTS, THUMBNAIL_SIZES, THUMBNAIL_DEFAULT_SIZE
+from video_stream import StreamPipeline, SEGMENTATION_INTERVAL
+from inference_pool import PoolBusy
+from job_manager import JobManager, JobQueueFull
+from output_writer import OutputWriter, encode_image, ANNOTATED_JPEG_QUALITY
+from image_decoding import decode_image, MAX_UPLOAD_BYTES
+from detection_set import BINARY_MIMETYPE
+from instrumentation import metrics, stage, trace
 
 # --- Définition des chemins relatifs à app.py ---
 CURRENT_FILE_DIR = os.path.dirname(os.path.abspath(__file__)) 
@@ -12,12 +35,116 @@ BASE_DIR = os.path.dirname(CURRENT_FILE_DIR) # EXAMEN_COMPUTER_VISION
 
 # Chemins de ressources utilisés par l'API
 IMAGES_DIR = os.path.join(BASE_DIR, "ressources", "images")
+VIDEOS_DIR = os.path.join(BASE_DIR, "ressources", "videos")
 OUTPUT_DIR = os.path.join(CURRENT_FILE_DIR, "output")
 ANNOTATED_IMAGES_DIR = os.path.join(OUTPUT_DIR, "annotated_images")
+CATALOG_DIR = os.path.join(OUTPUT_DIR, "catalog") # Index des images et vignettes
 
 # Initialisation de Flask
 app = Flask(__name__, static_folder='.', static_url_path='/')
 
+# Écriture asynchrone des images annotées et des rapports JSON
+output_writer = OutputWriter().start()
+
+# Catalogue des images (pagination, hash des pixels, vignettes en cache)
+catalog = ImageCatalog(IMAGES_DIR, CATALOG_DIR).start()
+
+# Détections asynchrones (POST /api/jobs/detect/<filename>, suivi en SSE ou par interrogation)
+jobs = JobManager().start()
+# Intervalle des commentaires "keepalive" du flux SSE (secondes, évite la coupure par les proxys)
+SSE_KEEPALIVE = 15
+
+# Pipeline vidéo en cours (pour /api/stream/stats)
+current_stream = None
+
+# Pool de processus d'inférence (mode production, voir wsgi.py). None = modèles dans ce processus
+inference_pool = None
+
+def configure_inference_pool(pool):
+    """Active le mode production: les détections sont confiées au pool de processus."""
+    global inference_pool
+    inference_pool = pool
+    jobs.ensure_workers(pool.num_workers) # Une tâche asynchrone par processus d'inférence
+
+def detect_frame(frame, transient=False):
+    """
+    Détection d'une image, dans ce processus ou via le pool d'inférence.
+    transient: image envoyée par le client, dont la carte de segmentation n'est pas stockée.
+    """
+    if inference_pool is not None:
+        return inference_pool.detect(frame, kind='transient' if transient else 'detect')
+    return detect_obstacles_transient(frame) if transient else detect_obstacles_combined(frame)
+
+def detect_frames(frames, batch_size):
+    """Détection de plusieurs images: lots dans ce processus, ou répartition sur le pool."""
+    if inference_pool is not None:
+        # Une tâche 'batch' par lot de batch_size images; au plus un lot par processus en file
+        # (toujours moins que la file du pool): une longue liste ne provoque pas de PoolBusy
+        chunks = [frames[start:start + batch_size] for start in range(0, len(frames), batch_size)]
+        max_in_flight = max(1, min(inference_pool.num_workers, inference_pool.queue_size - 1))
+        pending, results = deque(), []
+        try:
+            for chunk in chunks:
+                if len(pending) >= max_in_flight:
+                    results += inference_pool.wait(pending.popleft())
+                pending.append(inference_pool.submit(chunk, kind='batch'))
+            while pending:
+                results += inference_pool.wait(pending.popleft())
+        except BaseException:
+            for future in pending:
+                future.cancel() # Résultats ignorés s'ils arrivent plus tard
+            raise
+        return results
+    return detect_obstacles_batch(frames, batch_size=batch_size)
+
+def detect_frame_progressive(frame, on_yolo):
+    """
+    Détection d'une image; on_yolo(obstacles YOLO) est appelé avant la fin de la segmentation.
+    En cas de résultat en cache, on_yolo n'est pas appelé (comme detect_obstacles_progressive).
+    """
+    if inference_pool is None:
+        return detect_obstacles_progressive(frame, on_yolo)
+    
+    # YOLO et la segmentation sont des tâches séparées du pool: le cache (partagé sur disque avec
+    # les processus d'inférence) est consulté ici avant de les répartir, et alimenté après la fusion
+    cache_key, cached = cached_detection(frame, all_models_loaded=True)
+    if cached is not None:
+        return cached
+    
+    if CASCADE_ENABLED:
+        # Cascade: la segmentation est décidée d'après les résultats YOLO (tâche 'cascade')
+        start = time.perf_counter()
+        yolo_obs = inference_pool.wait(inference_pool.submit(frame, kind='yolo'))
+        yolo_ms = (time.perf_counter() - start) * 1000
+        on_yolo(yolo_obs)
+        cascade_future = inference_pool.submit((frame, yolo_obs, yolo_ms), kind='cascade')
+        mapillary_obs, decision = inference_pool.wait(cascade_future)
+        merged_obs = merge_detections(yolo_obs, mapillary_obs)
+        if decision['path'] != FULL:
+            return merged_obs # Segmentation réduite, reprise ou sautée: résultat non mis en cache
+    else:
+        yolo_future = inference_pool.submit(frame, kind='yolo')
+        mapillary_future = inference_pool.submit(frame, kind='mapillary')
+        try:
+            yolo_obs = inference_pool.wait(yolo_future)
+            on_yolo(yolo_obs)
+        except BaseException:
+            mapillary_future.cancel() # Résultat ignoré s'il arrive plus tard
+            raise
+        merged_obs = merge_detections(yolo_obs, inference_pool.wait(mapillary_future))
+    
+    if cache_key is not None:
+        detection_cache.put(cache_key, merged_obs)
+    return merged_obs
+
+def pool_error_response(e):
+    """Réponse HTTP pour une détection refusée (file pleine) ou trop longue."""
+    if isinstance(e, PoolBusy):
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return jsonify({'error': f'Délai de détection dépassé: {e}'}), 504
+
 # --- Routes Flask ---
 
 @app.route('/')
@@ -25,31 +152,108 @@ def index():
     """Route principale pour servir la nouvelle interface holographique"""
     return send_from_directory(CURRENT_FILE_DIR, 'holographic_viewer.html')
 
+@app.route('/api/health', methods=['GET'])
+def health():
+    """État du serveur et de chaque modèle (pending / loading / ready / failed)."""
+    models = model_registry.status()
+    states = [m['state'] for m in models.values()]
+    if all(state == 'ready' for state in states):
+        status = 'ok'
+    elif any(state in ('pending', 'loading') for state in states):
+        status = 'loading'
+    else:
+        status = 'degraded'
+    if inference_pool is not None:
+        # Mode production: les modèles vivent dans les processus du pool
+        pool = inference_pool.stats()
+        status = 'ok' if pool['workers_ready'] == pool['workers'] else ('loading' if pool['workers_alive'] else 'degraded')
+        return jsonify({'status': status, 'pool': pool})
+    return jsonify({'status': status, 'models': models})
+
 @app.route('/api/images', methods=['GET'])
 def list_images():
-    """Liste les images disponibles pour le panneau de sélection."""
+    """
+    Liste paginée des images pour le panneau de sélection (catalogue indexé, voir image_catalog.py).
+    Options: ?offset=0&limit=100, &q=<texte du nom>, &sort=natural|name|mtime, &order=desc,
+    &cached=1|0 (images avec / sans résultat de détection en cache).
+    Réponse avec ETag: If-None-Match renvoie 304 si la page n'a pas changé.
+    """
     try:
-        # Lister TOUS les fichiers du dossier
-        all_files = os.listdir(IMAGES_DIR)
-        print(f"[DEBUG] Tous les fichiers trouvés: {all_files}")
-        
-        # Filtrer les images
-        image_files = [f for f in all_files 
-                       if f.lower().endswith((".jpg", ".png", ".jpeg"))]
-        
-        print(f"[DEBUG] Images filtrées ({len(image_files)}): {image_files}")
-        
-        return jsonify({'images': image_files})
-    except Exception as e:
-        print(f"[ERREUR] Liste des images: {e}")
-        return jsonify({'error': f'Erreur lors de la liste des images: {e}'}), 500
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Les paramètres "offset" et "limit" doivent être des entiers'}), 400
+    if offset < 0 or not 0 < limit <= CATALOG_MAX_PAGE_SIZE:
+        return jsonify({'error': f'"offset" doit être positif et "limit" compris entre 1 et {CATALOG_MAX_PAGE_SIZE}'}), 400
+    sort = request.args.get('sort', 'natural')
+    if sort not in CATALOG_SORTS:
+        return jsonify({'error': f'Le paramètre "sort" doit valoir: {", ".join(CATALOG_SORTS)}'}), 400
+    cached = request.args.get('cached')
+    if cached is not None:
+        cached = cached.lower() in ('1', 'true', 'yes')
+    
+    # Empreinte avec les deux modèles chargés: ceux des processus d'inférence (ou de ce processus après le
+    # préchauffage). Clés du cache relues une fois par requête (dossier relu seulement s'il a changé), pas
+    # un accès disque par image. La version est lue avant les clés: une écriture entre les deux invalide
+    # la requête suivante
+    fingerprint = detection_config_fingerprint(all_models_loaded=True)
+    cache_version = detection_cache.disk_version()
+    cached_keys = detection_cache.cached_keys()
+    page = catalog.query(
+        offset=offset, limit=limit, search=request.args.get('q'), sort=sort,
+        descending=request.args.get('order') == 'desc', cached=cached,
+        is_cached=lambda frame_hash: DetectionCache.key_for_hash(frame_hash, fingerprint) in cached_keys,
+        cached_version=(fingerprint, cache_version, len(cached_keys)) if cache_version is not None else None
+    )
+    for item in page['items']:
+        # La version (taille et date du fichier) dans l'URL permet une mise en cache longue par le navigateur
+        version = f"{item['size']:x}{int(item['mtime'] * 1000):x}"
+        item['thumbnail_url'] = f"/api/images/{quote(item['name'])}/thumbnail?v={version}"
+    page['images'] = [item['name'] for item in page['items']]
+    
+    body = json.dumps(page)
+    response = Response(body, mimetype='application/json')
+    response.set_etag(hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache' # Revalidation à chaque fois (304 si inchangée)
+    return response.make_conditional(request)
+
+
+@app.route('/api/images/<filename>/thumbnail', methods=['GET'])
+def image_thumbnail(filename):
+    """Vignette JPEG de l'image (?size=128|256|512, plus grand côté), créée à la première demande."""
+    try:
+        size = int(request.args.get('size', THUMBNAIL_DEFAULT_SIZE))
+    except ValueError:
+        size = 0
+    if size not in THUMBNAIL_SIZES:
+        return jsonify({'error': f'Le paramètre "size" doit valoir: {", ".join(map(str, THUMBNAIL_SIZES))}'}), 400
+    try:
+        path = catalog.thumbnail(filename, size)
+    except FileNotFoundError:
+        return jsonify({'error': f'Image source non trouvée: {filename}'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 422
+    return send_file(path, mimetype='image/jpeg', conditional=True, max_age=86400)
+
+
+@app.route('/api/images/stats', methods=['GET'])
+def images_stats():
+    """Compteurs du catalogue (images indexées, hash en attente, vignettes créées / servies)."""
+    return jsonify(catalog.stats())
 
 
 @app.route('/api/detect/<filename>', methods=['POST'])
 def run_detection(filename):
     """
-    Déclenche la détection, sauvegarde l'image annotée et retourne les données JSON.
+    Déclenche la détection et retourne les données JSON; l'image annotée et le JSON
+    sont sauvegardés en arrière-plan. Options: ?image=url|base64|multipart, &persist=0,
+    &format=binary (détections au format binaire compact, voir detection_set.py).
     """
+    try:
+        image_mode, persist, overlay = output_options()
+        response_format, image_mode = output_format(image_mode)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     image_path_full = os.path.join(IMAGES_DIR, filename)
     if not os.path.exists(image_path_full):
@@ -57,51 +261,623 @@ def run_detection(filename):
 
     print(f"[API] Lancement de la détection pour {filename}...")
     
-    # 1. Lire l'image
-    frame = cv2.imread(image_path_full)
-    if frame is None:
-        return jsonify({'error': 'Erreur de lecture de l\'image (OpenCV)'}), 500
+    # Mesures par étape de cette détection (bloc "timings" de la réponse)
+    with trace() as timings:
+        # 1. Lire l'image
+        with stage("image_decode"):
+            frame = cv2.imread(image_path_full)
+        if frame is None:
+            return jsonify({'error': 'Erreur de lecture de l\'image (OpenCV)'}), 500
+        
+        # 2. Effectuer la détection
+        try:
+            obstacles = detect_frame(frame) 
+        except (PoolBusy, TimeoutError) as e:
+            return pool_error_response(e)
+        except Exception as e:
+            print(f"[ERREUR] Échec de la détection: {e}")
+            return jsonify({'error': f'Échec de la détection du modèle: {e}'}), 500
+        
+        # 3. Construction de la réponse (sauvegarde planifiée en arrière-plan)
+        try:
+            json_data, image_bytes = save_detection_outputs(filename, frame, obstacles, image_mode, persist, overlay,
+                                                            report=response_format == 'json' or persist)
+        except Exception as e:
+            return jsonify({'error': f'Erreur de préparation de la réponse: {e}'}), 500
+    
+    json_data['timings'] = timings.as_dict()
+    json_data.update(timings.notes) # Chemin de la cascade
+    
+    if response_format == 'binary':
+        return binary_response(obstacles, json_data)
+    if image_mode == 'multipart':
+        return multipart_response(json_data, image_bytes, filename)
+    return jsonify(json_data)
+
+
+@app.route('/api/detect', methods=['POST'])
+def detect_upload():
+    """
+    Détection sur une image envoyée dans le corps de la requête (octets JPEG/PNG bruts,
+    pas de formulaire multipart), décodée en mémoire sans fichier temporaire.
+    Options: ?max_side=N (réduction au décodage), &name=<nom de l'image>, et les options
+    de sortie de /api/detect/<filename> (rien n'est écrit sur disque sauf &persist=1).
+    Les boîtes sont en coordonnées de l'image traitée: diviser par "scale" pour revenir à l'originale.
+    """
+    try:
+        image_mode, persist, overlay = output_options(default_persist=False, default_image='none')
+        response_format, image_mode = output_format(image_mode)
+        max_side = upload_max_side()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    too_large = jsonify({'error': f'Image trop volumineuse (maximum {MAX_UPLOAD_BYTES} octets)'}), 413
+    if request.content_length is not None and request.content_length > MAX_UPLOAD_BYTES:
+        return too_large
+    # Lecture bornée: un corps sans Content-Length (Transfer-Encoding: chunked) n'est pas lu au-delà de la limite
+    data = read_exact(request.stream, MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        return too_large
+    
+    filename = upload_filename(request.args.get('name'))
+    
+    with trace() as timings:
+        try:
+            frame, size_info = decode_upload(data, max_side)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            # Carte de segmentation stockée seulement si elle doit être superposée (&overlay=1)
+            obstacles = detect_frame(frame, transient=not overlay)
+        except (PoolBusy, TimeoutError) as e:
+            return pool_error_response(e)
+        except Exception as e:
+            print(f"[ERREUR] Échec de la détection: {e}")
+            return jsonify({'error': f'Échec de la détection du modèle: {e}'}), 500
+        
+        try:
+            json_data, image_bytes = save_detection_outputs(filename, frame, obstacles, image_mode, persist, overlay,
+                                                            report=response_format == 'json' or persist)
+        except Exception as e:
+            return jsonify({'error': f'Erreur de préparation de la réponse: {e}'}), 500
+    
+    json_data.update(size_info)
+    json_data['timings'] = timings.as_dict()
+    json_data.update(timings.notes)
+    
+    if response_format == 'binary':
+        return binary_response(obstacles, json_data)
+    if image_mode == 'multipart':
+        return multipart_response(json_data, image_bytes, filename)
+    return jsonify(json_data)
+
+
+@app.route('/api/detect_stream', methods=['POST'])
+def detect_stream():
+    """
+    Plusieurs images sur une seule connexion: le corps est une suite de trames
+    [longueur sur 4 octets big-endian][octets JPEG/PNG], terminée par une longueur 0
+    ou par la fin du corps (envoi en Transfer-Encoding: chunked). Chaque résultat est
+    renvoyé dès que l'image est traitée, une ligne JSON par image (application/x-ndjson).
+    Options: ?max_side=N, &image=none|base64 (image annotée JPEG en base64). Rien n'est écrit sur disque.
+    Avec &format=binary, chaque résultat est une trame [longueur sur 4 octets big-endian]
+    [détections au format binaire compact, ou objet JSON {"frame", "error"} en cas d'erreur].
+    """
+    try:
+        max_side = upload_max_side()
+        response_format, image_mode = output_format(request.args.get('image', 'none'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if image_mode not in ('none', 'base64'):
+        return jsonify({'error': 'Le paramètre "image" doit valoir: none, base64'}), 400
+    
+    def encode(result):
+        if response_format == 'json':
+            return json.dumps(result) + '\n'
+        payload = result if isinstance(result, bytes) else json.dumps(result).encode('utf-8')
+        return len(payload).to_bytes(4, 'big') + payload
+    
+    def generate():
+        stream = request.stream
+        index = 0
+        while True:
+            header = read_exact(stream, 4)
+            length = int.from_bytes(header, 'big') if len(header) == 4 else 0
+            if length == 0:
+                return
+            if length > MAX_UPLOAD_BYTES:
+                yield encode({'frame': index, 'error': f'Trame trop volumineuse (maximum {MAX_UPLOAD_BYTES} octets)'})
+                return
+            data = read_exact(stream, length)
+            if len(data) < length:
+                yield encode({'frame': index, 'error': 'Trame incomplète (fin du corps de requête)'})
+                return
+            yield encode(detect_stream_frame(index, data, max_side, image_mode, response_format))
+            index += 1
+    
+    mimetype = 'application/x-ndjson' if response_format == 'json' else BINARY_MIMETYPE
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={'X-Accel-Buffering': 'no'})
+
+
+def detect_stream_frame(index, data, max_side, image_mode, response_format='json'):
+    """
+    Résultat d'une trame de /api/detect_stream (les erreurs n'interrompent pas le flux):
+    dictionnaire JSON, ou octets au format binaire compact avec response_format='binary'.
+    """
+    with trace() as timings:
+        try:
+            frame, size_info = decode_upload(data, max_side)
+            obstacles = detect_frame(frame, transient=True)
+        except (ValueError, PoolBusy, TimeoutError) as e:
+            return {'frame': index, 'error': str(e)}
+        except Exception as e:
+            print(f"[ERREUR] Échec de la détection (trame {index}): {e}")
+            return {'frame': index, 'error': f'Échec de la détection du modèle: {e}'}
+        if response_format == 'binary':
+            return pack_detections(obstacles)
+        result = build_detections_report(f"frame_{index}.jpg", obstacles)
+        if image_mode == 'base64':
+            jpeg = annotate_frame_jpeg(frame, obstacles, quality=ANNOTATED_JPEG_QUALITY)
+            result['image_base64'] = base64.b64encode(jpeg).decode('ascii')
+            result['image_mimetype'] = 'image/jpeg'
+    result.update(size_info)
+    result['frame'] = index
+    result['timings'] = timings.as_dict()
+    result.update(timings.notes)
+    return result
+
+
+def decode_upload(data, max_side):
+    """Décode les octets reçus; retourne (image, tailles d'origine / traitée et facteur d'échelle)."""
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise ValueError(f'Image trop volumineuse (maximum {MAX_UPLOAD_BYTES} octets)')
+    with stage("image_decode"):
+        frame, (width, height) = decode_image(data, max_side)
+    processed_h, processed_w = frame.shape[:2]
+    return frame, {
+        'image_size': [width, height],
+        'processed_size': [processed_w, processed_h],
+        'scale': processed_w / width
+    }
+
+
+def upload_max_side():
+    """Paramètre ?max_side (plus grand côté après décodage), None par défaut."""
+    value = request.args.get('max_side')
+    if value is None:
+        return None
+    try:
+        max_side = int(value)
+    except ValueError:
+        max_side = 0
+    if max_side <= 0:
+        raise ValueError('Le paramètre "max_side" doit être un entier positif')
+    return max_side
+
+
+def upload_filename(name):
+    """Nom de l'image envoyée (rapport et fichiers de sortie), généré si absent."""
+    name = secure_filename(name or '')
+    if not name:
+        return f"upload_{uuid.uuid4().hex[:12]}.jpg"
+    if not name.lower().endswith(('.jpg', '.jpeg', '.png')):
+        name += '.jpg'
+    return name
+
+
+def read_exact(stream, size):
+    """Lit exactement `size` octets du flux (moins si le corps se termine avant)."""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+@app.route('/api/detect_batch', methods=['POST'])
+def run_detection_batch():
+    """
+    Détection par lots sur plusieurs images (un passage de chaque modèle par lot).
+    Corps JSON attendu: {"filenames": ["image1.jpg", ...], "batch_size": 4} (batch_size borné à MAX_BATCH_SIZE)
+    Options: ?image=url|base64, &persist=0 (voir run_detection).
+    """
+    try:
+        image_mode, persist, overlay = output_options(allow_multipart=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    payload = request.get_json(silent=True) or {}
+    filenames = payload.get('filenames')
+    if not isinstance(filenames, list) or not filenames:
+        return jsonify({'error': 'Le champ "filenames" (liste non vide) est requis'}), 400
     
-    # 2. Effectuer la détection
     try:
-        obstacles = detect_obstacles_combined(frame) 
-    except Exception as e:
-        print(f"[ERREUR] Échec de la détection: {e}")
-        return jsonify({'error': f'Échec de la détection du modèle: {e}'}), 500
+        batch_size = int(payload.get('batch_size', DEFAULT_BATCH_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Le champ "batch_size" doit être un entier'}), 400
+    # Un lot trop grand ferait passer toutes les images dans un seul passage Mask2Former
+    batch_size = min(max(1, batch_size), MAX_BATCH_SIZE)
+    
+    # Mesures par étape de tout le lot (bloc "timings" de la réponse)
+    with trace() as timings:
+        # 1. Lire les images (les fichiers manquants ou illisibles sont signalés individuellement)
+        frames, valid_names, errors = [], [], {}
+        for filename in filenames:
+            # Seuls les noms de fichiers simples du dossier d'images sont acceptés
+            if not isinstance(filename, str) or os.path.basename(filename) != filename:
+                errors[str(filename)] = 'Nom de fichier invalide'
+                continue
+            image_path_full = os.path.join(IMAGES_DIR, filename)
+            with stage("image_decode"):
+                frame = cv2.imread(image_path_full) if os.path.exists(image_path_full) else None
+            if frame is None:
+                errors[filename] = 'Image source non trouvée ou illisible'
+                continue
+            frames.append(frame)
+            valid_names.append(filename)
+        
+        print(f"[API] Détection par lots pour {len(valid_names)} image(s) (batch_size={batch_size})...")
+        
+        # 2. Effectuer la détection par lots
+        try:
+            all_obstacles = detect_frames(frames, batch_size)
+        except (PoolBusy, TimeoutError) as e:
+            return pool_error_response(e)
+        except Exception as e:
+            print(f"[ERREUR] Échec de la détection par lots: {e}")
+            return jsonify({'error': f'Échec de la détection du modèle: {e}'}), 500
+        
+        # 3. Construction des réponses par image (sauvegarde planifiée en arrière-plan)
+        results = []
+        for filename, frame, obstacles in zip(valid_names, frames, all_obstacles):
+            try:
+                results.append(save_detection_outputs(filename, frame, obstacles, image_mode, persist, overlay)[0])
+            except Exception as e:
+                errors[filename] = f'Erreur de préparation de la réponse: {e}'
+    
+    return jsonify({'results': results, 'errors': errors, 'timings': timings.as_dict()})
+
 
-    # 3. Annotation et Sauvegarde de l'image annotée
-    output_frame = annotate_frame(frame, obstacles)
+def save_detection_outputs(filename, frame, obstacles, image_mode='url', persist=True, overlay=False, report=True):
+    """
+    Construit en mémoire les données pour le frontend et planifie la sauvegarde de
+    l'image annotée et du JSON (écriture asynchrone, hors du chemin de la requête).
+    Avec overlay, la carte de segmentation stockée (si elle existe) est superposée.
+    report=False: rapport non construit (réponse binaire sans sauvegarde du JSON).
+    Retourne (données JSON, image annotée encodée ou None).
+    """
+    report = build_detections_report(filename, obstacles) if report else {}
     annotated_filename = f"annotated_{filename}"
     output_image_path = os.path.join(ANNOTATED_IMAGES_DIR, annotated_filename)
     
-    # Sauvegarde
-    if filename.lower().endswith(('.jpg', '.jpeg')):
-        cv2.imwrite(output_image_path, output_frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    stored = stored_seg_map(frame) if overlay else None
+    def annotate(f):
+        if stored is None:
+            return annotate_frame(f, obstacles)
+        return annotate_frame(f, obstacles, seg_map=stored[0], id2label=stored[1])
+    
+    # L'image n'est encodée dans la requête que si elle est renvoyée directement
+    image_bytes = None
+    if image_mode in ('base64', 'multipart'):
+        image_bytes = encode_image(filename, annotate(frame))
+    
+    # Sauvegarde asynchrone (annotation et encodage dans le thread d'écriture si besoin)
+    if persist:
+        if image_bytes is not None:
+            output_writer.submit(output_image_path, lambda data=image_bytes: data)
+        else:
+            output_writer.submit_image(output_image_path, frame, annotate)
+        output_writer.submit_json(detections_json_path(filename), report)
+    
+    # Ajouter l'URL de l'image annotée et les modèles utilisés pour le frontend
+    json_data = dict(report) # Le rapport est sérialisé plus tard par le thread d'écriture
+    if persist:
+        json_data['image_url'] = f'/output/annotated_images/{annotated_filename}'
+    if image_mode == 'base64':
+        mimetype = 'image/jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'image/png'
+        json_data['image_base64'] = base64.b64encode(image_bytes).decode('ascii')
+        json_data['image_mimetype'] = mimetype
+    if inference_pool is not None:
+        # Les modèles sont chargés dans les processus du pool, pas dans ce processus
+        workers_ready = inference_pool.stats()['workers_ready'] > 0
+        json_data['models_ready'] = {name: workers_ready for name in model_registry.status()}
     else:
-        cv2.imwrite(output_image_path, output_frame)
+        json_data['models_ready'] = {name: m['state'] == 'ready' for name, m in model_registry.status().items()}
+    
+    print(f"[API] Détection terminée: {filename} ({len(obstacles)} obstacle(s))")
+    
+    return json_data, image_bytes
+
+
+def output_format(image_mode):
+    """
+    Format de la réponse: ?format=json (défaut) | binary. Le format binaire ne contient
+    que les détections: l'image n'est jamais renvoyée dans la réponse (image=url|none).
+    Retourne (format, image_mode) ou lève ValueError.
+    """
+    response_format = request.args.get('format', 'json')
+    if response_format not in ('json', 'binary'):
+        raise ValueError('Le paramètre "format" doit valoir: json, binary')
+    if response_format == 'binary':
+        if request.args.get('image') in ('base64', 'multipart'):
+            raise ValueError('format=binary ne renvoie pas l\'image: utiliser image=url ou image=none')
+        if image_mode == 'base64':
+            image_mode = 'none' # Sans sauvegarde, l'image n'est pas produite
+    return response_format, image_mode
+
+
+def binary_response(obstacles, json_data):
+    """
+    Détections au format binaire compact (application/x-navsight-detections); les
+    métadonnées de la réponse JSON (URL de l'image, tailles, mesures) passent en en-têtes.
+    """
+    headers = {'X-Detection-Count': str(len(obstacles)), 'X-Timings': json.dumps(json_data['timings'])}
+    if 'cascade' in json_data:
+        headers['X-Cascade'] = json.dumps(json_data['cascade'])
+    if 'image_url' in json_data:
+        headers['X-Image-Url'] = json_data['image_url']
+    if 'scale' in json_data:
+        headers['X-Image-Size'] = 'x'.join(map(str, json_data['image_size']))
+        headers['X-Processed-Size'] = 'x'.join(map(str, json_data['processed_size']))
+        headers['X-Scale'] = str(json_data['scale'])
+    return Response(pack_detections(obstacles), mimetype=BINARY_MIMETYPE, headers=headers)
+
+
+def output_options(allow_multipart=True, default_persist=True, default_image='url'):
+    """
+    Options de sortie des routes de détection (paramètres de requête):
+    ?image=url (défaut) | base64 | multipart | none (JSON seul), &persist=0 pour ne rien
+    écrire sur disque, &overlay=1 pour superposer la carte de segmentation à l'image annotée.
+    Retourne (image_mode, persist, overlay) ou lève ValueError.
+    """
+    image_mode = request.args.get('image', default_image)
+    allowed = ('url', 'base64', 'multipart', 'none') if allow_multipart else ('url', 'base64', 'none')
+    if image_mode not in allowed:
+        raise ValueError(f'Le paramètre "image" doit valoir: {", ".join(allowed)}')
+    persist = request.args.get('persist', '1' if default_persist else '0').lower() not in ('0', 'false', 'no')
+    if not persist and image_mode == 'url':
+        image_mode = 'base64' # Sans sauvegarde, l'image ne peut être renvoyée que directement
+    overlay = request.args.get('overlay', '0').lower() in ('1', 'true', 'yes')
+    return image_mode, persist, overlay
+
+
+def multipart_response(json_data, image_bytes, filename):
+    """Réponse multipart/mixed: le JSON des détections puis l'image annotée."""
+    boundary = f"detection-{uuid.uuid4().hex}"
+    mimetype = 'image/jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'image/png'
+    body = b''.join([
+        f'--{boundary}\r\nContent-Type: application/json\r\n\r\n'.encode('ascii'),
+        json.dumps(json_data).encode('utf-8'),
+        f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+        f'Content-Disposition: inline; filename="annotated_{filename}"\r\n\r\n'.encode('utf-8'),
+        image_bytes,
+        f'\r\n--{boundary}--\r\n'.encode('ascii')
+    ])
+    return Response(body, mimetype=f'multipart/mixed; boundary={boundary}')
+
+
+@app.route('/api/jobs/detect/<filename>', methods=['POST'])
+def submit_detection_job(filename):
+    """
+    Crée une tâche de détection asynchrone et répond immédiatement (202) avec son
+    identifiant. Une tâche identique encore en cours est réutilisée (deduplicated).
+    Mêmes options que /api/detect/<filename> (sauf multipart): ?image=url|base64, &persist=0, &overlay=1.
+    """
+    try:
+        image_mode, persist, overlay = output_options(allow_multipart=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    image_path_full = os.path.join(IMAGES_DIR, filename)
+    if not os.path.exists(image_path_full):
+        return jsonify({'error': f'Image source non trouvée: {filename}'}), 404
+    
+    # Clé de déduplication: même image (contenu inchangé) et mêmes options
+    st = os.stat(image_path_full)
+    key = ('detect', filename, st.st_mtime_ns, st.st_size, image_mode, persist, overlay)
+    try:
+        job, created = jobs.submit(key, detection_job, filename, image_mode, persist, overlay,
+                                   meta={'filename': filename})
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    if created:
+        print(f"[API] Tâche de détection {job.id} créée pour {filename}")
+    return jsonify({
+        'job_id': job.id,
+        'state': job.state,
+        'deduplicated': not created,
+        'status_url': f'/api/jobs/{job.id}',
+        'events_url': f'/api/jobs/{job.id}/events'
+    }), 202
+
 
-    # 4. Exporter les détections en JSON
-    json_path = export_detections_json(filename, obstacles)
+def detection_job(job, filename, image_mode, persist, overlay):
+    """Tâche de détection: progression, détections YOLO (partielles) puis résultat complet."""
+    with trace() as timings:
+        job.progress("image_decode", 0.05)
+        with stage("image_decode"):
+            frame = cv2.imread(os.path.join(IMAGES_DIR, filename))
+        if frame is None:
+            raise ValueError("Erreur de lecture de l'image (OpenCV)")
+        job.raise_if_cancelled()
+        job.progress("yolo", 0.1)
+        
+        def on_yolo(yolo_obstacles):
+            # Point de contrôle avant la segmentation (l'étape la plus longue)
+            job.raise_if_cancelled()
+            partial = build_detections_report(filename, yolo_obstacles)
+            partial['source'] = 'yolo'
+            job.publish_partial(partial)
+            job.progress("mapillary", 0.4)
+        
+        obstacles = detect_frame_progressive(frame, on_yolo)
+        job.raise_if_cancelled()
+        job.progress("outputs", 0.9)
+        json_data, _ = save_detection_outputs(filename, frame, obstacles, image_mode, persist, overlay)
     
-    # 5. Lire et retourner le contenu du fichier JSON
+    json_data['timings'] = timings.as_dict()
+    json_data.update(timings.notes)
+    return json_data
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """État d'une tâche (interrogation périodique); ?after=<id> ajoute les événements suivants."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Tâche inconnue: {job_id}'}), 404
+    return jsonify(job.snapshot(include_events_after=request.args.get('after', type=int)))
+
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Annule une tâche (immédiat si elle est en file, au prochain point de contrôle sinon)."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'error': f'Tâche inconnue: {job_id}'}), 404
+    return jsonify({'job_id': job.id, 'state': job.state, 'cancel_requested': job.cancel_requested})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Événements d'une tâche en Server-Sent Events: queued, running, progress, partial,
+    puis result, failed ou cancelled (le flux se termine ensuite). Reprise après
+    coupure via l'en-tête Last-Event-ID (envoyé par EventSource) ou ?after=<id>.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': f'Tâche inconnue: {job_id}'}), 404
     try:
-        with open(json_path, 'r') as f:
-            json_data = json.load(f)
-    except Exception as e:
-        return jsonify({'error': f'Erreur de lecture du JSON: {e}'}), 500
+        last_id = int(request.headers.get('Last-Event-ID', request.args.get('after', -1)))
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID / "after" doit être un entier'}), 400
     
-    # Ajouter l'URL de l'image annotée pour le frontend
-    json_data['image_url'] = f'/output/annotated_images/{annotated_filename}'
+    def generate():
+        last = last_id
+        yield 'retry: 2000\n\n'
+        while True:
+            events = job.events_after(last, timeout=SSE_KEEPALIVE)
+            if not events:
+                if job.finished:
+                    return
+                yield ': keepalive\n\n'
+                continue
+            for event in events:
+                last = event['id']
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
     
-    print(f"[API] Détection terminée. Image annotée: {output_image_path}")
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/jobs/stats', methods=['GET'])
+def job_stats():
+    """Compteurs des tâches asynchrones (créées, dédupliquées, refusées, annulées...)."""
+    return jsonify(jobs.stats())
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_detection():
+    """
+    Détection en flux servie en MJPEG (multipart/x-mixed-replace).
+    Paramètres: ?video=<fichier de ressources/videos> ou ?camera=<index webcam>,
+    &seg_interval=N (Mask2Former toutes les N images), &stride=K (1 image sur K).
+    """
+    global current_stream
     
-    return jsonify(json_data)
+    video = request.args.get('video')
+    camera = request.args.get('camera')
+    if video:
+        if os.path.basename(video) != video or not os.path.exists(os.path.join(VIDEOS_DIR, video)):
+            return jsonify({'error': f'Vidéo source non trouvée: {video}'}), 404
+        source = os.path.join(VIDEOS_DIR, video)
+    elif camera is not None:
+        try:
+            source = int(camera)
+        except ValueError:
+            return jsonify({'error': 'Le paramètre "camera" doit être un entier'}), 400
+    else:
+        return jsonify({'error': 'Paramètre "video" ou "camera" requis'}), 400
+    
+    try:
+        seg_interval = int(request.args.get('seg_interval', SEGMENTATION_INTERVAL))
+        stride = int(request.args.get('stride', 1))
+    except ValueError:
+        return jsonify({'error': 'Les paramètres "seg_interval" et "stride" doivent être des entiers'}), 400
+    
+    if current_stream is not None:
+        current_stream.stop()
+    pipeline = StreamPipeline(source, segmentation_interval=seg_interval, frame_stride=stride).start()
+    current_stream = pipeline
+    print(f"[API] Flux vidéo démarré: {source}")
+    
+    def generate():
+        for jpeg, _ in pipeline.results():
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+    
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@app.route('/api/stream/stats', methods=['GET'])
+def stream_stats():
+    """FPS soutenu et latence de bout en bout du flux vidéo en cours."""
+    if current_stream is None:
+        return jsonify({'error': 'Aucun flux vidéo démarré'}), 404
+    return jsonify(current_stream.stats())
+
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Mesures par étape (temps réel, temps CPU) et pic mémoire, au format texte Prometheus."""
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/pool/stats', methods=['GET'])
+def pool_stats():
+    """État du pool d'inférence (mode production uniquement)."""
+    if inference_pool is None:
+        return jsonify({'error': 'Pool d\'inférence inactif (mode développement)'}), 404
+    return jsonify(inference_pool.stats())
+
+
+@app.route('/api/output/stats', methods=['GET'])
+def output_stats():
+    """Compteurs du thread d'écriture des sorties (écrits, lots, en attente)."""
+    return jsonify(output_writer.stats())
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Compteurs du cache de résultats (hits mémoire/disque, misses, évictions)."""
+    return jsonify(detection_cache.get_stats())
+
+
+@app.route('/api/cascade/stats', methods=['GET'])
+def cascade_stats():
+    """Chemins suivis par la cascade et durées de segmentation estimées (ce processus uniquement)."""
+    return jsonify({'enabled': CASCADE_ENABLED, **cascade_policy.stats()})
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+def cache_clear():
+    """Vide le cache de résultats (mémoire et disque)."""
+    detection_cache.clear()
+    return jsonify(detection_cache.get_stats())
 
 
 # Route pour servir les fichiers des dossiers de sortie (images annotées, JSON)
 @app.route('/output/<path:filepath>')
 def serve_output_file(filepath):
     """Permet au frontend d'accéder aux images annotées."""
+    # Un fichier encore en file d'écriture est attendu plutôt que renvoyé en 404
+    output_writer.wait_for(os.path.join(OUTPUT_DIR, os.path.normpath(filepath)), timeout=10)
     return send_from_directory(OUTPUT_DIR, filepath)
 
 # Route pour servir les modèles 3D
@@ -130,4 +906,11 @@ if __name__ == '__main__':
     print("SERVEUR FLASK DÉMARRÉ")
     print("Accédez à l'interface holographique sur: http://127.0.0.1:5000")
     print("="*50 + "\n")
-    app.run(debug=True, host='0.0.0.0', port=5000, threaded=False)
\ No newline at end of file
+    # Préchauffage des modèles en arrière-plan: le serveur répond immédiatement.
+    # Avec le reloader de debug, seul le processus enfant (WERKZEUG_RUN_MAIN) charge les modèles.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_model_warmup()
+    # Serveur multi-thread: le flux MJPEG (/api/stream) et les flux SSE des tâches restent ouverts
+    # pendant les autres requêtes (/api/stream/stats, /api/images...). Les détections des différents
+    # threads se partagent les modèles de ce processus: chaque modèle traite un appel à la fois
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
\ No newline at end of file
@@ -292,43 +292,75 @@
             osc.stop(audioContext.currentTime + duration / 1000);
         }
 
+        // Liste des images paginée (le serveur trie et indexe: voir /api/images)
+        const IMAGE_PAGE_SIZE = 100;
+        let imageListOffset = 0;
+        let imageListTotal = null;
+        let imageListLoading = false;
+
         async function fetchImageList() {
+            if (imageListLoading || (imageListTotal !== null && imageListOffset >= imageListTotal)) return;
+            imageListLoading = true;
             try {
-                const response = await fetch('/api/images');
+                const response = await fetch(`/api/images?offset=${imageListOffset}&limit=${IMAGE_PAGE_SIZE}`);
                 const data = await response.json();
-                displayImageList(data.images);
+                imageListTotal = data.total;
+                imageListOffset += data.items.length;
+                displayImageList(data.items);
             } catch (error) {
                 console.error('Erreur chargement images:', error);
-                document.getElementById('loading-images').textContent = '⚠ Erreur de connexion';
+                const loadingDiv = document.getElementById('loading-images');
+                if (loadingDiv) loadingDiv.textContent = '⚠ Erreur de connexion';
+            } finally {
+                imageListLoading = false;
             }
         }
 
-        function displayImageList(images) {
+        function displayImageList(items) {
             const container = document.getElementById('image-list');
             const loadingDiv = document.getElementById('loading-images');
             
-            if (images.length === 0) {
+            if (imageListTotal === 0) {
                 loadingDiv.textContent = 'Aucune image trouvée';
                 return;
             }
             
-            loadingDiv.remove();
-            
-            images.sort((a, b) => {
-                const numA = parseInt(a.match(/\d+/)?.[0] || 0);
-                const numB = parseInt(b.match(/\d+/)?.[0] || 0);
-                return numA - numB;
-            });
+            if (loadingDiv) loadingDiv.remove();
             
-            images.forEach((filename) => {
+            items.forEach((item) => {
                 const btn = document.createElement('button');
                 btn.className = 'file-button';
-                btn.textContent = `▸ ${filename}`;
-                btn.onclick = () => scanImage(filename);
+                // Vignette réduite côté serveur, chargée seulement quand le bouton devient visible
+                const thumb = document.createElement('img');
+                thumb.className = 'file-thumbnail';
+                thumb.loading = 'lazy';
+                thumb.alt = '';
+                thumb.src = item.thumbnail_url;
+                const label = document.createElement('span');
+                label.textContent = `▸ ${item.name}${item.cached ? ' ✓' : ''}`;
+                btn.title = item.width ? `${item.width}x${item.height}` : item.name;
+                btn.append(thumb, label);
+                btn.disabled = currentJobId !== null;
+                btn.onclick = () => scanImage(item.name);
                 container.appendChild(btn);
             });
         }
 
+        // Page suivante chargée à l'approche du bas de la liste
+        document.getElementById('image-list').addEventListener('scroll', (event) => {
+            const list = event.target;
+            if (list.scrollTop + list.clientHeight >= list.scrollHeight - 200) fetchImageList();
+        });
+
+        // Tâche de détection en cours (annulable avec la touche Échap)
+        let currentJobId = null;
+        const STEP_LABELS = {
+            'image_decode': 'LECTURE DE L\'IMAGE',
+            'yolo': 'DÉTECTION YOLO',
+            'mapillary': 'SEGMENTATION DU TERRAIN',
+            'outputs': 'PRÉPARATION DES RÉSULTATS'
+        };
+
         async function scanImage(filename) {
             document.querySelectorAll('.file-button').forEach(b => b.disabled = true);
             
@@ -343,8 +375,32 @@
             playBeep(800, 200);
             
             try {
-                const response = await fetch(`/api/detect/${filename}`, { method: 'POST' });
-                detectionData = await response.json();
+                // La détection est une tâche de fond: la réponse arrive immédiatement
+                const response = await fetch(`/api/jobs/detect/${encodeURIComponent(filename)}`, { method: 'POST' });
+                const job = await response.json();
+                
+                if (!response.ok) {
+                    showMessage('⚠ ERREUR: ' + job.error);
+                    setTimeout(hideMessage, 3000);
+                    document.querySelectorAll('.file-button').forEach(b => b.disabled = false);
+                    return;
+                }
+                
+                currentJobId = job.job_id;
+                const imageShown = displayOriginalImage(filename);
+                
+                // Progression, puis détections YOLO en aperçu pendant la segmentation
+                detectionData = await followJob(job, {
+                    progress: (data) => {
+                        showMessage(`${STEP_LABELS[data.step] || 'ANALYSE'}... ${Math.round(data.progress * 100)}%`);
+                    },
+                    partial: async (data) => {
+                        await imageShown;
+                        drawPreview(data.detections);
+                        showMessage(`${data.total_obstacles} OBJET(S) REPÉRÉ(S) - SEGMENTATION EN COURS...`);
+                    }
+                });
+                currentJobId = null;
                 
                 if (detectionData.error) {
                     showMessage('⚠ ERREUR: ' + detectionData.error);
@@ -353,7 +409,8 @@
                     return;
                 }
                 
-                await displayOriginalImage(filename);
+                await imageShown;
+                ctx.clearRect(0, 0, canvas.width, canvas.height); // Retire l'aperçu
                 updateStats(detectionData);
                 await animateScan(detectionData);
                 
@@ -365,13 +422,83 @@
                 }, 2000);
                 
             } catch (error) {
-                console.error('Erreur scan:', error);
-                showMessage('⚠ ÉCHEC DU SCAN');
+                currentJobId = null;
+                const cancelled = error.message === 'cancelled';
+                if (!cancelled) console.error('Erreur scan:', error);
+                if (ctx) ctx.clearRect(0, 0, canvas.width, canvas.height);
+                showMessage(cancelled ? '✕ SCAN ANNULÉ' : '⚠ ÉCHEC DU SCAN');
                 setTimeout(hideMessage, 3000);
                 document.querySelectorAll('.file-button').forEach(b => b.disabled = false);
             }
         }
 
+        // Suit une tâche en Server-Sent Events (interrogation périodique si indisponible).
+        // Résout avec le résultat final (ou { error }), rejette si la tâche est annulée.
+        function followJob(job, handlers) {
+            if (!window.EventSource) {
+                return pollJob(job, handlers);
+            }
+            return new Promise((resolve, reject) => {
+                let lastEventId = -1;
+                const source = new EventSource(job.events_url);
+                const on = (name, callback) => source.addEventListener(name, (e) => {
+                    lastEventId = parseInt(e.lastEventId, 10);
+                    callback(JSON.parse(e.data));
+                });
+                on('progress', handlers.progress);
+                on('partial', handlers.partial);
+                on('result', (data) => { source.close(); resolve(data); });
+                on('failed', (data) => { source.close(); resolve({ error: data.error }); });
+                on('cancelled', () => { source.close(); reject(new Error('cancelled')); });
+                source.onerror = () => {
+                    // Coupure: EventSource se reconnecte seul; s'il abandonne, on passe à l'interrogation
+                    if (source.readyState === EventSource.CLOSED) {
+                        pollJob(job, handlers, lastEventId).then(resolve, reject);
+                    }
+                };
+            });
+        }
+
+        async function pollJob(job, handlers, after = -1) {
+            while (true) {
+                const response = await fetch(`${job.status_url}?after=${after}`);
+                const status = await response.json();
+                if (!response.ok) {
+                    return { error: status.error };
+                }
+                for (const event of status.events) {
+                    after = event.id;
+                    if (event.event === 'progress') handlers.progress(event.data);
+                    else if (event.event === 'partial') handlers.partial(event.data);
+                }
+                if (status.state === 'done') return status.result;
+                if (status.state === 'failed') return { error: status.error };
+                if (status.state === 'cancelled') throw new Error('cancelled');
+                await sleep(1000);
+            }
+        }
+
+        // Aperçu des détections partielles (pointillés), remplacé par le scan final
+        function drawPreview(detections) {
+            ctx.save();
+            ctx.setLineDash([8, 6]);
+            ctx.lineWidth = 2;
+            ctx.globalAlpha = 0.6;
+            detections.forEach((det) => {
+                const [x1, y1, x2, y2] = det.bbox;
+                ctx.strokeStyle = `rgb(${det.color[0]}, ${det.color[1]}, ${det.color[2]})`;
+                ctx.strokeRect(x1, y1, x2 - x1, y2 - y1);
+            });
+            ctx.restore();
+        }
+
+        document.addEventListener('keydown', (e) => {
+            if (e.key === 'Escape' && currentJobId) {
+                fetch(`/api/jobs/${currentJobId}`, { method: 'DELETE' });
+                showMessage('ANNULATION DU SCAN...');
+            }
+        });
+
         async function displayOriginalImage(filename) {
             return new Promise((resolve) => {
                 const imgEl = document.getElementById('detection-image');
@@ -0,0 +1,443 @@
+"""
+Traitement hors ligne d'un dossier complet d'images (retraitement d'un jeu de
+données après un changement de seuils).
+
+Les images sont décodées par des threads de préchargement, passées aux modèles
+par lots (detect_obstacles_batch) et les sorties sont écrites par tranches.
+Un manifeste (manifest.jsonl) enregistre chaque tranche terminée: une exécution
+interrompue reprend sans refaire les fichiers déjà traités avec la même
+configuration de détection.
+
+Formats de sortie:
+    json     un JSON indenté par image dans output/json/ (comme l'API)
+    jsonl    un seul fichier detections.jsonl (une ligne par image)
+    parquet  un seul fichier detections.parquet (pyarrow requis)
+
+Re-seuillage (--rethreshold): aucun modèle n'est chargé; les obstacles Mapillary
+sont reconstruits depuis les cartes de segmentation stockées (output/seg_maps/)
+avec MAPILLARY_OBSTACLES et MIN_AREA_THRESHOLD actuels (sorties jsonl/parquet,
+dans output/batch/rethreshold/). Les détections YOLO n'en font pas partie.
+
+Usage (depuis detection_obstacle/):
+    python batch_runner.py
+    python batch_runner.py --images-dir D:/dataset --format jsonl --annotate
+    python batch_runner.py --format parquet --chunk-size 256 --batch-size 8
+    python batch_runner.py --rethreshold --format jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import detector_module as dm
+from detection_cache import config_fingerprint, hash_frame
+from output_writer import OutputWriter
+
+# Extensions d'images traitées
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Nombre d'images par tranche (écriture des sorties + entrée du manifeste)
+DEFAULT_CHUNK_SIZE = 64
+# Threads de décodage et nombre d'images décodées à l'avance
+DECODE_THREADS = 4
+PREFETCH_DEPTH = 16
+# Dossier de sortie par défaut (manifeste et fichiers consolidés)
+BATCH_OUTPUT_DIR = os.path.join(dm.OUTPUT_DIR, "batch")
+RETHRESHOLD_OUTPUT_DIR = os.path.join(BATCH_OUTPUT_DIR, "rethreshold")
+# Index chemin -> hash des images, partagé avec les cartes de segmentation stockées
+HASH_INDEX_PATH = os.path.join(dm.SEG_MAPS_DIR, "image_hashes.json")
+
+MANIFEST_NAME = "manifest.jsonl"
+JSONL_NAME = "detections.jsonl"
+PARQUET_NAME = "detections.parquet"
+PARQUET_PARTS_DIR = "parquet_parts"
+
+
+# ---------------------------------------------------------
+# LECTURE DES IMAGES (préchargement)
+# ---------------------------------------------------------
+
+def list_images(images_dir):
+    """Noms des images du dossier, triés (ordre stable entre deux exécutions)."""
+    return sorted(
+        name for name in os.listdir(images_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(images_dir, name))
+    )
+
+
+def prefetch_frames(images_dir, names, threads=DECODE_THREADS, depth=PREFETCH_DEPTH):
+    """Générateur (nom, image ou None) dans l'ordre de `names`, décodé à l'avance par des threads."""
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="decode") as executor:
+        pending = deque()
+        names = iter(names)
+        for name in names:
+            pending.append((name, executor.submit(cv2.imread, os.path.join(images_dir, name))))
+            if len(pending) >= depth:
+                break
+        while pending:
+            name, future = pending.popleft()
+            next_name = next(names, None)
+            if next_name is not None:
+                pending.append((next_name, executor.submit(cv2.imread, os.path.join(images_dir, next_name))))
+            yield name, future.result()
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ---------------------------------------------------------
+# MANIFESTE (reprise)
+# ---------------------------------------------------------
+
+def read_manifest(path, fingerprint):
+    """
+    Retourne (fichiers déjà traités, taille du fichier consolidé à la fin de la
+    dernière tranche, numéro de la prochaine tranche), ou None si le manifeste a
+    été produit avec une autre configuration de détection (tout est à refaire).
+    """
+    done, results_size, chunks = set(), 0, 0
+    if not os.path.exists(path):
+        return done, results_size, chunks
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break # Dernière ligne tronquée par une interruption
+            if entry['fingerprint'] != fingerprint:
+                return None
+            chunks = entry['chunk'] + 1
+            results_size = entry['results_size']
+            done.update(entry['files'])
+    return done, results_size, chunks
+
+
+def reset_outputs(manifest_path, jsonl_path, parts_dir):
+    """Supprime le manifeste et les fichiers consolidés d'une exécution précédente."""
+    for path in (manifest_path, jsonl_path):
+        if os.path.exists(path):
+            os.remove(path)
+    for part in glob.glob(os.path.join(parts_dir, "chunk-*.parquet")):
+        os.remove(part)
+
+
+def prepare_outputs(output_dir, fingerprint, force):
+    """
+    Prépare le dossier de sortie pour une exécution (reprise ou redémarrage) et
+    retourne (chemins, fichiers déjà traités, taille du JSONL, prochaine tranche).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        'manifest': os.path.join(output_dir, MANIFEST_NAME),
+        'jsonl': os.path.join(output_dir, JSONL_NAME),
+        'parquet_parts': os.path.join(output_dir, PARQUET_PARTS_DIR),
+        'parquet': os.path.join(output_dir, PARQUET_NAME)
+    }
+    manifest = None if force else read_manifest(paths['manifest'], fingerprint)
+    if manifest is None:
+        if os.path.exists(paths['manifest']):
+            print("[INFO] Configuration de détection modifiée (ou --force): retraitement complet.")
+        reset_outputs(paths['manifest'], paths['jsonl'], paths['parquet_parts'])
+        manifest = (set(), 0, 0)
+    done, results_size, chunk_index = manifest
+
+    if os.path.exists(paths['jsonl']):
+        # Les lignes écrites après la dernière tranche enregistrée (interruption) sont retirées
+        with open(paths['jsonl'], 'r+b') as f:
+            f.truncate(results_size)
+    return paths, done, results_size, chunk_index
+
+
+def append_manifest(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ---------------------------------------------------------
+# SORTIES
+# ---------------------------------------------------------
+
+def report_row(filename, obstacles):
+    """Ligne du fichier consolidé: rapport de l'image (même contenu que le JSON de l'API)."""
+    row = {'file': filename}
+    row.update(dm.build_detections_report(filename, obstacles))
+    return row
+
+
+def write_jsonl_chunk(path, rows):
+    """Ajoute une tranche au fichier JSON Lines; retourne sa taille après écriture."""
+    with open(path, 'a', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def write_parquet_chunk(parts_dir, chunk_index, rows):
+    """Écrit une tranche dans un fichier Parquet partiel (fusionnés en fin d'exécution)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(parts_dir, exist_ok=True)
+    path = os.path.join(parts_dir, f"chunk-{chunk_index:06d}.parquet")
+    pq.write_table(pa.Table.from_pylist(rows), path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def consolidate_parquet(parts_dir, output_path):
+    """Fusionne les fichiers partiels en un seul fichier Parquet (un groupe de lignes par tranche)."""
+    import pyarrow.parquet as pq
+
+    parts = sorted(glob.glob(os.path.join(parts_dir, "chunk-*.parquet")))
+    if not parts:
+        return
+    tables = [pq.read_table(part) for part in parts]
+    schema = next((t.schema for t in tables if t.num_rows), tables[0].schema)
+    with pq.ParquetWriter(output_path + ".tmp", schema) as writer:
+        for table in tables:
+            if table.num_rows:
+                writer.write_table(table.cast(schema))
+    os.replace(output_path + ".tmp", output_path)
+
+
+# ---------------------------------------------------------
+# INDEX DES HASH D'IMAGES (re-seuillage)
+# ---------------------------------------------------------
+
+class ImageHashIndex:
+    """
+    Chemin d'image -> (hash des pixels, forme), valide tant que la taille et la date
+    du fichier ne changent pas: le re-seuillage retrouve les cartes de segmentation
+    stockées sans redécoder les images.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _signature(image_path):
+        stat = os.stat(image_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def lookup(self, image_path):
+        """(hash, forme) connus pour cette image, ou None."""
+        entry = self._entries.get(os.path.abspath(image_path))
+        if entry is None or entry[:2] != self._signature(image_path):
+            return None
+        return entry[2], tuple(entry[3])
+
+    def record(self, image_path, frame):
+        frame_hash = hash_frame(frame)
+        self._entries[os.path.abspath(image_path)] = self._signature(image_path) + [frame_hash, list(frame.shape)]
+        self._dirty = True
+        return frame_hash, frame.shape
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(self.path + ".tmp", self.path)
+        self._dirty = False
+
+
+# ---------------------------------------------------------
+# EXÉCUTION
+# ---------------------------------------------------------
+
+def run(images_dir, output_dir, output_format="json", annotate=False, batch_size=dm.DEFAULT_BATCH_SIZE,
+        chunk_size=DEFAULT_CHUNK_SIZE, decode_threads=DECODE_THREADS, force=False):
+    """Traite toutes les images de `images_dir`; retourne le nombre d'images traitées."""
+    if output_format == "parquet":
+        import pyarrow # noqa: F401 -- échec immédiat plutôt qu'après la première tranche
+
+    dm._ensure_models()
+    # Un changement de configuration ou de format invalide les tranches déjà traitées
+    fingerprint = f"{dm.detection_config_fingerprint()}|{output_format}"
+    paths, done, results_size, chunk_index = prepare_outputs(output_dir, fingerprint, force)
+    hash_index = ImageHashIndex(HASH_INDEX_PATH) if dm.SEG_MAP_STORE_ENABLED else None
+
+    names = list_images(images_dir)
+    todo = [name for name in names if name not in done]
+    print(f"[INFO] {len(names)} image(s) dans {images_dir}, {len(names) - len(todo)} déjà traitée(s), "
+          f"{len(todo)} à traiter (format {output_format}, lots de {batch_size}, tranches de {chunk_size})")
+
+    writer = OutputWriter().start()
+    processed, failed = 0, []
+    start = time.perf_counter()
+
+    for chunk in chunked(prefetch_frames(images_dir, todo, threads=decode_threads), chunk_size):
+        chunk_start = time.perf_counter()
+        readable = [(name, frame) for name, frame in chunk if frame is not None]
+        failed.extend(name for name, frame in chunk if frame is None)
+        all_obstacles = dm.detect_obstacles_batch([frame for _, frame in readable], batch_size=batch_size) if readable else []
+
+        rows = []
+        for (name, frame), obstacles in zip(readable, all_obstacles):
+            if hash_index is not None:
+                hash_index.record(os.path.join(images_dir, name), frame) # Pour un re-seuillage ultérieur
+            if annotate:
+                path = os.path.join(dm.ANNOTATED_IMAGES_DIR, f"annotated_{name}")
+                writer.submit_image(path, frame, lambda f, obs=obstacles: dm.annotate_frame(f, obs))
+            if output_format == "json":
+                writer.submit_json(dm.detections_json_path(name), dm.build_detections_report(name, obstacles))
+            else:
+                rows.append(report_row(name, obstacles))
+
+        if output_format == "jsonl":
+            results_size = write_jsonl_chunk(paths['jsonl'], rows)
+        elif output_format == "parquet":
+            write_parquet_chunk(paths['parquet_parts'], chunk_index, rows)
+        writer.flush()
+        if hash_index is not None:
+            hash_index.save()
+
+        # La tranche n'est enregistrée qu'une fois toutes ses sorties sur disque
+        append_manifest(paths['manifest'], {
+            'chunk': chunk_index,
+            'fingerprint': fingerprint,
+            'files': [name for name, _ in readable],
+            'results_size': results_size,
+            'finished_at': time.time()
+        })
+        chunk_index += 1
+        processed += len(readable)
+
+        elapsed = time.perf_counter() - start
+        print(f"[INFO] Tranche {chunk_index}: {len(readable)} image(s) en {time.perf_counter() - chunk_start:.1f}s | "
+              f"{processed}/{len(todo)} | {processed / elapsed:.2f} images/s")
+
+    if output_format == "parquet":
+        consolidate_parquet(paths['parquet_parts'], paths['parquet'])
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"[INFO] Terminé: {processed} image(s) en {elapsed:.1f}s ({rate:.2f} images/s)")
+    if failed:
+        print(f"[WARN] {len(failed)} image(s) illisible(s): {', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+    return processed
+
+
+def rethreshold(images_dir, output_dir, output_format="jsonl", chunk_size=DEFAULT_CHUNK_SIZE,
+                decode_threads=DECODE_THREADS, force=False):
+    """
+    Re-seuillage sans modèle: reconstruit les obstacles Mapillary de chaque image
+    depuis sa carte de segmentation stockée, avec MAPILLARY_OBSTACLES et
+    MIN_AREA_THRESHOLD actuels. Les images jamais segmentées sont signalées et ignorées.
+    Retourne le nombre d'images traitées.
+    """
+    if output_format == "parquet":
+        import pyarrow # noqa: F401 -- échec immédiat plutôt qu'après la première tranche
+
+    model_id = dm.seg_map_model_id()
+    fingerprint = config_fingerprint({
+        'mode': 'rethreshold', 'format': output_format, 'model_id': model_id,
+        'mapillary_obstacles': dm.MAPILLARY_OBSTACLES, 'min_area': dm.MIN_AREA_THRESHOLD
+    })
+    paths, done, results_size, chunk_index = prepare_outputs(output_dir, fingerprint, force)
+    hash_index = ImageHashIndex(HASH_INDEX_PATH)
+
+    names = list_images(images_dir)
+    todo = [name for name in names if name not in done]
+    print(f"[INFO] Re-seuillage ({model_id}): {len(todo)} image(s) à traiter sur {len(names)} (format {output_format})")
+
+    processed, missing = 0, []
+    start = time.perf_counter()
+    for chunk in chunked(todo, chunk_size):
+        # Les images inconnues de l'index sont décodées une seule fois pour calculer leur hash
+        unknown = [name for name in chunk if hash_index.lookup(os.path.join(images_dir, name)) is None]
+        for name, frame in prefetch_frames(images_dir, unknown, threads=decode_threads):
+            if frame is not None:
+                hash_index.record(os.path.join(images_dir, name), frame)
+
+        rows, files = [], []
+        for name in chunk:
+            entry = hash_index.lookup(os.path.join(images_dir, name))
+            obstacles = dm.obstacles_from_stored_seg_map(*entry, model_id=model_id) if entry else None
+            if obstacles is None:
+                missing.append(name) # Jamais segmentée: sera traitée après une détection
+                continue
+            obstacles = obstacles.sorted_by_priority() # Même ordre que merge_detections
+            rows.append(report_row(name, obstacles))
+            files.append(name)
+
+        if output_format == "jsonl":
+            results_size = write_jsonl_chunk(paths['jsonl'], rows)
+        else:
+            write_parquet_chunk(paths['parquet_parts'], chunk_index, rows)
+        hash_index.save()
+        append_manifest(paths['manifest'], {
+            'chunk': chunk_index,
+            'fingerprint': fingerprint,
+            'files': files,
+            'results_size': results_size,
+            'finished_at': time.time()
+        })
+        chunk_index += 1
+        processed += len(files)
+
+    if output_format == "parquet":
+        consolidate_parquet(paths['parquet_parts'], paths['parquet'])
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"[INFO] Re-seuillage terminé: {processed} image(s) en {elapsed:.2f}s ({rate:.1f} images/s)")
+    if missing:
+        print(f"[WARN] {len(missing)} image(s) sans carte stockée (à détecter d'abord): "
+              f"{', '.join(missing[:10])}{' ...' if len(missing) > 10 else ''}")
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR, help="Dossier du manifeste et des fichiers consolidés")
+    parser.add_argument('--format', choices=('json', 'jsonl', 'parquet'), default='json')
+    parser.add_argument('--annotate', action='store_true', help="Sauvegarder aussi les images annotées")
+    parser.add_argument('--batch-size', type=int, default=dm.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--decode-threads', type=int, default=DECODE_THREADS)
+    parser.add_argument('--force', action='store_true', help="Ignorer le manifeste et tout retraiter")
+    parser.add_argument('--rethreshold', action='store_true',
+                        help="Sans modèle: obstacles Mapillary recalculés depuis les cartes de segmentation stockées")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.images_dir):
+        sys.exit(f"Dossier d'images introuvable: {args.images_dir}")
+    if args.rethreshold:
+        if args.format == 'json' or args.annotate:
+            sys.exit("--rethreshold produit un fichier consolidé: utilisez --format jsonl ou parquet, sans --annotate")
+        output_dir = args.output_dir if args.output_dir != BATCH_OUTPUT_DIR else RETHRESHOLD_OUTPUT_DIR
+        rethreshold(args.images_dir, output_dir, output_format=args.format, chunk_size=max(1, args.chunk_size),
+                    decode_threads=max(1, args.decode_threads), force=args.force)
+        return
+    run(args.images_dir, args.output_dir, output_format=args.format, annotate=args.annotate,
+        batch_size=args.batch_size, chunk_size=max(1, args.chunk_size),
+        decode_threads=max(1, args.decode_threads), force=args.force)
+
+
+if __name__ == '__main__':
+    main()
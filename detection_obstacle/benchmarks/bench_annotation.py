@@ -0,0 +1,147 @@
+"""
+Benchmark de l'annotation: ancien annotate_frame (dessin complet de chaque
+étiquette et du tableau de bord à chaque image) vs AnnotationRenderer
+(sprites en cache, tampon de sortie réutilisé, dessin sur place), avec
+vérification de l'identité pixel à pixel, plus le coût de la superposition
+de la carte de segmentation et de l'encodage JPEG en mémoire.
+
+Les obstacles sont tirés au hasard parmi les classes et couleurs réelles
+(YOLO et Mapillary), en scènes de densité croissante.
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/bench_annotation.py
+    python benchmarks/bench_annotation.py --counts 10 50 200 --repeat 50 --limit 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from annotation_renderer import AnnotationRenderer, blend_segmentation, segmentation_palette
+
+
+def legacy_annotate_frame(frame, obstacles):
+    """Copie de l'ancien _annotate_frame, utilisée comme référence."""
+    annotated = frame.copy()
+
+    stats = {1: 0, 2: 0, 3: 0}
+    stats_by_source = {"yolo": 0, "mapillary": 0}
+
+    for obs in obstacles:
+        x1, y1, x2, y2 = obs['bbox']
+        priority = obs['priority']
+        label = obs['class']
+        source = obs.get('source', 'unknown')
+        color = obs.get('color', dm.get_color_for_priority(priority))
+        thickness = 4 if priority == 1 else (3 if priority == 2 else 2)
+
+        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, thickness)
+
+        text = f"{label} P{priority}"
+        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 2)
+        cv2.rectangle(annotated, (x1, y1 - text_h - 10), (x1 + text_w + 5, y1), color, -1)
+        cv2.putText(annotated, text, (x1 + 2, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
+
+        stats[priority] += 1
+        stats_by_source[source] += 1
+
+    info_y = 30
+    cv2.rectangle(annotated, (10, 10), (350, 150), (0, 0, 0), -1)
+    cv2.putText(annotated, f"Obstacles critiques (P1): {stats[1]}", (20, info_y),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    cv2.putText(annotated, f"Obstacles importants (P2): {stats[2]}", (20, info_y + 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+    cv2.putText(annotated, f"Obstacles moderes (P3): {stats[3]}", (20, info_y + 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+    cv2.putText(annotated, f"YOLO: {stats_by_source['yolo']} | Mapillary: {stats_by_source['mapillary']}",
+                (20, info_y + 100), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+    return annotated
+
+
+def make_obstacles(n, frame_shape, rng):
+    """Obstacles aléatoires (classes, priorités et couleurs réelles), boîtes parfois au bord de l'image."""
+    height, width = frame_shape[:2]
+    classes = [(name, priority, None, 'yolo') for name, priority in dm.YOLO_OBSTACLES.items()]
+    classes += [(name, cfg['priority'], cfg['color'], 'mapillary') for name, cfg in dm.MAPILLARY_OBSTACLES.items()]
+    obstacles = []
+    for _ in range(n):
+        name, priority, color, source = classes[rng.integers(0, len(classes))]
+        x1, y1 = int(rng.integers(-20, width - 10)), int(rng.integers(-20, height - 10))
+        x2, y2 = x1 + int(rng.integers(10, width // 4)), y1 + int(rng.integers(10, height // 4))
+        obs = {'class': name, 'priority': priority, 'bbox': [x1, y1, x2, y2], 'source': source}
+        if color is not None:
+            obs['color'] = color
+        obstacles.append(obs)
+    return obstacles
+
+
+def timed(fn, repeat):
+    """Temps moyen (ms) d'un appel."""
+    fn() # Préchauffage (remplit aussi le cache de sprites)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def synthetic_seg_map(frame, id2label):
+    """Carte factice à mi-résolution: grille de classes dérivée de la luminance."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (frame.shape[1] // 2, frame.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    return (small.astype(np.int32) * len(id2label) // 256).astype(np.uint8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=3, help="Nombre maximal d'images")
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 50, 200, 1000], help="Obstacles par image")
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(args.images_dir, f)) for f in names[:args.limit]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        sys.exit(f"Aucune image lisible dans {args.images_dir}")
+
+    rng = np.random.default_rng(args.seed)
+    id2label = dict(enumerate(list(dm.MAPILLARY_OBSTACLES) + ["Road", "Sidewalk", "Building", "Sky"]))
+    colors, mask = segmentation_palette(id2label, dm.MAPILLARY_OBSTACLES)
+
+    print(f"{'obstacles':>9} | {'image':>11} | {'ancien (ms)':>11} | {'copie (ms)':>10} | {'tampon (ms)':>11} | "
+          f"{'sur place':>9} | {'accél.':>7} | {'identique':>9} | {'overlay (ms)':>12} | {'jpeg (ms)':>9}")
+    print("-" * 125)
+    for n in args.counts:
+        for frame in frames:
+            obstacles = make_obstacles(n, frame.shape, rng)
+            renderer = AnnotationRenderer({p: dm.get_color_for_priority(p) for p in (1, 2, 3)})
+            out = np.empty_like(frame)
+            scratch = frame.copy()
+            seg_map = synthetic_seg_map(frame, id2label)
+
+            identical = np.array_equal(legacy_annotate_frame(frame, obstacles), renderer.render(frame, obstacles))
+            legacy_ms = timed(lambda: legacy_annotate_frame(frame, obstacles), args.repeat)
+            copy_ms = timed(lambda: renderer.render(frame, obstacles), args.repeat)
+            buffer_ms = timed(lambda: renderer.render(frame, obstacles, out=out), args.repeat)
+            # Sur place: on redessine sur la même image (seul le coût du dessin est mesuré)
+            in_place_ms = timed(lambda: renderer.render(scratch, obstacles, in_place=True), args.repeat)
+            overlay_ms = timed(lambda: blend_segmentation(out, seg_map, colors, mask), args.repeat)
+            jpeg_ms = timed(lambda: cv2.imencode('.jpg', out, [cv2.IMWRITE_JPEG_QUALITY, 90]), args.repeat)
+
+            size = f"{frame.shape[1]}x{frame.shape[0]}"
+            print(f"{n:>9} | {size:>11} | {legacy_ms:>11.2f} | {copy_ms:>10.2f} | {buffer_ms:>11.2f} | "
+                  f"{in_place_ms:>9.2f} | {legacy_ms / buffer_ms:>6.2f}x | {'oui' if identical else 'NON':>9} | "
+                  f"{overlay_ms:>12.2f} | {jpeg_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark de la représentation des détections: anciennes listes de
+dictionnaires vs DetectionSet (colonnes NumPy), sur la fusion (NMS), le tri,
+le décompte par priorité, la construction du rapport et la sérialisation
+(JSON vs format binaire compact), avec vérification de l'identité des rapports.
+
+Les détections sont tirées au hasard parmi les classes réelles (YOLO et
+Mapillary), en scènes de densité croissante (boîtes qui se chevauchent).
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/bench_detection_set.py
+    python benchmarks/bench_detection_set.py --counts 100 1000 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from detection_set import DetectionSet
+from merge_engine import nms
+
+
+def legacy_merge(yolo_obstacles, mapillary_obstacles):
+    """Copie de l'ancien _merge_detections (NMS, listes de dictionnaires)."""
+    all_obstacles = yolo_obstacles + mapillary_obstacles
+    if len(all_obstacles) == 0:
+        return []
+    boxes = [obs['bbox'] for obs in all_obstacles]
+    scores = [obs['confidence'] * (4 - obs['priority']) for obs in all_obstacles]
+    keep_indices = nms(boxes, scores, threshold=dm.MERGE_IOU_THRESHOLD)
+    merged = [all_obstacles[i] for i in keep_indices]
+    merged.sort(key=lambda x: x['priority'])
+    return merged
+
+
+def legacy_report(image_filename, obstacles):
+    """Copie de l'ancien build_detections_report."""
+    detections = {
+        'image': "annotated_" + image_filename,
+        'total_obstacles': len(obstacles),
+        'by_priority': {
+            'critical': len([o for o in obstacles if o['priority'] == 1]),
+            'important': len([o for o in obstacles if o['priority'] == 2]),
+            'moderate': len([o for o in obstacles if o['priority'] == 3])
+        },
+        'detections': []
+    }
+    for obs in obstacles:
+        color_bgr = obs.get('color', dm.get_color_for_priority(obs['priority']))
+        color_rgb = [int(color_bgr[2]), int(color_bgr[1]), int(color_bgr[0])]
+        detections['detections'].append({
+            'class': obs['class'],
+            'bbox': [int(x) for x in obs['bbox']],
+            'confidence': float(obs['confidence']),
+            'priority': int(obs['priority']),
+            'source': obs.get('source', 'unknown'),
+            'color': color_rgb
+        })
+    return detections
+
+
+def make_detections(n, rng, width=1920, height=1080):
+    """(obstacles YOLO, obstacles Mapillary) aléatoires, boîtes groupées pour créer des chevauchements."""
+    yolo, mapillary = [], []
+    yolo_classes = list(dm.YOLO_OBSTACLES.items())
+    mapillary_classes = list(dm.MAPILLARY_OBSTACLES.items())
+    centers = rng.uniform((0, 0), (width, height), size=(max(1, n // 8), 2))
+    for _ in range(n):
+        cx, cy = centers[rng.integers(0, len(centers))] + rng.normal(0, 20, size=2)
+        w, h = rng.integers(20, 200, size=2)
+        bbox = [int(cx - w / 2), int(cy - h / 2), int(cx + w / 2), int(cy + h / 2)]
+        if rng.random() < 0.5:
+            name, priority = yolo_classes[rng.integers(0, len(yolo_classes))]
+            yolo.append({'bbox': bbox, 'class': name, 'confidence': float(rng.uniform(0.3, 1.0)),
+                         'priority': int(priority), 'source': 'yolo'})
+        else:
+            name, info = mapillary_classes[rng.integers(0, len(mapillary_classes))]
+            mapillary.append({'bbox': bbox, 'class': name, 'confidence': 0.95, 'priority': int(info['priority']),
+                              'source': 'mapillary', 'color': info['color']})
+    return yolo, mapillary
+
+
+def timed(fn, repeat):
+    """Temps moyen (ms) d'un appel."""
+    fn() # Préchauffage
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[50, 500, 5000, 20000], help="Détections par scène")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'détections':>10} | {'fusion dict':>11} | {'fusion cols':>11} | {'rapport dict':>12} | "
+          f"{'rapport cols':>12} | {'JSON (ms)':>9} | {'binaire':>8} | {'JSON (o)':>9} | {'binaire (o)':>11} | {'identique':>9}")
+    print("-" * 131)
+    for n in args.counts:
+        yolo, mapillary = make_detections(n, rng)
+        yolo_set, mapillary_set = DetectionSet.from_obstacles(yolo), DetectionSet.from_obstacles(mapillary)
+        merged_dicts = legacy_merge(yolo, mapillary)
+        merged_set = dm.merge_detections(yolo_set, mapillary_set, method="nms", class_aware=False)
+
+        identical = legacy_report("x.jpg", merged_dicts) == dm.build_detections_report("x.jpg", merged_set)
+        merge_dict_ms = timed(lambda: legacy_merge(yolo, mapillary), args.repeat)
+        merge_set_ms = timed(lambda: dm.merge_detections(yolo_set, mapillary_set, method="nms", class_aware=False),
+                             args.repeat)
+        report_dict_ms = timed(lambda: legacy_report("x.jpg", merged_dicts), args.repeat)
+        report_set_ms = timed(lambda: dm.build_detections_report("x.jpg", merged_set), args.repeat)
+        json_ms = timed(lambda: json.dumps(dm.build_detections_report("x.jpg", merged_set)), args.repeat)
+        pack_ms = timed(lambda: dm.pack_detections(merged_set), args.repeat)
+        json_size = len(json.dumps(dm.build_detections_report("x.jpg", merged_set)))
+        pack_size = len(dm.pack_detections(merged_set))
+
+        print(f"{n:>10} | {merge_dict_ms:>11.2f} | {merge_set_ms:>11.2f} | {report_dict_ms:>12.2f} | "
+              f"{report_set_ms:>12.2f} | {json_ms:>9.2f} | {pack_ms:>8.3f} | {json_size:>9} | {pack_size:>11} | "
+              f"{'oui' if identical else 'NON':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark du NMS: ancienne boucle Python vs NMS vectorisé (merge_engine).
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/bench_nms.py
+    python benchmarks/bench_nms.py --counts 10 100 1000 10000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from merge_engine import nms, weighted_box_fusion
+
+
+def legacy_nms(boxes, scores, threshold=0.5):
+    """Copie de l'ancien non_maximum_suppression (boucle while), utilisée comme référence."""
+    if len(boxes) == 0:
+        return []
+
+    boxes = np.array(boxes)
+    scores = np.array(scores)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+        inds = np.where(ovr <= threshold)[0]
+        order = order[inds + 1]
+
+    return keep
+
+
+def make_scene(n, rng, width=1920, height=1080):
+    """Boîtes aléatoires regroupées autour de quelques centres (comme des fragments de végétation)."""
+    centers = rng.uniform([0, 0], [width, height], size=(max(1, n // 8), 2))
+    picked = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 25, size=(n, 2))
+    sizes = rng.uniform(15, 160, size=(n, 2))
+    x1 = np.clip(picked[:, 0], 0, width - 2).astype(int)
+    y1 = np.clip(picked[:, 1], 0, height - 2).astype(int)
+    x2 = np.minimum(x1 + sizes[:, 0].astype(int), width - 1)
+    y2 = np.minimum(y1 + sizes[:, 1].astype(int), height - 1)
+    boxes = np.stack([x1, y1, x2, y2], axis=1)
+    # Scores pondérés par priorité, comme dans merge_detections
+    scores = rng.uniform(0.3, 0.95, n) * rng.integers(1, 4, n)
+    class_ids = rng.integers(0, 20, n)
+    return boxes, scores, class_ids
+
+
+def timed(fn, repeat):
+    """Meilleur temps (ms) sur `repeat` exécutions."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--threshold', type=float, default=0.4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'boîtes':>7} | {'ancien (ms)':>11} | {'vectorisé (ms)':>14} | {'accél.':>7} | "
+          f"{'par classe (ms)':>15} | {'WBF (ms)':>9} | identique")
+    print("-" * 92)
+    for n in args.counts:
+        boxes, scores, class_ids = make_scene(n, rng)
+        legacy_ms, legacy_keep = timed(lambda: legacy_nms(boxes, scores, args.threshold), args.repeat)
+        new_ms, new_keep = timed(lambda: nms(boxes, scores, args.threshold), args.repeat)
+        class_ms, _ = timed(lambda: nms(boxes, scores, args.threshold, class_ids=class_ids), args.repeat)
+        wbf_ms, _ = timed(lambda: weighted_box_fusion(boxes, scores, args.threshold), 1)
+        same = [int(i) for i in legacy_keep] == new_keep
+        print(f"{n:>7} | {legacy_ms:>11.2f} | {new_ms:>14.2f} | {legacy_ms / new_ms:>6.1f}x | "
+              f"{class_ms:>15.2f} | {wbf_ms:>9.2f} | {'oui' if same else 'NON'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Vérification de parité et benchmark de l'extraction des régions Mapillary:
+ancienne boucle (un masque plein cadre + findContours par classe) vs
+extract_obstacle_regions (passe unique, LUT, recadrage par classe).
+
+Cas vérifiés (obstacles, valeurs et ordre identiques):
+  - cartes aléatoires (rectangles, ellipses et bruit de classes)
+  - cas limites: régions d'un pixel de large, pixels isolés, diagonales,
+    régions touchant les bords et les coins, image d'une seule classe,
+    damier, IDs absents de id2label, carte vide
+  - cartes réelles: cartes Mask2Former stockées (output/seg_maps/, avec leur
+    labels.json), et cartes dérivées des photos de ressources/images/
+    (niveaux de gris quantifiés en classes: contours irréguliers de vraies scènes)
+Chaque cas est testé avec les seuils d'aire réels et avec des seuils nuls ou
+négatifs (tous les fragments conservés, y compris les contours d'aire nulle).
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/bench_region_extraction.py
+    python benchmarks/bench_region_extraction.py --random 50 --limit 5 --repeat 3
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from region_extraction import extract_obstacle_regions
+
+# Nombre de classes du modèle Mapillary Vistas (les obstacles y sont intercalés)
+NUM_LABELS = 65
+# Seuils d'aire testés en plus des seuils réels (MIN_AREA_THRESHOLD)
+EXTRA_THRESHOLDS = {
+    "zero": {1: 0, 2: 0, 3: 0},
+    "negative": {1: -1, 2: -1, 3: -1},
+}
+
+
+def legacy_extract(seg_map, id2label, obstacles_config, min_area_threshold):
+    """Copie de l'ancienne boucle par classe de detect_obstacles_mapillary, utilisée comme référence."""
+    obstacles = []
+    for class_id, class_name in id2label.items():
+        if class_name in obstacles_config:
+            info = obstacles_config[class_name]
+
+            # Création d'un masque binaire pour la classe actuelle
+            mask = (seg_map == class_id).astype(np.uint8)
+            # Trouver les régions connectées (contours) de cette classe
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+            for cnt in contours:
+                area = cv2.contourArea(cnt)
+                min_area = min_area_threshold[info['priority']]
+
+                if area > min_area:
+                    x, y, w, h = cv2.boundingRect(cnt)
+                    obstacles.append({
+                        'bbox': [int(x), int(y), int(x + w), int(y + h)],
+                        'class': class_name,
+                        'confidence': float(0.95),
+                        'priority': int(info['priority']),
+                        'source': 'mapillary',
+                        'color': info['color']
+                    })
+    return obstacles
+
+
+def comparable(obstacles):
+    """Obstacles sous une forme comparable (les couleurs peuvent être des tuples ou des listes)."""
+    return [(list(obs['bbox']), obs['class'], round(float(obs['confidence']), 6), int(obs['priority']),
+             obs['source'], [int(c) for c in obs['color']]) for obs in obstacles]
+
+
+def mapillary_id2label(rng):
+    """id2label de NUM_LABELS classes, les obstacles placés à des IDs aléatoires (ordre de sortie non trivial)."""
+    ids = rng.permutation(NUM_LABELS)[:len(dm.MAPILLARY_OBSTACLES)]
+    id2label = {class_id: f"Background {class_id}" for class_id in range(NUM_LABELS)}
+    for class_id, name in zip(ids, dm.MAPILLARY_OBSTACLES):
+        id2label[int(class_id)] = name
+    return id2label
+
+
+def random_map(rng, height, width):
+    """Carte aléatoire: fond, rectangles et ellipses de classes aléatoires, puis bruit de pixels."""
+    seg_map = np.full((height, width), rng.integers(0, NUM_LABELS), dtype=np.int32)
+    for _ in range(rng.integers(5, 60)):
+        class_id = int(rng.integers(0, NUM_LABELS))
+        x, y = int(rng.integers(-20, width)), int(rng.integers(-20, height))
+        w, h = int(rng.integers(1, width // 2 + 2)), int(rng.integers(1, height // 2 + 2))
+        if rng.random() < 0.5:
+            cv2.rectangle(seg_map, (x, y), (x + w, y + h), class_id, -1)
+        else:
+            cv2.ellipse(seg_map, (x, y), (w // 2 + 1, h // 2 + 1), float(rng.uniform(0, 180)), 0, 360, class_id, -1)
+    noise = rng.random((height, width)) < rng.uniform(0, 0.02)
+    seg_map[noise] = rng.integers(0, NUM_LABELS, int(noise.sum()))
+    return seg_map
+
+
+def edge_case_maps(id2label):
+    """Cartes des cas limites (régions fines, pixels isolés, bords), avec les IDs des obstacles."""
+    obstacle_ids = [class_id for class_id, name in id2label.items() if name in dm.MAPILLARY_OBSTACLES]
+    a, b, c = obstacle_ids[:3]
+    background = next(class_id for class_id, name in id2label.items() if name not in dm.MAPILLARY_OBSTACLES)
+    h, w = 120, 200
+    maps = {}
+
+    thin = np.full((h, w), background, dtype=np.int32)
+    thin[10, 5:150] = a # ligne horizontale d'un pixel
+    thin[20:110, 60] = b # ligne verticale d'un pixel
+    for i in range(80):
+        thin[30 + i, 100 + i] = c # diagonale (connexité 8)
+    thin[50:52, 20:40] = a # bande de deux pixels
+    maps["régions fines"] = thin
+
+    isolated = np.full((h, w), background, dtype=np.int32)
+    isolated[::7, ::11] = a
+    isolated[3::13, 5::9] = b
+    isolated[0, 0] = isolated[h - 1, w - 1] = isolated[0, w - 1] = isolated[h - 1, 0] = c # coins
+    maps["pixels isolés"] = isolated
+
+    border = np.full((h, w), background, dtype=np.int32)
+    border[0, :] = a # bord haut entier
+    border[:, w - 1] = b # bord droit entier
+    border[h - 30:, :40] = c # bloc dans le coin bas gauche
+    border[40:80, 0] = a # segment sur le bord gauche
+    border[h - 1, 100:w] = c # segment sur le bord bas
+    maps["bords"] = border
+
+    maps["une seule classe"] = np.full((h, w), a, dtype=np.int32)
+    maps["damier"] = np.where((np.indices((h, w)).sum(axis=0) % 2) == 0, a, b).astype(np.int32)
+    unknown = np.full((h, w), NUM_LABELS + 40, dtype=np.int32) # IDs absents de id2label
+    unknown[30:60, 30:90] = a
+    maps["IDs inconnus"] = unknown
+    maps["carte vide"] = np.zeros((0, 0), dtype=np.int32)
+    maps["un pixel"] = np.full((1, 1), a, dtype=np.int32)
+    return maps
+
+
+def stored_maps(seg_maps_dir, limit):
+    """Cartes Mask2Former réelles stockées: liste de (nom, carte, id2label)."""
+    maps = []
+    for labels_path in sorted(glob.glob(os.path.join(seg_maps_dir, "*", "labels.json"))):
+        with open(labels_path, encoding='utf-8') as f:
+            id2label = {int(class_id): label for class_id, label in json.load(f).items()}
+        paths = sorted(glob.glob(os.path.join(os.path.dirname(labels_path), "*", "*.npy")))[:limit]
+        maps += [(os.path.basename(path)[:12], np.load(path), id2label) for path in paths]
+    return maps
+
+
+def photo_maps(images_dir, limit, id2label):
+    """Cartes dérivées des photos: niveaux de gris lissés et quantifiés sur les IDs de id2label."""
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))[:limit]
+    ids = np.array(sorted(id2label), dtype=np.int32)
+    maps = []
+    for name in names:
+        frame = cv2.imread(os.path.join(images_dir, name))
+        if frame is None:
+            continue
+        gray = cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        maps.append((name, ids[(gray.astype(np.int32) * len(ids)) // 256], id2label))
+    return maps
+
+
+def timed(fn, repeat):
+    """Temps moyen (ms) d'un appel."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--random', type=int, default=30, help="Nombre de cartes aléatoires")
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--seg-maps-dir', default=dm.SEG_MAPS_DIR)
+    parser.add_argument('--limit', type=int, default=10, help="Nombre maximal de cartes réelles / de photos")
+    parser.add_argument('--repeat', type=int, default=1, help="Répétitions pour la mesure des temps")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    id2label = mapillary_id2label(rng)
+    cases = [(f"aléatoire {i}", random_map(rng, int(rng.integers(1, 400)), int(rng.integers(1, 600))), id2label)
+             for i in range(args.random)]
+    cases += [(name, seg_map, id2label) for name, seg_map in edge_case_maps(id2label).items()]
+    real = stored_maps(args.seg_maps_dir, args.limit)
+    if not real:
+        print(f"[INFO] Aucune carte stockée dans {args.seg_maps_dir}: seules les cartes dérivées des photos sont réelles")
+    cases += [(f"stockée {name}", seg_map, labels) for name, seg_map, labels in real]
+    cases += [(f"photo {name}", seg_map, id2label) for name, seg_map, id2label in
+              photo_maps(args.images_dir, args.limit, id2label)]
+
+    thresholds = {"réels": dm.MIN_AREA_THRESHOLD, **EXTRA_THRESHOLDS}
+    failures = 0
+    print(f"{'carte':>28} | {'taille':>11} | {'seuils':>8} | {'obstacles':>9} | {'ancienne (ms)':>13} | "
+          f"{'nouvelle (ms)':>13} | {'identique':>9}")
+    print("-" * 108)
+    for name, seg_map, labels in cases:
+        for threshold_name, min_area in thresholds.items():
+            legacy_ms, legacy = timed(lambda: legacy_extract(seg_map, labels, dm.MAPILLARY_OBSTACLES, min_area),
+                                      args.repeat)
+            new_ms, new = timed(lambda: extract_obstacle_regions(seg_map, labels, dm.MAPILLARY_OBSTACLES, min_area),
+                                args.repeat)
+            identical = comparable(legacy) == comparable(new)
+            failures += not identical
+            size = 'x'.join(map(str, seg_map.shape[:2]))
+            print(f"{name[:28]:>28} | {size:>11} | {threshold_name:>8} | {len(legacy):>9} | {legacy_ms:>13.2f} | "
+                  f"{new_ms:>13.2f} | {'oui' if identical else 'NON':>9}")
+
+    print(f"\n{len(cases) * len(thresholds)} comparaison(s), {failures} différence(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
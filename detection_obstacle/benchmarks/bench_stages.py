@@ -0,0 +1,256 @@
+"""
+Benchmark par étape du pipeline complet (décodage, modèles, post-traitement,
+extraction des régions, fusion, annotation, encodage, export JSON, écriture)
+sur les images de ressources/images/: latences p50/p95/p99 et débit par étape.
+
+Les mesures viennent de l'instrumentation intégrée (instrumentation.py), la
+même que celle exposée par /api/metrics et le bloc "timings" de l'API.
+
+Avec --stub-models, YOLO et Mask2Former sont remplacés par des modèles factices
+déterministes (boîtes et carte de segmentation dérivées de l'image): les étapes
+hors modèles sont mesurées sans poids, sans torch ni GPU.
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/bench_stages.py
+    python benchmarks/bench_stages.py --stub-models --repeat 5
+    python benchmarks/bench_stages.py --limit 10 --json stages.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from instrumentation import stage, trace
+from output_writer import _write_atomic, encode_image
+
+# Ordre d'affichage des étapes
+STAGE_ORDER = (
+    "image_decode", "yolo_forward", "yolo_postprocess", "mapillary_preprocess", "mapillary_forward",
+    "mapillary_postprocess", "region_extraction", "merge", "annotate", "encode", "json_export", "disk_write"
+)
+# Classes Mapillary "de fond" ajoutées aux obstacles dans la carte factice
+STUB_BACKGROUND_LABELS = ("Road", "Sidewalk", "Building", "Sky")
+# Taille de la grille de la carte factice (pixels par cellule avant agrandissement)
+STUB_SEG_CELL = 24
+
+
+# ---------------------------------------------------------
+# MODÈLES FACTICES (--stub-models)
+# ---------------------------------------------------------
+
+def _frame_seed(frame):
+    """Graine déterministe dérivée du contenu de l'image."""
+    return int(frame[::32, ::32].astype(np.int64).sum()) % (2 ** 32)
+
+
+class _StubTensor:
+    """Imite l'accès tensor.cpu().numpy() utilisé par le post-traitement YOLO."""
+
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _StubBoxes:
+    """Imite ultralytics Boxes: colonnes cls, conf (N,) et xyxy (N, 4)."""
+
+    def __init__(self, cls, conf, xyxy):
+        self.cls = _StubTensor(np.asarray(cls, dtype=np.float32))
+        self.conf = _StubTensor(np.asarray(conf, dtype=np.float32))
+        self.xyxy = _StubTensor(np.asarray(xyxy, dtype=np.float32).reshape(-1, 4))
+
+
+class _StubResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubYOLO:
+    """YOLO factice: ~12 boîtes par image, tirées d'une graine dérivée de l'image."""
+
+    def __init__(self):
+        labels = list(dm.YOLO_OBSTACLES) + ["dog", "umbrella", "kite"] # quelques classes filtrées
+        self.names = dict(enumerate(labels))
+
+    def _predict(self, frame):
+        rng = np.random.default_rng(_frame_seed(frame))
+        h, w = frame.shape[:2]
+        cls, conf, xyxy = [], [], []
+        for _ in range(12):
+            x1, y1 = rng.integers(0, w - 20), rng.integers(0, h - 20)
+            x2, y2 = min(w, x1 + rng.integers(20, w // 3)), min(h, y1 + rng.integers(20, h // 3))
+            cls.append(int(rng.integers(0, len(self.names))))
+            conf.append(float(rng.uniform(0.1, 1.0)))
+            xyxy.append([x1, y1, x2, y2])
+        return _StubResult(_StubBoxes(cls, conf, xyxy))
+
+    def __call__(self, frames, verbose=False):
+        frames = frames if isinstance(frames, list) else [frames]
+        return [self._predict(frame) for frame in frames]
+
+
+class _StubConfig:
+    def __init__(self, id2label):
+        self.id2label = id2label
+
+
+class StubMask2Former:
+    """Mask2Former factice: seule la configuration (id2label) est utilisée hors de _mapillary_forward."""
+
+    def __init__(self):
+        labels = list(dm.MAPILLARY_OBSTACLES) + list(STUB_BACKGROUND_LABELS)
+        self.config = _StubConfig(dict(enumerate(labels)))
+
+
+def stub_mapillary_forward(frames, scale=None):
+    """
+    Remplaçant de detector_module._mapillary_forward: conversion d'entrée réelle,
+    carte de segmentation factice (grille de classes issue de l'image, contours
+    irréguliers) à la résolution demandée par le profil.
+    """
+    scale = dm.PERFORMANCE_PROFILES[dm.PERFORMANCE_PROFILE]["seg_scale"] if scale is None else scale
+    num_classes = len(dm.mapillary_model.config.id2label)
+
+    with stage("mapillary_preprocess"):
+        from PIL import Image
+        pil_images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+
+    seg_maps = []
+    with stage("mapillary_forward"):
+        for frame, pil_image in zip(frames, pil_images):
+            h, w = frame.shape[:2]
+            small = cv2.resize(np.asarray(pil_image.convert("L")), (max(1, w // STUB_SEG_CELL), max(1, h // STUB_SEG_CELL)),
+                               interpolation=cv2.INTER_AREA)
+            seg_maps.append((small.astype(np.int32) * num_classes // 256).astype(np.int32))
+
+    with stage("mapillary_postprocess"):
+        results = []
+        for frame, seg_map in zip(frames, seg_maps):
+            h, w = frame.shape[:2]
+            target = (max(1, round(w * scale)), max(1, round(h * scale))) if scale < 1.0 else (w, h)
+            results.append(cv2.resize(seg_map, target, interpolation=cv2.INTER_NEAREST))
+        return results
+
+
+def install_stub_models():
+    """Remplace les modèles par les modèles factices (aucun chargement de poids)."""
+    dm._ensure_models = lambda names=("yolo", "mapillary"): None
+    dm.yolo = StubYOLO()
+    dm.mapillary_model = StubMask2Former()
+    dm.processor = object() # Seul le test "is not None" est utilisé
+    dm._mapillary_forward = stub_mapillary_forward
+    # Les exécuteurs par modèle fixent le nombre de threads torch: exécution séquentielle
+    dm.CONCURRENT_DETECTION = False
+
+
+# ---------------------------------------------------------
+# MESURES
+# ---------------------------------------------------------
+
+def run_image(path, work_dir, fsync):
+    """Pipeline complet sur une image (comme /api/detect, sortie écrite de façon synchrone)."""
+    name = os.path.basename(path)
+    with trace() as t:
+        with stage("image_decode"):
+            frame = cv2.imread(path)
+        obstacles = dm.detect_obstacles_combined(frame)
+        image_bytes = encode_image(name, dm.annotate_frame(frame, obstacles))
+        with stage("json_export"):
+            report = json.dumps(dm.build_detections_report(name, obstacles), indent=2).encode('utf-8')
+        _write_atomic(os.path.join(work_dir, f"annotated_{name}"), image_bytes, fsync)
+        _write_atomic(os.path.join(work_dir, os.path.splitext(name)[0] + ".json"), report, fsync)
+    return t
+
+
+def summarize(samples):
+    """p50/p95/p99, moyenne et débit (images/s) par étape (temps cumulé de l'étape par image)."""
+    rows = {}
+    for name, values in samples.items():
+        values = np.asarray(values)
+        mean = float(values.mean())
+        rows[name] = {
+            'images': int(values.size),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'mean_ms': mean,
+            'throughput_per_s': 1000.0 / mean if mean > 0 else float('inf')
+        }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximal d'images")
+    parser.add_argument('--repeat', type=int, default=3, help="Passages mesurés sur le jeu d'images")
+    parser.add_argument('--warmup', type=int, default=1, help="Passages de préchauffage (non mesurés)")
+    parser.add_argument('--stub-models', action='store_true', help="Modèles factices (sans poids)")
+    parser.add_argument('--no-fsync', action='store_true', help="Écriture disque sans fsync")
+    parser.add_argument('--json', help="Enregistre les résultats dans ce fichier JSON")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))[:args.limit]
+    paths = [os.path.join(args.images_dir, f) for f in names]
+    if not paths:
+        sys.exit(f"Aucune image dans {args.images_dir}")
+
+    dm.DETECTION_CACHE_ENABLED = False # Chaque passage exécute réellement le pipeline
+    dm.SEG_MAP_STORE_ENABLED = False # Mask2Former mesuré à chaque passage; cartes factices jamais stockées
+    if args.stub_models:
+        install_stub_models()
+    else:
+        dm._ensure_models()
+
+    print(f"[INFO] {len(paths)} image(s) x {args.repeat} passage(s) | modèles: {'factices' if args.stub_models else 'réels'} | "
+          f"backend {dm.INFERENCE_BACKEND}, profil {dm.PERFORMANCE_PROFILE} | Python {platform.python_version()}, "
+          f"OpenCV {cv2.__version__}, NumPy {np.__version__}, {os.cpu_count()} cœur(s)")
+
+    samples = {}
+    with tempfile.TemporaryDirectory(prefix="bench_stages_") as work_dir:
+        for _ in range(args.warmup):
+            for path in paths:
+                run_image(path, work_dir, not args.no_fsync)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for path in paths:
+                t = run_image(path, work_dir, not args.no_fsync)
+                for name, entry in t.stages.items():
+                    samples.setdefault(name, []).append(entry['wall_ms'])
+                samples.setdefault("total", []).append(t.totals['total_ms'])
+        elapsed = time.perf_counter() - start
+
+    rows = summarize(samples)
+    order = [s for s in STAGE_ORDER if s in rows] + sorted(set(rows) - set(STAGE_ORDER) - {"total"}) + ["total"]
+    print(f"\n{'étape':>22} | {'images':>6} | {'p50 (ms)':>9} | {'p95 (ms)':>9} | {'p99 (ms)':>9} | {'débit (/s)':>10}")
+    print("-" * 82)
+    for name in order:
+        r = rows[name]
+        print(f"{name:>22} | {r['images']:>6} | {r['p50_ms']:>9.2f} | {r['p95_ms']:>9.2f} | {r['p99_ms']:>9.2f} | "
+              f"{r['throughput_per_s']:>10.1f}")
+    images_per_s = len(paths) * args.repeat / elapsed
+    print(f"\nDébit de bout en bout: {images_per_s:.2f} images/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'stub_models': args.stub_models, 'images': len(paths), 'repeat': args.repeat,
+                       'images_per_s': images_per_s, 'stages': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Comparaison des backends d'inférence (torch / onnx / torchscript) sur ressources/images/:
+parité des détections par rapport au backend torch et latence moyenne par modèle.
+
+Pour Mask2Former, exporté en traçant une image factice de 512x512, les logits
+du modèle exporté sont aussi comparés à ceux du modèle eager sur les images
+réelles et sur des images aléatoires d'autres tailles (--check-sizes, 1080p par
+défaut): un export dont les branches de Swin ont été figées à 512x512 y diverge.
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/compare_backends.py
+    python benchmarks/compare_backends.py --backends torch onnx --limit 5
+    python benchmarks/compare_backends.py --check-sizes 1080x1920 720x1280 480x640
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from merge_engine import iou_matrix
+
+
+def match_rate(reference, candidate, iou_threshold=0.5):
+    """Part des détections de référence retrouvées (même classe, IoU >= seuil) dans `candidate`."""
+    if not reference:
+        return 1.0 if not candidate else 0.0
+    found = 0
+    for cls in {obs['class'] for obs in reference}:
+        ref_boxes = [obs['bbox'] for obs in reference if obs['class'] == cls]
+        cand_boxes = [obs['bbox'] for obs in candidate if obs['class'] == cls]
+        if cand_boxes:
+            found += int((iou_matrix(ref_boxes, cand_boxes).max(axis=1) >= iou_threshold).sum())
+    return found / len(reference)
+
+
+def logits_gap(eager_model, frames):
+    """Écart absolu maximal des logits Mask2Former entre le backend chargé et le modèle eager."""
+    import torch
+    from PIL import Image
+
+    worst = 0.0
+    for frame in frames:
+        inputs = dm.processor(images=[Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))], return_tensors="pt")
+        with torch.no_grad():
+            expected = eager_model(**inputs)
+            actual = dm.mapillary_model(**inputs)
+        for name in ('class_queries_logits', 'masks_queries_logits'):
+            reference, output = getattr(expected, name), torch.as_tensor(getattr(actual, name))
+            if output.shape != reference.shape:
+                return float('inf')
+            worst = max(worst, float((output - reference).abs().max()))
+    return worst
+
+
+def parse_size(text):
+    """'1080x1920' -> (1080, 1920) (hauteur x largeur)."""
+    height, width = (int(v) for v in text.lower().split('x'))
+    return height, width
+
+
+def run_backend(backend, frames):
+    """Charge les modèles du backend et retourne (détections, latences) par modèle."""
+    dm.set_inference_backend(backend)
+    dm._ensure_models()
+    # Préchauffage (premier appel plus lent: allocation, optimisation du graphe)
+    dm.detect_obstacles_yolo(frames[0])
+    dm.detect_obstacles_mapillary(frames[0])
+
+    detections = {'yolo': [], 'mapillary': []}
+    timings = {'yolo': [], 'mapillary': []}
+    for frame in frames:
+        for name, fn in (('yolo', dm.detect_obstacles_yolo), ('mapillary', dm.detect_obstacles_mapillary)):
+            start = time.perf_counter()
+            detections[name].append(fn(frame))
+            timings[name].append((time.perf_counter() - start) * 1000)
+    return detections, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'torchscript'])
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximal d'images")
+    parser.add_argument('--check-sizes', type=parse_size, nargs='*', default=[(1080, 1920)],
+                        help="Tailles (HxL) d'images aléatoires ajoutées à la comparaison des logits")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(args.images_dir, f)) for f in names[:args.limit]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        sys.exit(f"Aucune image lisible dans {args.images_dir}")
+
+    backends = ['torch'] + [b for b in args.backends if b != 'torch']
+    rng = np.random.default_rng(0)
+    check_frames = frames + [rng.integers(0, 256, (h, w, 3), dtype=np.uint8) for h, w in args.check_sizes]
+    results, gaps = {}, {}
+    eager_model = None
+    for backend in backends:
+        print(f"[INFO] Backend {backend}: {len(frames)} image(s)...")
+        results[backend] = run_backend(backend, frames)
+        if backend == 'torch':
+            eager_model = dm.mapillary_model # Conservé comme référence des logits
+        else:
+            gaps[backend] = logits_gap(eager_model, check_frames)
+
+    reference = results['torch'][0]
+    sizes = sorted({frame.shape[:2] for frame in check_frames})
+    print(f"\nÉcart des logits Mask2Former mesuré sur les tailles {sizes}")
+    print(f"\n{'backend':>12} | {'modèle':>9} | {'moy. (ms)':>10} | {'p95 (ms)':>9} | {'accél.':>7} | "
+          f"{'parité (IoU>=0.5)':>17} | écart logits")
+    print("-" * 96)
+    for backend in backends:
+        detections, timings = results[backend]
+        for name in ('yolo', 'mapillary'):
+            mean_ms = float(np.mean(timings[name]))
+            p95_ms = float(np.percentile(timings[name], 95))
+            speedup = float(np.mean(results['torch'][1][name])) / mean_ms
+            parity = np.mean([match_rate(ref, cand) for ref, cand in zip(reference[name], detections[name])])
+            gap = f"{gaps[backend]:.2e}" if name == 'mapillary' and backend in gaps else "-"
+            print(f"{backend:>12} | {name:>9} | {mean_ms:>10.1f} | {p95_ms:>9.1f} | {speedup:>6.2f}x | "
+                  f"{parity:>17.1%} | {gap}")
+
+
+if __name__ == '__main__':
+    main()
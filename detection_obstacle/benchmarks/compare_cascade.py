@@ -0,0 +1,118 @@
+"""
+Comparaison de la cascade YOLO -> Mask2Former (segmentation complète, réduite,
+reprise ou sautée selon l'image) avec le pipeline complet, sur les images de
+ressources/images/: chemins suivis, latence, débit (images/s), et obstacles
+manqués par priorité (détections de référence non retrouvées, même classe et
+IoU >= 0.5).
+
+Les budgets de latence sont exprimés en fraction de la latence moyenne de la
+référence (--budget-fractions) ou en millisecondes (--budget-ms).
+--repeat-frames N répète chaque image N fois de suite (caméra immobile).
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/compare_cascade.py
+    python benchmarks/compare_cascade.py --budget-fractions 0.8 0.5 --repeat-frames 3 --limit 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from cascade_policy import CASCADE_PATHS
+from compare_backends import match_rate
+from instrumentation import trace
+
+PRIORITIES = (1, 2, 3)
+
+
+def run_policy(frames, enabled, policy=None):
+    """Détections, latences (ms) et chemins de la cascade par image pour une politique."""
+    defaults = (dm.CASCADE_ENABLED, dm.CASCADE_POLICY)
+    dm.CASCADE_ENABLED = enabled
+    dm.CASCADE_POLICY = {**dm.CASCADE_POLICY, **(policy or {})}
+    try:
+        dm.detect_obstacles_combined(frames[0]) # Préchauffage
+        dm.cascade_policy.reset() # La segmentation du préchauffage ne doit pas être reprise
+        detections, timings, paths = [], [], []
+        for frame in frames:
+            start = time.perf_counter()
+            with trace() as t:
+                detections.append(dm.detect_obstacles_combined(frame))
+            timings.append((time.perf_counter() - start) * 1000)
+            paths.append(t.notes['cascade']['path'] if 'cascade' in t.notes else "full")
+        return detections, timings, paths
+    finally:
+        dm.CASCADE_ENABLED, dm.CASCADE_POLICY = defaults
+
+
+def missed_by_priority(reference, candidate):
+    """Obstacles de référence non retrouvés et rappel, par priorité."""
+    result = {}
+    for priority in PRIORITIES:
+        ref = [[o for o in obs if o['priority'] == priority] for obs in reference]
+        cand = [[o for o in obs if o['priority'] == priority] for obs in candidate]
+        total = sum(len(r) for r in ref)
+        found = sum(len(r) * match_rate(r, c) for r, c in zip(ref, cand) if r)
+        result[priority] = (int(round(total - found)), found / total if total else 1.0)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximal d'images")
+    parser.add_argument('--repeat-frames', type=int, default=1, help="Répétitions consécutives de chaque image")
+    parser.add_argument('--budget-fractions', type=float, nargs='*', default=[0.75, 0.5],
+                        help="Budgets en fraction de la latence moyenne de la référence")
+    parser.add_argument('--budget-ms', type=float, nargs='*', default=[], help="Budgets absolus (ms)")
+    parser.add_argument('--skip-min-critical', type=int, default=dm.CASCADE_POLICY['skip_min_critical'])
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(args.images_dir, f)) for f in names[:args.limit]]
+    frames = [frame for frame in frames for _ in range(max(1, args.repeat_frames)) if frame is not None]
+    if not frames:
+        sys.exit(f"Aucune image lisible dans {args.images_dir}")
+
+    dm.DETECTION_CACHE_ENABLED = False # Chaque politique exécute réellement les modèles
+    dm.SEG_MAP_STORE_ENABLED = False
+    dm._ensure_models()
+
+    print(f"[INFO] Référence (cascade désactivée): {len(frames)} image(s)...")
+    results = {'référence': run_policy(frames, enabled=False)}
+    reference_ms = np.mean(results['référence'][1])
+
+    policies = {'cascade': {'latency_budget_ms': None}}
+    for fraction in args.budget_fractions:
+        policies[f"budget {fraction:.0%}"] = {'latency_budget_ms': fraction * reference_ms}
+    for budget in args.budget_ms:
+        policies[f"budget {budget:.0f} ms"] = {'latency_budget_ms': budget}
+    for name, policy in policies.items():
+        policy['skip_min_critical'] = args.skip_min_critical
+        budget = policy['latency_budget_ms']
+        print(f"[INFO] Politique {name} (budget: {'aucun' if budget is None else f'{budget:.0f} ms'})...")
+        results[name] = run_policy(frames, enabled=True, policy=policy)
+
+    reference = results['référence'][0]
+    path_header = " | ".join(f"{path:>7}" for path in CASCADE_PATHS)
+    missed_header = " | ".join(f"{f'manqués P{p}':>11} | {f'rappel P{p}':>9}" for p in PRIORITIES)
+    header = f"{'politique':>14} | {path_header} | {'moy. (ms)':>9} | {'images/s':>8} | {'accél.':>6} | {missed_header}"
+    print("\n" + header)
+    print("-" * len(header))
+    for name, (detections, timings, paths) in results.items():
+        counts = " | ".join(f"{paths.count(path):>7}" for path in CASCADE_PATHS)
+        missed = missed_by_priority(reference, detections)
+        missed_cols = " | ".join(f"{missed[p][0]:>11} | {missed[p][1]:>9.1%}" for p in PRIORITIES)
+        mean_ms = np.mean(timings)
+        print(f"{name:>14} | {counts} | {mean_ms:>9.1f} | {1000 / mean_ms:>8.2f} | "
+              f"{reference_ms / mean_ms:>5.2f}x | {missed_cols}")
+
+
+if __name__ == '__main__':
+    main()
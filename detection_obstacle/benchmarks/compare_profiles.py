@@ -0,0 +1,78 @@
+"""
+Écarts de précision et de latence des profils de performance Mask2Former
+(quality / balanced / fast) par rapport au profil "quality" (pleine précision),
+sur les images de ressources/images/.
+
+Pour chaque priorité: rappel (détections "quality" retrouvées, même classe et
+IoU >= 0.5) et précision (détections du profil présentes dans "quality").
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/compare_profiles.py
+    python benchmarks/compare_profiles.py --profiles quality fast --limit 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from compare_backends import match_rate
+
+
+def run_profile(profile, frames):
+    """Détections Mapillary et latences (ms) du profil sur toutes les images."""
+    dm.set_performance_profile(profile)
+    dm._ensure_models(("mapillary",))
+    dm.detect_obstacles_mapillary(frames[0]) # Préchauffage
+
+    detections, timings = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        detections.append(dm.detect_obstacles_mapillary(frame))
+        timings.append((time.perf_counter() - start) * 1000)
+    return detections, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=list(dm.PERFORMANCE_PROFILES))
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximal d'images")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(args.images_dir, f)) for f in names[:args.limit]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        sys.exit(f"Aucune image lisible dans {args.images_dir}")
+
+    profiles = ['quality'] + [p for p in args.profiles if p != 'quality']
+    results = {}
+    for profile in profiles:
+        print(f"[INFO] Profil {profile} ({dm.PERFORMANCE_PROFILES[profile]}): {len(frames)} image(s)...")
+        results[profile] = run_profile(profile, frames)
+
+    baseline, baseline_ms = results['quality']
+    print(f"\n{'profil':>9} | {'moy. (ms)':>10} | {'accél.':>7} | "
+          + " | ".join(f"P{p} rappel / précision" for p in (1, 2, 3)))
+    print("-" * 105)
+    for profile in profiles:
+        detections, timings = results[profile]
+        cells = []
+        for priority in (1, 2, 3):
+            ref = [[o for o in obs if o['priority'] == priority] for obs in baseline]
+            cand = [[o for o in obs if o['priority'] == priority] for obs in detections]
+            recall = np.mean([match_rate(r, c) for r, c in zip(ref, cand)])
+            precision = np.mean([match_rate(c, r) for r, c in zip(ref, cand)])
+            cells.append(f"{recall:>9.1%} / {precision:<9.1%}")
+        speedup = float(np.mean(baseline_ms)) / float(np.mean(timings))
+        print(f"{profile:>9} | {np.mean(timings):>10.1f} | {speedup:>6.2f}x | " + " | ".join(cells))
+
+
+if __name__ == '__main__':
+    main()
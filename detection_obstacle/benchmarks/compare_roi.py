@@ -0,0 +1,90 @@
+"""
+Comparaison des modes de ROI et du tuilage par rapport au traitement plein cadre
+sur les images de ressources/images/: pixels soumis aux modèles, latence, et
+rappel des obstacles de priorité 1 (détections plein cadre retrouvées, même
+classe et IoU >= 0.5), plus le nombre de détections P1 supplémentaires.
+
+Usage (depuis detection_obstacle/):
+    python benchmarks/compare_roi.py
+    python benchmarks/compare_roi.py --configs horizon tiling --limit 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import detector_module as dm
+from compare_backends import match_rate
+
+# Réglages comparés (variables de detector_module), "full" étant la référence
+CONFIGS = {
+    "full": {},
+    "horizon": {"YOLO_ROI_MODE": "horizon", "SEG_ROI_MODE": "horizon"},
+    "lower_band": {"SEG_ROI_MODE": "lower_band"},
+    "tiling": {"TILING_ENABLED": True},
+    "horizon+tiling": {"YOLO_ROI_MODE": "horizon", "SEG_ROI_MODE": "horizon", "TILING_ENABLED": True},
+}
+
+
+def run_config(name, frames):
+    """Détections, latences (ms) et pixels traités par image pour un réglage."""
+    defaults = {key: getattr(dm, key) for key in CONFIGS[name]}
+    for key, value in CONFIGS[name].items():
+        setattr(dm, key, value)
+    try:
+        dm.detect_obstacles_combined(frames[0]) # Préchauffage
+        detections, timings, pixels = [], [], []
+        for frame in frames:
+            start = time.perf_counter()
+            detections.append(dm.detect_obstacles_combined(frame))
+            timings.append((time.perf_counter() - start) * 1000)
+            pixels.append(sum(dm.pixels_processed(frame.shape).values()))
+        return detections, timings, pixels
+    finally:
+        for key, value in defaults.items():
+            setattr(dm, key, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), default=list(CONFIGS))
+    parser.add_argument('--images-dir', default=dm.IMAGES_DIR)
+    parser.add_argument('--limit', type=int, default=None, help="Nombre maximal d'images")
+    args = parser.parse_args()
+
+    names = sorted(f for f in os.listdir(args.images_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
+    frames = [cv2.imread(os.path.join(args.images_dir, f)) for f in names[:args.limit]]
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        sys.exit(f"Aucune image lisible dans {args.images_dir}")
+
+    dm.DETECTION_CACHE_ENABLED = False # Chaque réglage exécute réellement les modèles
+    dm.SEG_MAP_STORE_ENABLED = False
+    dm._ensure_models()
+
+    configs = ['full'] + [c for c in args.configs if c != 'full']
+    results = {}
+    for name in configs:
+        print(f"[INFO] Réglage {name} ({CONFIGS[name] or 'plein cadre'}): {len(frames)} image(s)...")
+        results[name] = run_config(name, frames)
+
+    baseline, baseline_ms, baseline_px = results['full']
+    ref_p1 = [[o for o in obs if o['priority'] == 1] for obs in baseline]
+    print(f"\n{'réglage':>15} | {'pixels':>7} | {'moy. (ms)':>10} | {'accél.':>7} | {'rappel P1':>9} | {'P1 en plus':>10}")
+    print("-" * 75)
+    for name in configs:
+        detections, timings, pixels = results[name]
+        cand_p1 = [[o for o in obs if o['priority'] == 1] for obs in detections]
+        recall = np.mean([match_rate(r, c) for r, c in zip(ref_p1, cand_p1)])
+        extra = sum(round(len(c) * (1 - match_rate(c, r))) for r, c in zip(ref_p1, cand_p1))
+        print(f"{name:>15} | {np.sum(pixels) / np.sum(baseline_px):>6.0%} | {np.mean(timings):>10.1f} | "
+              f"{np.mean(baseline_ms) / np.mean(timings):>6.2f}x | {recall:>9.1%} | {extra:>10d}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from detection_set import DetectionSet
+
+# ---------------------------------------------------------
+# CASCADE YOLO -> MASK2FORMER (segmentation à la demande)
+# ---------------------------------------------------------
+# YOLO (rapide) s'exécute d'abord; la politique décide ensuite, image par image,
+# du chemin de la segmentation (Swin-Large, de loin l'étape la plus coûteuse):
+#
+#  - "reuse":   image quasi identique à la dernière image segmentée (caméra
+#               immobile, scène statique): ses obstacles Mapillary sont repris
+#  - "skip":    YOLO a déjà trouvé assez d'obstacles critiques (P1) pour alerter
+#               l'utilisateur, et la dernière segmentation est récente
+#  - "full":    segmentation à la résolution du profil de performance
+#  - "reduced": segmentation à résolution réduite, quand la segmentation complète
+#               ne tient pas dans le budget de latence restant après YOLO
+#
+# Sans budget, le chemin par défaut est "full". Avec un budget, la durée de la
+# segmentation est estimée (moyenne mobile des mesures, par mégapixel et par
+# résolution): "full" si elle tient, sinon "reduced", sinon "skip" tant que la
+# dernière segmentation n'est pas trop ancienne.
+
+# Chemins de la segmentation ("cached": résultat complet relu du cache de détection)
+FULL, REDUCED, REUSE, SKIP, CACHED = "full", "reduced", "reuse", "skip", "cached"
+CASCADE_PATHS = (FULL, REDUCED, REUSE, SKIP)
+
+# Poids de la dernière mesure dans l'estimation de durée (moyenne mobile exponentielle)
+_EMA_WEIGHT = 0.3
+
+
+def _scene_signature(frame):
+    """Miniature en niveaux de gris comparée pour détecter une image inchangée (comme video_stream)."""
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+class CascadePolicy:
+    """État de la cascade (dernière segmentation, durées estimées) et décision par image."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = None # (instant, forme, vignette, obstacles Mapillary) de la dernière segmentation
+        self._ms_per_mpx = {} # résolution de segmentation -> durée estimée par mégapixel (ms)
+        self.stats_counters = {path: 0 for path in CASCADE_PATHS}
+
+    def _estimate_ms(self, scale, megapixels):
+        rate = self._ms_per_mpx.get(round(scale, 4))
+        return None if rate is None else rate * megapixels
+
+    def decide(self, frame, yolo_obstacles, yolo_ms, policy, profile_scale=1.0):
+        """
+        Chemin de la segmentation pour cette image, d'après `policy` (voir CASCADE_POLICY
+        dans detector_module.py). Retourne (décision, obstacles Mapillary repris ou None);
+        la décision est un dictionnaire sérialisable (réponses de l'API).
+        """
+        now = time.monotonic()
+        signature = _scene_signature(frame)
+        megapixels = frame.shape[0] * frame.shape[1] / 1e6
+        critical = int(DetectionSet.from_obstacles(yolo_obstacles).priority_counts()[1])
+        reduced_scale = profile_scale * policy['reduced_scale']
+
+        with self._lock:
+            age = motion = None
+            if self._last is not None:
+                last_time, last_shape, last_signature, last_obstacles = self._last
+                age = now - last_time
+                if last_shape == frame.shape:
+                    motion = float(np.abs(signature - last_signature).mean())
+            budget = policy['latency_budget_ms']
+            remaining = None if budget is None else budget - yolo_ms
+            estimate_full = self._estimate_ms(profile_scale, megapixels)
+            estimate_reduced = self._estimate_ms(reduced_scale, megapixels)
+            recent = age is not None and age <= policy['max_skip_age']
+
+            reused = None
+            if motion is not None and motion <= policy['static_threshold'] and age <= policy['max_reuse_age']:
+                path, reason, reused = REUSE, "static_frame", last_obstacles
+            elif policy['skip_min_critical'] and critical >= policy['skip_min_critical'] and recent:
+                path, reason = SKIP, "critical_found"
+            elif remaining is None:
+                path, reason = FULL, "no_budget"
+            elif estimate_full is None or estimate_full <= remaining:
+                path, reason = FULL, "within_budget" if estimate_full is not None else "no_estimate"
+            elif estimate_reduced is None or estimate_reduced <= remaining:
+                path, reason = REDUCED, "over_budget"
+            elif recent:
+                path, reason = SKIP, "over_budget"
+            else:
+                path, reason = REDUCED, "stale_segmentation" # Segmentation trop ancienne pour être sautée
+            self.stats_counters[path] += 1
+
+        estimate = {FULL: estimate_full, REDUCED: estimate_reduced}.get(path)
+        decision = {
+            'path': path,
+            'reason': reason,
+            'seg_scale': {FULL: profile_scale, REDUCED: reduced_scale}.get(path),
+            'yolo_ms': round(yolo_ms, 1),
+            'critical_yolo': critical,
+            'since_last_segmentation_s': None if age is None else round(age, 3),
+            'motion': None if motion is None else round(motion, 2),
+            'budget_ms': budget,
+            'estimated_seg_ms': None if estimate is None else round(estimate, 1)
+        }
+        return decision, reused
+
+    def record_segmentation(self, frame, obstacles, scale, seg_ms):
+        """Mémorise une segmentation effectuée (image, obstacles) et met à jour l'estimation de durée."""
+        signature = _scene_signature(frame)
+        megapixels = max(frame.shape[0] * frame.shape[1] / 1e6, 1e-6)
+        key = round(scale, 4)
+        with self._lock:
+            self._last = (time.monotonic(), frame.shape, signature, obstacles)
+            rate = seg_ms / megapixels
+            previous = self._ms_per_mpx.get(key)
+            self._ms_per_mpx[key] = rate if previous is None else (1 - _EMA_WEIGHT) * previous + _EMA_WEIGHT * rate
+
+    def reset(self):
+        """Oublie la dernière segmentation et les estimations (ex: changement de caméra)."""
+        with self._lock:
+            self._last = None
+            self._ms_per_mpx = {}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats['estimated_ms_per_mpx'] = {str(scale): round(rate, 1) for scale, rate in self._ms_per_mpx.items()}
+        return stats
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from detection_set import DetectionSet
+
+# ---------------------------------------------------------
+# CACHE DES RÉSULTATS DE DÉTECTION (adressé par contenu)
+# ---------------------------------------------------------
+# Clé = hash des pixels de l'image + empreinte de la configuration des modèles
+# (identifiants, classes retenues, priorités, seuils). Un changement de
+# configuration produit donc de nouvelles clés: aucun résultat périmé n'est servi.
+#
+# Deux niveaux:
+#   - mémoire: LRU borné en nombre d'entrées
+#   - disque: un fichier JSON par clé, borné en taille totale (éviction des moins récemment utilisés).
+#     Le dossier n'est parcouru qu'au démarrage: un index en mémoire (clés par date d'utilisation,
+#     taille totale) est tenu à jour à chaque lecture, écriture et suppression. Il est resynchronisé
+#     toutes les CACHE_INDEX_RESYNC_INTERVAL secondes pour tenir compte des fichiers écrits par les
+#     autres processus (pool d'inférence)
+
+# Resynchronisation de l'index disque avec le dossier (secondes)
+CACHE_INDEX_RESYNC_INTERVAL = 300
+
+
+def hash_frame(frame):
+    """Hash rapide des pixels d'une image (forme et type inclus)."""
+    frame = np.ascontiguousarray(frame)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{frame.shape}|{frame.dtype}".encode())
+    digest.update(frame.data)
+    return digest.hexdigest()
+
+
+def config_fingerprint(config):
+    """Empreinte stable d'une configuration (dictionnaire sérialisable en JSON)."""
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+class DetectionCache:
+    """Cache LRU mémoire + disque des détections (DetectionSet), avec compteurs de hits/misses."""
+
+    def __init__(self, cache_dir, max_memory_entries=256, max_disk_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._disk_keys = frozenset() # Clés présentes sur disque, à la date _disk_version du dossier
+        self._disk_version = None
+        self._disk_index = OrderedDict() # clé -> taille du fichier, du moins au plus récemment utilisé
+        self._disk_bytes = 0
+        self._index_time = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                      'memory_evictions': 0, 'disk_evictions': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        """Construit l'index disque (ordre des dates de modification) en un seul parcours du dossier."""
+        entries = []
+        try:
+            with os.scandir(self.cache_dir) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.json') and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name[:-len('.json')], stat.st_size))
+        except OSError as e:
+            print(f"[WARN] Lecture du cache impossible ({self.cache_dir}): {e}")
+        entries.sort()
+        with self._lock:
+            self._disk_index = OrderedDict((key, size) for _, key, size in entries)
+            self._disk_bytes = sum(size for _, _, size in entries)
+            self._index_time = time.monotonic()
+
+    @staticmethod
+    def make_key(frame, fingerprint):
+        """Clé du cache pour une image et une empreinte de configuration."""
+        return DetectionCache.key_for_hash(hash_frame(frame), fingerprint)
+
+    @staticmethod
+    def key_for_hash(frame_hash, fingerprint):
+        """Clé du cache pour un hash d'image déjà calculé (voir hash_frame)."""
+        return f"{frame_hash}-{fingerprint}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Retourne les détections en cache (nouveau DetectionSet), ou None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                payload = self._memory[key]
+            else:
+                payload = None
+        if payload is not None:
+            return DetectionSet.from_obstacles(json.loads(payload))
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                payload = f.read()
+            # Mise à jour de la date d'accès: l'éviction disque suit l'ordre LRU
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, payload)
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return DetectionSet.from_obstacles(json.loads(payload))
+
+    def contains(self, key):
+        """Indique si un résultat est en cache, sans le lire ni modifier les compteurs."""
+        with self._lock:
+            if key in self._memory:
+                return True
+        return os.path.exists(self._disk_path(key))
+
+    def disk_version(self):
+        """
+        Date de modification du dossier: change à chaque écriture ou suppression, quel que soit
+        le processus. None si elle date de moins d'une seconde (horodatages du système de fichiers
+        trop grossiers pour distinguer deux écritures rapprochées): rien ne doit alors être mémorisé.
+        """
+        try:
+            mtime_ns = os.stat(self.cache_dir).st_mtime_ns
+        except OSError:
+            return None
+        return mtime_ns if time.time_ns() - mtime_ns > 1_000_000_000 else None
+
+    def cached_keys(self):
+        """
+        Clés en cache (ensemble), pour tester de nombreuses images sans un accès disque
+        par image: le dossier n'est relu que si sa date a changé (voir disk_version).
+        """
+        version = self.disk_version()
+        with self._lock:
+            disk_keys = self._disk_keys if version is not None and version == self._disk_version else None
+        if disk_keys is None:
+            try:
+                disk_keys = frozenset(entry.name[:-len('.json')] for entry in os.scandir(self.cache_dir)
+                                      if entry.name.endswith('.json'))
+            except OSError:
+                disk_keys = frozenset()
+        with self._lock:
+            self._disk_keys, self._disk_version = disk_keys, version
+            return disk_keys.union(self._memory)
+
+    def put(self, key, obstacles):
+        """Enregistre les obstacles (DetectionSet ou liste) dans les deux niveaux du cache."""
+        payload = json.dumps(DetectionSet.from_obstacles(obstacles).to_obstacles())
+        with self._lock:
+            self._remember(key, payload)
+
+        # Écriture atomique (fichier temporaire puis renommage)
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[WARN] Écriture du cache impossible ({path}): {e}")
+            return
+        with self._lock:
+            self._disk_bytes += len(payload) - self._disk_index.pop(key, 0) # JSON en ASCII: 1 octet par caractère
+            self._disk_index[key] = len(payload)
+            resync = time.monotonic() - self._index_time > CACHE_INDEX_RESYNC_INTERVAL
+        if resync:
+            self._load_disk_index()
+        self._evict_disk()
+
+    def _remember(self, key, payload):
+        """Ajoute au niveau mémoire (appelé sous verrou) et applique la borne LRU."""
+        self._memory[key] = payload
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        """Supprime les fichiers les moins récemment utilisés tant que la taille totale dépasse la borne."""
+        evicted = []
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes and self._disk_index:
+                key, size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(key)
+        for key in evicted:
+            try:
+                os.remove(self._disk_path(key))
+            except FileNotFoundError:
+                continue # Déjà supprimé (par un autre processus)
+            except OSError as e:
+                print(f"[WARN] Suppression du cache impossible ({key}): {e}")
+                continue
+            with self._lock:
+                self.stats['disk_evictions'] += 1
+
+    def clear(self):
+        """Vide les deux niveaux du cache (les compteurs sont conservés)."""
+        with self._lock:
+            self._memory.clear()
+            self._disk_index.clear()
+            self._disk_bytes = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.json'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def get_stats(self):
+        """Compteurs et occupation du cache (pour l'API)."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
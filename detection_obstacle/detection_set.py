@@ -0,0 +1,271 @@
+import struct
+
+import numpy as np
+
+# ---------------------------------------------------------
+# ENSEMBLE DE DÉTECTIONS EN COLONNES (tableaux NumPy)
+# ---------------------------------------------------------
+# Les détections circulent dans tout le pipeline (modèles -> fusion -> tri ->
+# annotation -> rapport) sous forme de colonnes NumPy plutôt que d'une liste
+# de dictionnaires: le NMS, le tri et les décomptes travaillent directement sur
+# les tableaux, sans reconstruire de listes Python à chaque étape.
+#
+# Un DetectionSet se comporte comme une séquence en lecture seule de
+# dictionnaires d'obstacles ({'bbox', 'class', 'confidence', 'priority',
+# 'source'[, 'color']}): le code qui itère sur les obstacles fonctionne sans
+# changement. Les opérations (take, offset, concat...) retournent un nouvel
+# ensemble; les tableaux ne sont jamais modifiés sur place.
+#
+# Format binaire compact (pack / unpack, type application/x-navsight-detections),
+# entiers et flottants en little-endian:
+#   en-tête   'NVDS', version u8, réservé u8, nombre de classes u16, nombre de détections u32
+#   classes   pour chaque classe: longueur u8 + nom UTF-8
+#   colonnes  boîtes int32 (N, 4) | confiance float32 (N) | classe u16 (N)
+#             | priorité u8 (N) | source u8 (N) | couleur RGB u8 (N, 3)
+# soit 27 octets par détection (contre ~150 en JSON).
+
+# Sources connues (index stocké dans la colonne "source")
+SOURCES = ("unknown", "yolo", "mapillary")
+_SOURCE_INDEX = {name: i for i, name in enumerate(SOURCES)}
+
+BINARY_MAGIC = b'NVDS'
+BINARY_VERSION = 1
+BINARY_MIMETYPE = 'application/x-navsight-detections'
+_BINARY_HEADER = struct.Struct('<4sBBHI')
+
+
+def _colors_lut(default_colors):
+    """Table priorité -> couleur BGR par défaut (blanc pour les priorités inconnues)."""
+    lut = np.full((256, 3), 255, dtype=np.uint8)
+    for priority, color in default_colors.items():
+        lut[int(priority)] = color
+    return lut
+
+
+class DetectionSet:
+    """Détections en colonnes: boîtes, confiances, classes, priorités, sources et couleurs."""
+
+    __slots__ = ('boxes', 'confidence', 'class_ids', 'classes', 'priority', 'source_ids', 'colors', 'has_color')
+
+    def __init__(self, boxes=None, confidence=None, class_ids=None, classes=(), priority=None,
+                 source_ids=None, colors=None, has_color=None):
+        n = 0 if boxes is None else len(boxes)
+        self.boxes = np.zeros((0, 4), dtype=np.int32) if boxes is None else np.asarray(boxes, dtype=np.int32).reshape(n, 4)
+        # Confiance en float64: valeurs identiques à celles produites par les modèles (rapport JSON inchangé)
+        self.confidence = np.asarray(confidence if confidence is not None else np.zeros(n), dtype=np.float64)
+        self.class_ids = np.asarray(class_ids if class_ids is not None else np.zeros(n), dtype=np.int32)
+        self.classes = tuple(classes)
+        self.priority = np.asarray(priority if priority is not None else np.zeros(n), dtype=np.uint8)
+        self.source_ids = np.asarray(source_ids if source_ids is not None else np.zeros(n), dtype=np.uint8)
+        # Couleur propre à la détection (BGR) si has_color, sinon couleur par défaut de sa priorité
+        self.colors = np.zeros((n, 3), dtype=np.uint8) if colors is None else np.asarray(colors, dtype=np.uint8).reshape(n, 3)
+        self.has_color = np.asarray(has_color if has_color is not None else np.zeros(n), dtype=bool)
+
+    # --- Construction ------------------------------------------------
+
+    @classmethod
+    def from_obstacles(cls, obstacles):
+        """
+        Ensemble construit depuis une liste de dictionnaires d'obstacles (retourné tel quel
+        si déjà un ensemble). 'confidence', 'source' et 'color' sont facultatifs.
+        """
+        if isinstance(obstacles, DetectionSet):
+            return obstacles
+        obstacles = list(obstacles)
+        class_index = {}
+        colors = [obs.get('color') for obs in obstacles]
+        return cls(
+            boxes=[obs['bbox'] for obs in obstacles],
+            confidence=[obs.get('confidence', 0.0) for obs in obstacles],
+            class_ids=[class_index.setdefault(obs['class'], len(class_index)) for obs in obstacles],
+            classes=class_index,
+            priority=[obs['priority'] for obs in obstacles],
+            source_ids=[_SOURCE_INDEX.get(obs.get('source', 'unknown'), 0) for obs in obstacles],
+            colors=[(0, 0, 0) if color is None else color for color in colors],
+            has_color=[color is not None for color in colors]
+        )
+
+    @classmethod
+    def from_columns(cls, boxes, confidence, class_names, priority, source, colors=None):
+        """
+        Ensemble d'une seule source depuis des colonnes: class_names liste les noms de
+        classe par détection; colors (N, 3) BGR est optionnel (couleur par défaut sinon).
+        """
+        classes, class_ids = np.unique(np.asarray(class_names, dtype=object).astype(str), return_inverse=True)
+        n = len(class_ids)
+        return cls(boxes=np.asarray(boxes).reshape(n, 4), confidence=confidence, class_ids=class_ids,
+                   classes=classes.tolist(), priority=priority, source_ids=np.full(n, _SOURCE_INDEX[source]),
+                   colors=colors, has_color=np.full(n, colors is not None))
+
+    @classmethod
+    def concat(cls, sets):
+        """Concatène plusieurs ensembles (ou listes d'obstacles), tables de classes unifiées."""
+        sets = [cls.from_obstacles(s) for s in sets]
+        sets = [s for s in sets if len(s)] or sets[:1]
+        if not sets:
+            return cls()
+        if len(sets) == 1:
+            return sets[0]
+        class_index = {}
+        class_ids = []
+        for s in sets:
+            remap = np.array([class_index.setdefault(name, len(class_index)) for name in s.classes], dtype=np.int32)
+            class_ids.append(remap[s.class_ids])
+        return cls(
+            boxes=np.concatenate([s.boxes for s in sets]),
+            confidence=np.concatenate([s.confidence for s in sets]),
+            class_ids=np.concatenate(class_ids),
+            classes=class_index,
+            priority=np.concatenate([s.priority for s in sets]),
+            source_ids=np.concatenate([s.source_ids for s in sets]),
+            colors=np.concatenate([s.colors for s in sets]),
+            has_color=np.concatenate([s.has_color for s in sets])
+        )
+
+    # --- Séquence d'obstacles ----------------------------------------
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def __bool__(self):
+        return len(self.boxes) > 0
+
+    def __iter__(self):
+        return iter(self.to_obstacles())
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.take([index]).to_obstacles()[0]
+        return self.take(np.arange(len(self))[index] if isinstance(index, slice) else index)
+
+    def __repr__(self):
+        return f"DetectionSet({len(self)} détection(s), {len(self.classes)} classe(s))"
+
+    def to_obstacles(self):
+        """Liste de dictionnaires d'obstacles (types Python natifs, sérialisables en JSON)."""
+        obstacles = []
+        for bbox, class_id, conf, priority, source_id, color, has_color in zip(
+                self.boxes.tolist(), self.class_ids.tolist(), self.confidence.tolist(), self.priority.tolist(),
+                self.source_ids.tolist(), self.colors.tolist(), self.has_color.tolist()):
+            obs = {'bbox': bbox, 'class': self.classes[class_id], 'confidence': conf,
+                   'priority': priority, 'source': SOURCES[source_id]}
+            if has_color:
+                obs['color'] = tuple(color)
+            obstacles.append(obs)
+        return obstacles
+
+    # --- Opérations (retournent un nouvel ensemble) ------------------
+
+    def take(self, indices):
+        """Sous-ensemble (indices entiers ou masque booléen), dans l'ordre des indices."""
+        indices = np.asarray(indices)
+        if indices.dtype != bool:
+            indices = indices.astype(np.intp).reshape(-1)
+        return DetectionSet(self.boxes[indices], self.confidence[indices], self.class_ids[indices], self.classes,
+                            self.priority[indices], self.source_ids[indices], self.colors[indices],
+                            self.has_color[indices])
+
+    def with_boxes(self, boxes):
+        """Mêmes détections avec d'autres boîtes (N, 4)."""
+        return DetectionSet(boxes, self.confidence, self.class_ids, self.classes, self.priority,
+                            self.source_ids, self.colors, self.has_color)
+
+    def offset(self, dx, dy):
+        """Boîtes décalées de (dx, dy): d'une sous-image vers le plein cadre."""
+        if dx == 0 and dy == 0:
+            return self
+        return self.with_boxes(self.boxes + np.array([dx, dy, dx, dy], dtype=np.int32))
+
+    def rescaled(self, sx, sy, width, height):
+        """Boîtes remises à l'échelle (arrondi au plus proche), coin bas-droit borné à (width, height)."""
+        scaled = np.rint(self.boxes * np.array([sx, sy, sx, sy])).astype(np.int64)
+        np.minimum(scaled[:, 2], width, out=scaled[:, 2])
+        np.minimum(scaled[:, 3], height, out=scaled[:, 3])
+        return self.with_boxes(scaled)
+
+    def merge_scores(self):
+        """Score de fusion: confiance pondérée par la priorité (P1 x3, P2 x2, P3 x1)."""
+        return self.confidence * (4 - self.priority.astype(np.float64))
+
+    def sorted_by_priority(self):
+        """Ensemble trié par priorité (tri stable: l'ordre est conservé à priorité égale)."""
+        return self.take(np.argsort(self.priority, kind='stable'))
+
+    # --- Décomptes et rapport ----------------------------------------
+
+    def priority_counts(self):
+        """Nombre de détections par priorité (tableau indexé par la priorité)."""
+        return np.bincount(self.priority, minlength=4)
+
+    def by_priority(self):
+        """Décompte par niveau de priorité (bloc "by_priority" du rapport)."""
+        counts = self.priority_counts()
+        return {'critical': int(counts[1]), 'important': int(counts[2]), 'moderate': int(counts[3])}
+
+    def source_counts(self):
+        """Nombre de détections par source."""
+        counts = np.bincount(self.source_ids, minlength=len(SOURCES))
+        return {name: int(counts[i]) for i, name in enumerate(SOURCES)}
+
+    def resolved_colors(self, default_colors):
+        """Couleurs BGR (N, 3): propre à la détection, sinon couleur par défaut de sa priorité."""
+        return np.where(self.has_color[:, None], self.colors, _colors_lut(default_colors)[self.priority])
+
+    def class_names(self):
+        """Nom de classe de chaque détection."""
+        return [self.classes[i] for i in self.class_ids.tolist()]
+
+    def report_detections(self, default_colors):
+        """Liste "detections" du rapport JSON (couleurs converties en RGB)."""
+        rgb = self.resolved_colors(default_colors)[:, ::-1]
+        return [
+            {'class': name, 'bbox': bbox, 'confidence': conf, 'priority': priority,
+             'source': SOURCES[source_id], 'color': color}
+            for name, bbox, conf, priority, source_id, color in zip(
+                self.class_names(), self.boxes.tolist(), self.confidence.tolist(), self.priority.tolist(),
+                self.source_ids.tolist(), rgb.tolist())
+        ]
+
+    # --- Format binaire ----------------------------------------------
+
+    def pack(self, default_colors):
+        """Sérialise l'ensemble au format binaire compact (couleurs résolues, en RGB)."""
+        names = [name.encode('utf-8')[:255] for name in self.classes]
+        parts = [_BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(names), len(self))]
+        parts += [bytes([len(name)]) + name for name in names]
+        parts += [
+            self.boxes.astype('<i4').tobytes(),
+            self.confidence.astype('<f4').tobytes(),
+            self.class_ids.astype('<u2').tobytes(),
+            self.priority.tobytes(),
+            self.source_ids.tobytes(),
+            np.ascontiguousarray(self.resolved_colors(default_colors)[:, ::-1]).tobytes()
+        ]
+        return b''.join(parts)
+
+    @classmethod
+    def unpack(cls, data):
+        """Ensemble relu depuis le format binaire (confiances en précision float32). Lève ValueError si invalide."""
+        data = memoryview(data)
+        if len(data) < _BINARY_HEADER.size:
+            raise ValueError("Données binaires tronquées (en-tête)")
+        magic, version, _, num_classes, n = _BINARY_HEADER.unpack_from(data)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError("Format binaire de détections inconnu")
+        offset = _BINARY_HEADER.size
+        classes = []
+        for _ in range(num_classes):
+            length = data[offset] if offset < len(data) else 0
+            classes.append(bytes(data[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+
+        columns = []
+        for dtype, width in (('<i4', 4), ('<f4', 1), ('<u2', 1), ('u1', 1), ('u1', 1), ('u1', 3)):
+            size = np.dtype(dtype).itemsize * width * n
+            if offset + size > len(data):
+                raise ValueError("Données binaires tronquées (colonnes)")
+            columns.append(np.frombuffer(data, dtype=dtype, count=width * n, offset=offset))
+            offset += size
+        boxes, confidence, class_ids, priority, source_ids, rgb = columns
+        return cls(boxes.reshape(n, 4), confidence, class_ids, classes, priority, source_ids,
+                   rgb.reshape(n, 3)[:, ::-1], np.ones(n, dtype=bool))
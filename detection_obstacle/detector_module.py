@@ -1,12 +1,26 @@
+import contextvars
 import cv2
 import os
 import shutil
 import numpy as np
-from ultralytics import YOLO
-import torch
-from transformers import AutoImageProcessor, Mask2FormerForUniversalSegmentation
 from PIL import Image
 import json 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from region_extraction import extract_obstacle_regions
+from detection_cache import DetectionCache, config_fingerprint, hash_frame
+from seg_map_store import SegMapStore
+from roi_tiling import roi_bounds, tile_grid, dedupe_tile_detections, stitch_seg_maps
+from model_registry import ModelRegistry
+from merge_engine import nms, weighted_box_fusion
+from instrumentation import stage, submit_in_context, note
+from annotation_renderer import AnnotationRenderer, segmentation_palette
+from detection_set import DetectionSet
+from cascade_policy import CascadePolicy, FULL, REDUCED, REUSE, CACHED
+from inference_backends import check_backend, load_yolo_backend, load_mapillary_backend
 
 # ---------------------------------------------------------
 # CONFIGURATION DES CHEMINS
@@ -26,6 +40,7 @@ VIDEOS_DIR = os.path.join(RESOURCES_DIR, "videos")
 OUTPUT_DIR = os.path.join(CURRENT_FILE_DIR, "output")
 ANNOTATED_IMAGES_DIR = os.path.join(OUTPUT_DIR, "annotated_images")
 JSON_DIR = os.path.join(OUTPUT_DIR, "json") # Chemin pour l'export des métadonnées
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache") # Cache disque des résultats de détection
 
 # Créer les répertoires nécessaires (avec exist_ok=True pour éviter les erreurs)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -77,15 +92,171 @@ MIN_AREA_THRESHOLD = {
     3: 250
 }
 
+# ---------------------------------------------------------
+# CONFIGURATION DES OBSTACLES - YOLO
+# ---------------------------------------------------------
+# Classes YOLO acceptées par le système d'obstacle et leur priorité assignée
+YOLO_OBSTACLES = {
+    "person": 1, # Les personnes sont des obstacles critiques/dynamiques
+    "bicycle": 2,
+    "car": 2,
+    "motorcycle": 2,
+    "bus": 2,
+    "truck": 2,
+    "traffic light": 2,
+    "fire hydrant": 2,
+    "stop sign": 2,
+    "bench": 3,
+    "chair": 3,
+    "potted plant": 3,
+    "backpack": 3,
+    "handbag": 3,
+    "suitcase": 3
+}
+
+# Seuil de confiance minimal pour accepter une détection YOLO
+YOLO_CONFIDENCE_THRESHOLD = 0.3
+
+# Taille de lot par défaut pour le traitement multi-images (detect_obstacles_batch)
+DEFAULT_BATCH_SIZE = 4
+# Taille de lot maximale acceptée de la part des clients (/api/detect_batch)
+MAX_BATCH_SIZE = 16
+
+# ---------------------------------------------------------
+# RÉGION D'INTÉRÊT ET TUILAGE (voir roi_tiling.py)
+# ---------------------------------------------------------
+# Mode de ROI par modèle: "full" (image entière), "horizon" (sans la bande
+# au-dessus de l'horizon) ou "lower_band" (bande basse uniquement, pour la segmentation)
+YOLO_ROI_MODE = "full"
+SEG_ROI_MODE = "full"
+ROI_HORIZON_RATIO = 0.3 # Part de la hauteur retirée en haut (caméra à hauteur de poitrine)
+ROI_LOWER_BAND_RATIO = 0.5 # Part basse de l'image conservée en mode "lower_band"
+
+# Tuilage des très grandes images (appliqué à la ROI de chaque modèle)
+TILING_ENABLED = False
+TILE_SIZE = 1024 # Côté des tuiles (pixels)
+TILE_OVERLAP = 0.2 # Chevauchement entre tuiles voisines (fraction du côté)
+TILING_MIN_SIZE = 1600 # Tuilage seulement si le plus grand côté de la ROI dépasse cette taille
+TILE_DEDUPE_IOS = 0.6 # YOLO: seuil intersection / plus petite aire des doublons entre tuiles
+YOLO_TILING_FULL_FRAME_PASS = True # YOLO: passage supplémentaire sur la ROI entière (grands objets)
+
+# ---------------------------------------------------------
+# CONFIGURATION DE LA FUSION DES DÉTECTIONS
+# ---------------------------------------------------------
+# "nms": suppression des boîtes redondantes ; "wbf": fusion pondérée des boîtes (Weighted Box Fusion)
+MERGE_METHOD = "nms"
+# True: la suppression/fusion n'a lieu qu'entre détections de même classe
+MERGE_CLASS_AWARE = False
+MERGE_IOU_THRESHOLD = 0.4
+
+# ---------------------------------------------------------
+# CONFIGURATION DE LA CASCADE (voir cascade_policy.py)
+# ---------------------------------------------------------
+# YOLO d'abord, puis segmentation complète, réduite, reprise ou sautée selon
+# l'image; le chemin suivi est indiqué dans chaque réponse ("cascade")
+CASCADE_ENABLED = False
+CASCADE_POLICY = {
+    "latency_budget_ms": None, # Budget YOLO + segmentation par image (None = pas de budget)
+    "skip_min_critical": 2, # Segmentation sautée si YOLO trouve au moins N obstacles critiques (0 = jamais)...
+    "max_skip_age": 5.0, # ... ou hors budget, tant que la dernière segmentation date de moins de N s
+    "reduced_scale": 0.5, # Résolution du chemin "reduced", relative au seg_scale du profil
+    "static_threshold": 2.0, # Écart moyen (niveaux de gris) sous lequel l'image est considérée inchangée
+    "max_reuse_age": 10.0, # Obstacles de la dernière segmentation repris pendant au plus N s
+}
+
+# ---------------------------------------------------------
+# CONFIGURATION DE L'EXÉCUTION CONCURRENTE (YOLO || Mask2Former)
+# ---------------------------------------------------------
+# Si activé, detect_obstacles_combined exécute les deux modèles en parallèle
+# (latence ~ max des deux modèles au lieu de leur somme)
+CONCURRENT_DETECTION = True
+
+# Budget de threads torch (None = valeur par défaut de torch, tous les cœurs)
+# torch.set_num_threads est global au processus: les deux modèles partagent ce budget.
+# Des budgets séparés par modèle demandent des processus séparés (voir inference_pool.py)
+TORCH_THREADS = None
+
+# Affinité CPU par modèle: liste d'indices de cœurs, ex. [0, 1] (None = pas de contrainte)
+# Appliquée au thread du modèle (Linux uniquement, ignorée ailleurs)
+YOLO_CPU_AFFINITY = None
+MAPILLARY_CPU_AFFINITY = None
+
+# ---------------------------------------------------------
+# CONFIGURATION DU CACHE DE RÉSULTATS
+# ---------------------------------------------------------
+# Les résultats de detect_obstacles_combined sont mis en cache par hash d'image
+# et empreinte de configuration (modèles, classes, priorités, seuils). Les images
+# transitoires (flux, images envoyées) ne passent pas par le cache
+DETECTION_CACHE_ENABLED = True
+CACHE_MAX_MEMORY_ENTRIES = 256 # Niveau mémoire (LRU, en nombre d'images)
+CACHE_MAX_DISK_MB = 200 # Niveau disque (taille totale maximale)
+
+# ---------------------------------------------------------
+# CONFIGURATION DU STOCKAGE DES CARTES DE SEGMENTATION
+# ---------------------------------------------------------
+# Les cartes Mask2Former brutes sont conservées (uint8 .npy, relues en memmap) par
+# hash d'image et identifiant de modèle: changer MAPILLARY_OBSTACLES ou
+# MIN_AREA_THRESHOLD ne nécessite plus de relancer le modèle (voir seg_map_store.py)
+# Les images transitoires (flux vidéo, images envoyées à /api/detect et /api/detect_stream)
+# ne sont jamais stockées: seules les images des jeux de données sont re-seuillées
+SEG_MAP_STORE_ENABLED = True
+SEG_MAPS_DIR = os.path.join(OUTPUT_DIR, "seg_maps") # À côté de output/json/
+SEG_MAPS_MAX_DISK_MB = 2000 # Taille totale maximale (~2 Mo par carte 1080p, éviction LRU)
+
+# ---------------------------------------------------------
+# CONFIGURATION DE L'ANNOTATION
+# ---------------------------------------------------------
+# Superposition optionnelle de la carte de segmentation (classes d'obstacles
+# uniquement, couleurs de MAPILLARY_OBSTACLES) sous les boîtes
+SEG_OVERLAY_ALPHA = 0.4 # Opacité de la superposition (0 = invisible, 1 = opaque)
+
+# ---------------------------------------------------------
+# CONFIGURATION DU CHARGEMENT DES MODÈLES
+# ---------------------------------------------------------
+# Les modèles ne sont plus chargés à l'import: ils le sont en arrière-plan
+# (start_model_warmup, appelé par app.py) ou à la première détection.
+# Politique lorsqu'une détection arrive pendant le chargement:
+#   "wait"    -> la requête attend que tous les modèles soient prêts
+#   "degrade" -> la requête utilise uniquement les modèles déjà prêts
+MODEL_LOADING_POLICY = "wait"
+MODEL_WAIT_TIMEOUT = None # Attente maximale en secondes (None = illimitée)
+
+# Backend d'inférence: "torch" (PyTorch eager, par défaut), "onnx" (ONNX Runtime)
+# ou "torchscript". Les modèles exportés sont mis en cache dans ressources/models/
+INFERENCE_BACKEND = "torch"
+
+# ---------------------------------------------------------
+# PROFILS DE PERFORMANCE (Mask2Former)
+# ---------------------------------------------------------
+# quantize:  quantification dynamique INT8 des couches linéaires (backend torch uniquement)
+# seg_scale: facteur de résolution de la segmentation (entrée du modèle et carte de sortie);
+#            seules les boîtes des obstacles sont remises à l'échelle plein cadre
+PERFORMANCE_PROFILES = {
+    "quality": {"quantize": False, "seg_scale": 1.0},
+    "balanced": {"quantize": True, "seg_scale": 1.0},
+    "fast": {"quantize": True, "seg_scale": 0.5},
+}
+PERFORMANCE_PROFILE = "quality"
+
 # ---------------------------------------------------------
 # CHARGEMENT DES MODÈLES
 # ---------------------------------------------------------
-print("[INFO] Chargement des modèles pour detector_module...")
-# Charger YOLOv8m (Détection d'objets)
+# Variables globales renseignées par les fonctions de chargement (None tant que non prêts)
+yolo = None
+processor = None
+mapillary_model = None
+
 yolo_path = os.path.join(MODELS_DIR, "yolov8m.pt")
-try:
+MAPILLARY_MODEL = "facebook/mask2former-swin-large-mapillary-vistas-semantic"
+
+def _load_yolo():
+    """Charge YOLOv8m (Détection d'objets), avec téléchargement et copie si nécessaire."""
+    global yolo
+    from ultralytics import YOLO
+    
+    print("[INFO] Chargement de YOLO...")
     if os.path.exists(yolo_path):
-        yolo = YOLO(yolo_path) # Chargement local
+        model = YOLO(yolo_path) # Chargement local
     else:
         print(f"[INFO] Poids YOLO absents en local. Téléchargement vers cache Ultralytics puis copie vers: {yolo_path}")
         temp_yolo = YOLO("yolov8m.pt") # Téléchargement par Ultralytics
@@ -93,17 +264,17 @@ try:
         downloaded_path = getattr(temp_yolo, "ckpt_path", None)
         if downloaded_path and os.path.exists(downloaded_path):
             shutil.copy2(downloaded_path, yolo_path)
-            yolo = YOLO(yolo_path)
+            model = YOLO(yolo_path)
             print(f"[OK] Poids YOLO copiés dans {yolo_path}")
         else:
             local_fallback = os.path.join(CURRENT_FILE_DIR, "yolov8m.pt")
             if os.path.exists(local_fallback):
                 shutil.move(local_fallback, yolo_path)
-                yolo = YOLO(yolo_path)
+                model = YOLO(yolo_path)
                 print(f"[OK] Poids YOLO déplacés vers {yolo_path}")
             else:
                 print("[WARN] Chemin de poids téléchargé non détecté, utilisation du modèle chargé en mémoire.")
-                yolo = temp_yolo
+                model = temp_yolo
 
         stray_local = os.path.join(CURRENT_FILE_DIR, "yolov8m.pt")
         if os.path.exists(stray_local) and os.path.abspath(stray_local) != os.path.abspath(yolo_path):
@@ -111,243 +282,684 @@ try:
                 os.remove(stray_local)
             except Exception:
                 pass
-except Exception as e:
-    print(f"[ERREUR] Échec du chargement de YOLO: {e}")
-    yolo = None # Mettre à None permet de sauter la détection si le modèle échoue
-
-# Charger Mask2Former (Segmentation sémantique Mapillary Vistas)
-try:
-    MAPILLARY_MODEL = "facebook/mask2former-swin-large-mapillary-vistas-semantic"
-    # Le 'processor' prépare l'image pour le modèle (normalisation, redimensionnement, etc.)
-    processor = AutoImageProcessor.from_pretrained(MAPILLARY_MODEL, cache_dir=MODELS_DIR) 
-    # Le modèle effectue la segmentation
-    mapillary_model = Mask2FormerForUniversalSegmentation.from_pretrained(
-        MAPILLARY_MODEL, 
-        cache_dir=MODELS_DIR
-    )
-except Exception as e:
-    print(f"[ERREUR] Échec du chargement de Mask2Former: {e}")
-    processor = None
-    mapillary_model = None
+    
+    if INFERENCE_BACKEND != "torch":
+        if os.path.exists(yolo_path):
+            model = load_yolo_backend(yolo_path, INFERENCE_BACKEND, model=model) # Export depuis le YOLO déjà chargé
+        else:
+            print(f"[WARN] Poids {yolo_path} absents: YOLO reste sur le backend torch.")
+    
+    yolo = model
+    print(f"[OK] YOLO chargé (backend: {INFERENCE_BACKEND})")
+    return model
 
-print("[OK] Modèles chargés")
+def _load_mapillary():
+    """Charge Mask2Former (Segmentation sémantique Mapillary Vistas) et son processor."""
+    global processor, mapillary_model
+    
+    print("[INFO] Chargement de Mask2Former...")
+    # Processor (pré/post-traitement) et modèle de segmentation pour le backend configuré
+    loaded_processor, loaded_model = load_mapillary_backend(MAPILLARY_MODEL, MODELS_DIR, INFERENCE_BACKEND)
+    
+    if PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]["quantize"]:
+        if INFERENCE_BACKEND == "torch":
+            import torch
+            # Quantification dynamique INT8 des couches linéaires (poids INT8, activations quantifiées à la volée)
+            loaded_model = torch.quantization.quantize_dynamic(loaded_model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            print(f"[WARN] Quantification INT8 ignorée: non supportée pour le backend {INFERENCE_BACKEND}.")
+    
+    processor = loaded_processor
+    mapillary_model = loaded_model
+    print(f"[OK] Mask2Former chargé (backend: {INFERENCE_BACKEND})")
+    return loaded_model
+
+model_registry = ModelRegistry()
+model_registry.register("yolo", _load_yolo)
+model_registry.register("mapillary", _load_mapillary)
+
+def start_model_warmup():
+    """Lance le chargement des modèles en arrière-plan (retour immédiat)."""
+    model_registry.start_background()
+
+def set_inference_backend(backend):
+    """Change de backend d'inférence: les modèles seront rechargés à la prochaine détection."""
+    global INFERENCE_BACKEND, yolo, processor, mapillary_model
+    check_backend(backend)
+    INFERENCE_BACKEND = backend
+    yolo = processor = mapillary_model = None
+    for name in ("yolo", "mapillary"):
+        model_registry.reset(name)
+
+def set_performance_profile(profile):
+    """Change de profil de performance (rechargement de Mask2Former si la quantification change)."""
+    global PERFORMANCE_PROFILE, processor, mapillary_model
+    if profile not in PERFORMANCE_PROFILES:
+        raise ValueError(f"Profil inconnu: {profile} (attendu: {', '.join(PERFORMANCE_PROFILES)})")
+    previous = PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]
+    PERFORMANCE_PROFILE = profile
+    if PERFORMANCE_PROFILES[profile]["quantize"] != previous["quantize"]:
+        processor = mapillary_model = None
+        model_registry.reset("mapillary")
+
+def _ensure_models(names=("yolo", "mapillary")):
+    """Applique MODEL_LOADING_POLICY avant une détection (attente ou mode dégradé)."""
+    # Lancement en parallèle du chargement des modèles qui ne l'ont pas encore été
+    model_registry.start_background(names)
+    if MODEL_LOADING_POLICY == "degrade" and model_registry.any_ready():
+        return
+    for name in names:
+        model_registry.get(name, wait=True, timeout=MODEL_WAIT_TIMEOUT)
+
+detection_cache = DetectionCache(
+    CACHE_DIR,
+    max_memory_entries=CACHE_MAX_MEMORY_ENTRIES,
+    max_disk_bytes=CACHE_MAX_DISK_MB * 1024 * 1024
+)
 
 # ---------------------------------------------------------
 # FONCTIONS DE DÉTECTION (Inchangées)
 # ---------------------------------------------------------
 
-def non_maximum_suppression(boxes, scores, threshold=0.5):
-    """ pour éliminer les boîtes redondantes après la fusion des deux modèles."""
-    if len(boxes) == 0:
-        return []
-    
-    boxes = np.array(boxes)
-    scores = np.array(scores)
-    
-    # 1. Extraction des coordonnées des boîtes
-    x1 = boxes[:, 0]
-    y1 = boxes[:, 1]
-    x2 = boxes[:, 2]
-    y2 = boxes[:, 3]
-    
-    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    # Tri des détections par score décroissant
-    order = scores.argsort()[::-1]
-    
-    keep = []
-    while order.size > 0:
-        i = order[0] # Prendre la boîte avec le score le plus élevé
-        keep.append(i)
-        
-        # Calcul des coordonnées de chevauchement (Intersection)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-        
-        # Calcul de la surface d'intersection
-        w = np.maximum(0.0, xx2 - xx1 + 1)
-        h = np.maximum(0.0, yy2 - yy1 + 1)
-        inter = w * h
-        
-        # Calcul de l'Intersection sur Union (IoU)
-        ovr = inter / (areas[i] + areas[order[1:]] - inter)
-        
-        # Conserver les boîtes dont l'IoU est inférieur au seuil (non-chevauchantes)
-        inds = np.where(ovr <= threshold)[0]
-        order = order[inds + 1]
-    
-    return keep
+# Cartes de segmentation persistantes (réutilisées tant que le modèle ne change pas)
+seg_map_store = SegMapStore(SEG_MAPS_DIR, max_disk_bytes=SEG_MAPS_MAX_DISK_MB * 1024 * 1024)
+
+# Vrai pendant la détection d'une image transitoire: ni son résultat ni sa carte ne sont
+# relus ou stockés. Suit la requête dans les exécuteurs des modèles (submit_in_context)
+_transient_frames = contextvars.ContextVar("transient_frames", default=False)
+
+@contextmanager
+def transient_frames():
+    """Les détections exécutées dans ce bloc ne passent ni par le cache ni par le stockage des cartes."""
+    token = _transient_frames.set(True)
+    try:
+        yield
+    finally:
+        _transient_frames.reset(token)
+
+def _detection_cache_active():
+    """Cache de détection utilisé pour cet appel (activé, et image non transitoire)."""
+    return DETECTION_CACHE_ENABLED and not _transient_frames.get()
+
+def non_maximum_suppression(boxes, scores, threshold=0.5, class_ids=None):
+    """ pour éliminer les boîtes redondantes après la fusion des deux modèles (NMS vectorisé)."""
+    return nms(boxes, scores, threshold=threshold, class_ids=class_ids)
+
+def _yolo_result_to_obstacles(result):
+    """Convertit un résultat YOLO (une image) en DetectionSet filtré (colonnes lues en une fois)."""
+    boxes = result.boxes
+    cls = boxes.cls.cpu().numpy().astype(np.int64)
+    conf = boxes.conf.cpu().numpy()
+    
+    # Priorité par identifiant de classe du modèle (0 = classe ignorée)
+    max_id = max((int(i) for i in yolo.names), default=0)
+    class_priority = np.zeros(max_id + 1, dtype=np.uint8)
+    for class_id, label in yolo.names.items():
+        class_priority[int(class_id)] = YOLO_OBSTACLES.get(label, 0)
+    
+    # POINT DE DÉTECTION CONCRET YOLO: Filtrage par classe et confiance
+    keep = np.flatnonzero((class_priority[cls] > 0) & (conf > YOLO_CONFIDENCE_THRESHOLD))
+    xyxy = boxes.xyxy.cpu().numpy()[keep].astype(int)
+    return DetectionSet.from_columns(
+        xyxy, conf[keep], [yolo.names[int(c)] for c in cls[keep]], class_priority[cls[keep]], 'yolo'
+    )
+
+def model_regions(frame_shape, model):
+    """
+    ROI et tuiles traitées par un modèle ("yolo" ou "mapillary") pour une image de
+    cette taille: (bounds, [{'box', 'core'}]) en coordonnées plein cadre.
+    """
+    mode = YOLO_ROI_MODE if model == "yolo" else SEG_ROI_MODE
+    bounds = roi_bounds(frame_shape, mode, ROI_HORIZON_RATIO, ROI_LOWER_BAND_RATIO)
+    x0, y0, x1, y1 = bounds
+    if TILING_ENABLED and max(x1 - x0, y1 - y0) > TILING_MIN_SIZE:
+        return bounds, tile_grid(bounds, TILE_SIZE, TILE_OVERLAP)
+    return bounds, [{'box': bounds, 'core': bounds}]
+
+def _yolo_boxes(frame_shape):
+    """Rectangles passés à YOLO: tuiles, plus la ROI entière si le tuilage est actif."""
+    bounds, tiles = model_regions(frame_shape, "yolo")
+    boxes = [tile['box'] for tile in tiles]
+    if len(tiles) > 1 and YOLO_TILING_FULL_FRAME_PASS:
+        boxes.append(bounds)
+    return boxes
+
+def _roi_active(frame_shape):
+    """True si l'un des modèles ne traite pas l'image entière en un seul passage."""
+    full = (0, 0, frame_shape[1], frame_shape[0])
+    _, seg_tiles = model_regions(frame_shape, "mapillary")
+    return _yolo_boxes(frame_shape) != [full] or [tile['box'] for tile in seg_tiles] != [full]
+
+def pixels_processed(frame_shape):
+    """Nombre de pixels soumis à chaque modèle pour une image de cette taille."""
+    area = lambda box: (box[2] - box[0]) * (box[3] - box[1])
+    _, seg_tiles = model_regions(frame_shape, "mapillary")
+    return {
+        'yolo': sum(area(box) for box in _yolo_boxes(frame_shape)),
+        'mapillary': sum(area(tile['box']) for tile in seg_tiles)
+    }
+
+# Un verrou par modèle: le prédicteur ultralytics et Mask2Former ne sont pas prévus pour des
+# appels simultanés (threads HTTP, tâches, flux vidéo): chaque modèle traite un appel à la fois,
+# les deux modèles restant utilisables en parallèle (CONCURRENT_DETECTION)
+_model_locks = {"yolo": threading.Lock(), "mapillary": threading.Lock()}
 
 def detect_obstacles_yolo(frame):
     """Détection YOLO avec classes filtrées et priorités."""
+    _ensure_models(("yolo",))
     if yolo is None:
-        return []
-        
-    obstacles = []
-    
-    # Classes YOLO acceptées par le système d'obstacle et leur priorité assignée
-    YOLO_OBSTACLES = {
-        "person": 1, # Les personnes sont des obstacles critiques/dynamiques
-        "bicycle": 2,
-        "car": 2,
-        "motorcycle": 2,
-        "bus": 2,
-        "truck": 2,
-        "traffic light": 2,
-        "fire hydrant": 2,
-        "stop sign": 2,
-        "bench": 3,
-        "chair": 3,
-        "potted plant": 3,
-        "backpack": 3,
-        "handbag": 3,
-        "suitcase": 3
-    }
+        return DetectionSet()
     
-    # Exécution du modèle YOLO
-    results = yolo(frame, verbose=False)[0]
+    if _yolo_boxes(frame.shape) != [(0, 0, frame.shape[1], frame.shape[0])]:
+        return _detect_yolo_regions(frame)
     
-    # Extraction et filtrage des résultats
-    for box in results.boxes:
-        cls = int(box.cls[0])
-        label = yolo.names[cls]
-        conf = float(box.conf[0])
-        
-        # POINT DE DÉTECTION CONCRET YOLO: Filtrage par classe et confiance
-        if label in YOLO_OBSTACLES and conf > 0.3:
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-            obstacles.append({
-                'bbox': [int(x1), int(y1), int(x2), int(y2)],
-                'class': label,
-                'confidence': float(conf),
-                'priority': int(YOLO_OBSTACLES[label]),
-                'source': 'yolo'
-            })
+    # Exécution du modèle YOLO
+    with _model_locks["yolo"], stage("yolo_forward"):
+        results = yolo(frame, verbose=False)[0]
     
-    return obstacles
+    with stage("yolo_postprocess"):
+        return _yolo_result_to_obstacles(results)
 
-def detect_obstacles_mapillary(frame):
-    """Détection avec Mask2Former (Mapillary Vistas) via segmentation sémantique."""
-    if mapillary_model is None or processor is None:
-        return []
-        
-    obstacles = []
-    
-    # 1. Préparation de l'image (Conversion BGR -> RGB -> PIL -> Tenseur)
-    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    pil_image = Image.fromarray(frame_rgb)
-    inputs = processor(images=pil_image, return_tensors="pt")
+def _detect_yolo_regions(frame):
+    """YOLO sur la ROI et/ou les tuiles (un seul appel), ramené en plein cadre et dédoublonné."""
+    boxes = _yolo_boxes(frame.shape)
+    crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in boxes]
+    with _model_locks["yolo"], stage("yolo_forward"):
+        results = yolo(crops, verbose=False)
+    
+    with stage("yolo_postprocess"):
+        obstacles = DetectionSet.concat(
+            _yolo_result_to_obstacles(result).offset(x0, y0) for (x0, y0, _, _), result in zip(boxes, results)
+        )
+        if len(boxes) > 1:
+            obstacles = dedupe_tile_detections(obstacles, TILE_DEDUPE_IOS)
+        return obstacles
+
+def _processor_kwargs(scale):
+    """Arguments du processor: résolution d'entrée réduite d'un facteur `scale` (< 1)."""
+    size = getattr(processor, "size", None)
+    if scale >= 1.0 or not isinstance(size, dict):
+        return {}
+    return {"size": {key: max(32, int(value * scale)) if isinstance(value, int) else value
+                     for key, value in size.items()}}
+
+def _mapillary_forward(frames, scale=None):
+    """
+    Exécute Mask2Former sur une liste d'images (un seul passage du modèle)
+    et retourne une carte de segmentation NumPy par image.
+    
+    Avec `scale` < 1 (profil de performance), l'entrée du modèle et la carte
+    retournée sont à résolution réduite: la carte n'est pas ré-échantillonnée
+    en plein cadre, seules les boîtes le seront (obstacles_from_seg_map).
+    """
+    scale = PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]["seg_scale"] if scale is None else scale
+    
+    # 1. Préparation des images (Conversion BGR -> RGB -> PIL -> Tenseur)
+    with stage("mapillary_preprocess"):
+        pil_images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+        inputs = processor(images=pil_images, return_tensors="pt", **_processor_kwargs(scale))
     
     # 2. Exécution du modèle de segmentation
-    with torch.no_grad():
+    import torch
+    with _model_locks["mapillary"], stage("mapillary_forward"), torch.no_grad():
         outputs = mapillary_model(**inputs)
     
-    # 3. Post-traitement: Obtention de la carte de segmentation (chaque pixel est un ID de classe)
-    predicted_map = processor.post_process_semantic_segmentation(
-        outputs, 
-        target_sizes=[frame.shape[:2]]
-    )[0]
+    # 3. Post-traitement: Obtention des cartes de segmentation (chaque pixel est un ID de classe)
+    target_sizes = [
+        (max(1, round(frame.shape[0] * scale)), max(1, round(frame.shape[1] * scale))) if scale < 1.0
+        else frame.shape[:2]
+        for frame in frames
+    ]
+    with stage("mapillary_postprocess"):
+        predicted_maps = processor.post_process_semantic_segmentation(
+            outputs, 
+            target_sizes=target_sizes
+        )
+        return [predicted_map.cpu().numpy() for predicted_map in predicted_maps]
+
+def obstacles_from_seg_map(seg_map, frame_shape, id2label=None):
+    """
+    Extrait les obstacles Mapillary d'une carte de segmentation, en coordonnées plein cadre.
+    
+    Si la carte est à résolution réduite, les seuils d'aire sont ramenés à son échelle
+    et seules les boîtes englobantes sont remises à l'échelle de l'image.
+    `id2label` vaut par défaut celui du modèle chargé.
+    """
+    id2label = mapillary_model.config.id2label if id2label is None else id2label
+    frame_h, frame_w = frame_shape[:2]
+    seg_h, seg_w = seg_map.shape[:2]
+    if (seg_h, seg_w) == (frame_h, frame_w):
+        with stage("region_extraction"):
+            return extract_obstacle_regions(seg_map, id2label, MAPILLARY_OBSTACLES, MIN_AREA_THRESHOLD)
+    
+    sx, sy = frame_w / seg_w, frame_h / seg_h
+    scaled_thresholds = {p: area / (sx * sy) for p, area in MIN_AREA_THRESHOLD.items()}
+    with stage("region_extraction"):
+        obstacles = extract_obstacle_regions(seg_map, id2label, MAPILLARY_OBSTACLES, scaled_thresholds)
+    return obstacles.rescaled(sx, sy, frame_w, frame_h)
+
+def seg_map_model_id():
+    """Identifiant des cartes stockées: modèle, backend et profil (tout ce qui change la carte)."""
+    variant = config_fingerprint({'backend': INFERENCE_BACKEND, 'profile': PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]})
+    return f"{MAPILLARY_MODEL.replace('/', '--')}-{variant}"
+
+def _segment_frames(frames, scale=None):
+    """
+    Cartes de segmentation des images: relues du stockage si déjà calculées,
+    sinon un passage Mask2Former pour les images manquantes, puis stockées.
+    Une résolution `scale` autre que celle du profil (cascade) n'est pas stockée.
+    """
+    if scale is not None and scale != PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]["seg_scale"]:
+        return _mapillary_forward(frames, scale)
+    if not SEG_MAP_STORE_ENABLED or _transient_frames.get():
+        return _mapillary_forward(frames)
+    
+    model_id = seg_map_model_id()
+    with stage("seg_map_lookup"):
+        hashes = [hash_frame(frame) for frame in frames]
+        seg_maps = [seg_map_store.get(model_id, h, frame.shape) for h, frame in zip(hashes, frames)]
+    
+    missing = [i for i, seg_map in enumerate(seg_maps) if seg_map is None]
+    if missing:
+        computed = _mapillary_forward([frames[i] for i in missing])
+        with stage("seg_map_store"):
+            seg_map_store.save_labels(model_id, mapillary_model.config.id2label)
+            for index, seg_map in zip(missing, computed):
+                seg_map_store.put(model_id, hashes[index], frames[index].shape, seg_map)
+                seg_maps[index] = seg_map
+    return seg_maps
+
+def obstacles_from_stored_seg_map(frame_hash, frame_shape, model_id=None):
+    """
+    Re-seuillage: obstacles Mapillary reconstruits depuis une carte stockée, sans
+    aucun modèle (None si la carte de cette image n'a jamais été calculée).
+    """
+    model_id = model_id or seg_map_model_id()
+    seg_map = seg_map_store.get(model_id, frame_hash, frame_shape)
+    id2label = seg_map_store.load_labels(model_id)
+    if seg_map is None or id2label is None:
+        return None
+    return obstacles_from_seg_map(seg_map, frame_shape, id2label=id2label)
+
+def detect_obstacles_mapillary(frame, scale=None):
+    """
+    Détection avec Mask2Former (Mapillary Vistas) via segmentation sémantique.
+    `scale` remplace le seg_scale du profil de performance (chemin "reduced" de la cascade).
+    """
+    _ensure_models(("mapillary",))
+    if mapillary_model is None or processor is None:
+        return DetectionSet()
     
-    seg_map = predicted_map.cpu().numpy()
-    id2label = mapillary_model.config.id2label
+    bounds, tiles = model_regions(frame.shape, "mapillary")
+    if [tile['box'] for tile in tiles] != [(0, 0, frame.shape[1], frame.shape[0])]:
+        return _detect_mapillary_regions(frame, bounds, tiles, scale)
     
-    # 4. Analyse des classes pertinentes (Obstacles)
-    for class_id, class_name in id2label.items():
-        if class_name in MAPILLARY_OBSTACLES:
-            info = MAPILLARY_OBSTACLES[class_name]
-            
-            # Création d'un masque binaire pour la classe actuelle
-            mask = (seg_map == class_id).astype(np.uint8)
-            # Trouver les régions connectées (contours) de cette classe
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                min_area = MIN_AREA_THRESHOLD[info['priority']]
-                
-                # POINT DE DÉTECTION CONCRET MAPILLARY: Filtrage par aire minimale
-                if area > min_area:
-                    # Calcul de la boîte englobante à partir du contour
-                    x, y, w, h = cv2.boundingRect(cnt)
-                    
-                    confidence = 0.95 # Confiance arbitrairement haute pour la segmentation
-                    
-                    obstacles.append({
-                        'bbox': [int(x), int(y), int(x + w), int(y + h)],
-                        'class': class_name,
-                        'confidence': float(confidence),
-                        'priority': int(info['priority']),
-                        'source': 'mapillary',
-                        'color': info['color']
-                    })
+    seg_map = _segment_frames([frame], scale)[0]
+    
+    # 4. Analyse des classes pertinentes (Obstacles) en une seule passe sur la carte
+    obstacles = obstacles_from_seg_map(seg_map, frame.shape)
     
     return obstacles
 
-def merge_detections(yolo_obstacles, mapillary_obstacles):
-    """Fusionne les détections des deux modèles et applique le NMS."""
-    all_obstacles = yolo_obstacles + mapillary_obstacles
+def _detect_mapillary_regions(frame, bounds, tiles, scale=None):
+    """
+    Segmentation de la ROI (ou de ses tuiles, recollées en une seule carte) puis
+    extraction des régions, en coordonnées plein cadre.
+    """
+    crops = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in (tile['box'] for tile in tiles)]
+    seg_maps = _segment_frames(crops, scale)
+    
+    if len(tiles) == 1:
+        obstacles = obstacles_from_seg_map(seg_maps[0], crops[0].shape)
+    else:
+        # Les cartes réduites (profil "fast") sont remises à la taille de leur tuile avant recollage
+        seg_maps = [
+            seg_map if seg_map.shape[:2] == crop.shape[:2]
+            else cv2.resize(np.asarray(seg_map, dtype=np.uint16), (crop.shape[1], crop.shape[0]),
+                            interpolation=cv2.INTER_NEAREST)
+            for seg_map, crop in zip(seg_maps, crops)
+        ]
+        with stage("tile_stitching"):
+            canvas = stitch_seg_maps(tiles, seg_maps, bounds)
+        obstacles = obstacles_from_seg_map(canvas, canvas.shape)
+    
+    x0, y0, _, _ = bounds
+    return obstacles.offset(x0, y0)
+
+def merge_detections(yolo_obstacles, mapillary_obstacles, method=None, class_aware=None):
+    """
+    Fusionne les détections des deux modèles (DetectionSet ou listes d'obstacles) et
+    applique le NMS (ou la WBF). Retourne un DetectionSet trié par priorité.
+    `method` et `class_aware` valent par défaut MERGE_METHOD et MERGE_CLASS_AWARE.
+    """
+    with stage("merge"):
+        return _merge_detections(yolo_obstacles, mapillary_obstacles, method, class_aware)
+
+def _merge_detections(yolo_obstacles, mapillary_obstacles, method, class_aware):
+    method = method or MERGE_METHOD
+    class_aware = MERGE_CLASS_AWARE if class_aware is None else class_aware
+    all_obstacles = DetectionSet.concat([yolo_obstacles, mapillary_obstacles])
     
     if len(all_obstacles) == 0:
-        return []
+        return all_obstacles
     
-    boxes = [obs['bbox'] for obs in all_obstacles]
+    boxes = all_obstacles.boxes
     # Pondération du score pour favoriser les priorités critiques lors du NMS
     # Priorité 1 -> Facteur (4-1)=3 ; Priorité 3 -> Facteur (4-3)=1
-    scores = [obs['confidence'] * (4 - obs['priority']) for obs in all_obstacles] 
+    scores = all_obstacles.merge_scores()
+    
+    # Regroupement par classe (optionnel): seules les boîtes d'une même classe se suppriment
+    class_ids = all_obstacles.class_ids if class_aware else None
+    
+    if method == "wbf":
+        # Weighted Box Fusion: chaque groupe de boîtes chevauchantes devient une boîte moyenne
+        fused_boxes, _, clusters = weighted_box_fusion(
+            boxes, scores, threshold=MERGE_IOU_THRESHOLD, class_ids=class_ids
+        )
+        # Attributs de la détection de meilleur score de chaque groupe
+        merged = all_obstacles.take([members[0] for members in clusters]).with_boxes(np.rint(fused_boxes))
+    else:
+        # Application du NMS pour ne garder que les meilleures boîtes non-chevauchantes
+        keep_indices = non_maximum_suppression(boxes, scores, threshold=MERGE_IOU_THRESHOLD, class_ids=class_ids)
+        merged = all_obstacles.take(keep_indices)
     
-    # Application du NMS pour ne garder que les meilleures boîtes non-chevauchantes
-    keep_indices = non_maximum_suppression(boxes, scores, threshold=0.4)
-    merged = [all_obstacles[i] for i in keep_indices]
-    merged.sort(key=lambda x: x['priority']) # Tri par priorité pour l'affichage
+    return merged.sorted_by_priority() # Tri par priorité pour l'affichage
+
+# État de la cascade (dernière segmentation, durées estimées), partagé par les requêtes du processus
+cascade_policy = CascadePolicy()
+
+def cascade_segmentation(frame, yolo_obstacles, yolo_ms):
+    """
+    Segmentation de la cascade: le chemin (complet, réduit, repris ou sauté) est choisi
+    d'après les obstacles YOLO et la durée de YOLO. Retourne (obstacles Mapillary, décision);
+    la décision est aussi notée dans la trace en cours ("cascade" dans la réponse).
+    """
+    profile_scale = PERFORMANCE_PROFILES[PERFORMANCE_PROFILE]["seg_scale"]
+    decision, reused = cascade_policy.decide(frame, yolo_obstacles, yolo_ms, CASCADE_POLICY, profile_scale)
+    if decision['path'] in (FULL, REDUCED):
+        start = time.perf_counter()
+        mapillary_obs = detect_obstacles_mapillary(frame, scale=decision['seg_scale'])
+        cascade_policy.record_segmentation(frame, mapillary_obs, decision['seg_scale'],
+                                           (time.perf_counter() - start) * 1000)
+    elif decision['path'] == REUSE:
+        mapillary_obs = reused
+    else:
+        mapillary_obs = DetectionSet()
+    note("cascade", decision)
+    return mapillary_obs, decision
+
+def _run_models_cascade(frame, on_yolo=None):
+    """YOLO, puis segmentation selon la cascade; retourne (obstacles fusionnés, décision)."""
+    start = time.perf_counter()
+    yolo_obs = detect_obstacles_yolo(frame)
+    yolo_ms = (time.perf_counter() - start) * 1000
+    if on_yolo is not None:
+        on_yolo(yolo_obs)
+    mapillary_obs, decision = cascade_segmentation(frame, yolo_obs, yolo_ms)
+    return merge_detections(yolo_obs, mapillary_obs), decision
+
+def _init_model_thread(cpu_affinity):
+    """Initialise le thread dédié à un modèle: affinité CPU (le budget de threads torch est global)."""
+    if cpu_affinity and hasattr(os, "sched_setaffinity"):
+        try:
+            # pid 0 = thread appelant (Linux)
+            os.sched_setaffinity(0, set(cpu_affinity))
+        except OSError as e:
+            print(f"[WARN] Affinité CPU non appliquée ({cpu_affinity}): {e}")
+
+# Un exécuteur mono-thread par modèle, créés à la première utilisation
+_model_executors = {}
+_model_executors_lock = threading.Lock()
+
+def _get_model_executor(name):
+    """Retourne l'exécuteur dédié au modèle `name` ("yolo" ou "mapillary")."""
+    with _model_executors_lock:
+        return _model_executors.get(name) or _create_model_executor(name)
+
+def _create_model_executor(name):
+    """Crée (et enregistre) l'exécuteur mono-thread d'un modèle."""
+    if TORCH_THREADS:
+        import torch
+        torch.set_num_threads(TORCH_THREADS) # Réglage du processus entier, pas du seul thread du modèle
+    initargs = (YOLO_CPU_AFFINITY if name == "yolo" else MAPILLARY_CPU_AFFINITY,)
+    executor = ThreadPoolExecutor(
+        max_workers=1,
+        thread_name_prefix=f"detector-{name}",
+        initializer=_init_model_thread,
+        initargs=initargs
+    )
+    _model_executors[name] = executor
+    return executor
+
+def detection_config_fingerprint(all_models_loaded=False):
+    """
+    Empreinte de tout ce qui influence le résultat (recalculée à chaque appel).
+    all_models_loaded: empreinte des détections faites avec les deux modèles chargés, pour un
+    processus qui ne les charge pas lui-même (processus HTTP du mode production, préchauffage en cours).
+    """
+    models_loaded = [True, True] if all_models_loaded else [yolo is not None, mapillary_model is not None]
+    return config_fingerprint({
+        'yolo_model': os.path.basename(yolo_path),
+        'mapillary_model': MAPILLARY_MODEL,
+        'backend': INFERENCE_BACKEND,
+        'profile': PERFORMANCE_PROFILES[PERFORMANCE_PROFILE],
+        'models_loaded': models_loaded,
+        'yolo_obstacles': YOLO_OBSTACLES,
+        'yolo_confidence': YOLO_CONFIDENCE_THRESHOLD,
+        'mapillary_obstacles': MAPILLARY_OBSTACLES,
+        'min_area': MIN_AREA_THRESHOLD,
+        'merge': [MERGE_METHOD, MERGE_CLASS_AWARE, MERGE_IOU_THRESHOLD],
+        'roi': [YOLO_ROI_MODE, SEG_ROI_MODE, ROI_HORIZON_RATIO, ROI_LOWER_BAND_RATIO],
+        'tiling': [TILING_ENABLED, TILE_SIZE, TILE_OVERLAP, TILING_MIN_SIZE, TILE_DEDUPE_IOS,
+                   YOLO_TILING_FULL_FRAME_PASS],
+    })
+
+def _run_models_combined(frame):
+    """Exécute les deux modèles (en parallèle si activé) et fusionne les détections."""
+    if CONCURRENT_DETECTION and yolo is not None and mapillary_model is not None:
+        # Les deux modèles ne partagent que l'image d'entrée: exécution en parallèle
+        # submit_in_context: les mesures des threads des modèles rejoignent la trace de la requête
+        yolo_future = submit_in_context(_get_model_executor("yolo"), detect_obstacles_yolo, frame)
+        mapillary_future = submit_in_context(_get_model_executor("mapillary"), detect_obstacles_mapillary, frame)
+        yolo_obs = yolo_future.result()
+        mapillary_obs = mapillary_future.result()
+    else:
+        yolo_obs = detect_obstacles_yolo(frame)
+        mapillary_obs = detect_obstacles_mapillary(frame)
     
-    return merged
+    return merge_detections(yolo_obs, mapillary_obs)
 
 def detect_obstacles_combined(frame):
     """Pipeline complet de détection (fonction appelée par l'API app.py)."""
-    yolo_obs = detect_obstacles_yolo(frame)
-    mapillary_obs = detect_obstacles_mapillary(frame)
+    _ensure_models()
+    cache_key = None
+    if _detection_cache_active():
+        with stage("cache_lookup"):
+            cache_key = DetectionCache.make_key(frame, detection_config_fingerprint())
+            cached = detection_cache.get(cache_key)
+        if cached is not None:
+            _note_cache_hit()
+            return cached
+    
+    if CASCADE_ENABLED:
+        merged_obs, decision = _run_models_cascade(frame)
+        if decision['path'] != FULL:
+            return merged_obs # Segmentation réduite, reprise ou sautée: résultat non mis en cache
+    else:
+        merged_obs = _run_models_combined(frame)
+    if cache_key is not None:
+        detection_cache.put(cache_key, merged_obs)
+    
+    return merged_obs
+
+def detect_obstacles_transient(frame):
+    """detect_obstacles_combined pour une image de flux ou envoyée: ni son résultat ni sa carte ne sont stockés."""
+    with transient_frames():
+        return detect_obstacles_combined(frame)
+
+def cached_detection(frame, all_models_loaded=False):
+    """
+    Recherche dans le cache de détection pour un appelant qui répartit lui-même les modèles
+    (tâches du pool): retourne (clé, détections en cache ou None); clé None si le cache n'est
+    pas utilisé pour cet appel. all_models_loaded: voir detection_config_fingerprint.
+    """
+    if not _detection_cache_active():
+        return None, None
+    with stage("cache_lookup"):
+        cache_key = DetectionCache.make_key(frame, detection_config_fingerprint(all_models_loaded))
+        cached = detection_cache.get(cache_key)
+    if cached is not None:
+        _note_cache_hit()
+    return cache_key, cached
+
+def _note_cache_hit():
+    """Chemin de la cascade pour un résultat (complet) relu du cache de détection."""
+    if CASCADE_ENABLED:
+        note("cascade", {'path': CACHED, 'reason': "cache_hit"})
+
+def detect_obstacles_progressive(frame, on_yolo=None):
+    """
+    Comme detect_obstacles_combined, mais on_yolo(obstacles YOLO) est appelé dès que
+    YOLO a terminé, pendant que la segmentation (plus lente) continue.
+    Une exception levée par on_yolo (ex: annulation) interrompt la détection.
+    En cas de résultat en cache, on_yolo n'est pas appelé.
+    """
+    _ensure_models()
+    cache_key = None
+    if _detection_cache_active():
+        with stage("cache_lookup"):
+            cache_key = DetectionCache.make_key(frame, detection_config_fingerprint())
+            cached = detection_cache.get(cache_key)
+        if cached is not None:
+            _note_cache_hit()
+            return cached
+    
+    if CASCADE_ENABLED:
+        # La segmentation dépend des résultats YOLO: pas d'exécution en parallèle
+        merged_obs, decision = _run_models_cascade(frame, on_yolo)
+        if cache_key is not None and decision['path'] == FULL:
+            detection_cache.put(cache_key, merged_obs)
+        return merged_obs
+    
+    mapillary_future = None
+    if CONCURRENT_DETECTION and yolo is not None and mapillary_model is not None:
+        mapillary_future = submit_in_context(_get_model_executor("mapillary"), detect_obstacles_mapillary, frame)
+    try:
+        yolo_obs = detect_obstacles_yolo(frame)
+        if on_yolo is not None:
+            on_yolo(yolo_obs)
+    except BaseException:
+        if mapillary_future is not None:
+            mapillary_future.cancel() # Sans effet si la segmentation a déjà démarré
+        raise
+    mapillary_obs = mapillary_future.result() if mapillary_future is not None else detect_obstacles_mapillary(frame)
+    
     merged_obs = merge_detections(yolo_obs, mapillary_obs)
+    if cache_key is not None:
+        detection_cache.put(cache_key, merged_obs)
     
     return merged_obs
 
+def _run_models_batch(frames, batch_size):
+    """Exécute les deux modèles par lots et retourne les obstacles fusionnés par image."""
+    if any(_roi_active(frame.shape) for frame in frames):
+        # ROI / tuilage: chaque image a ses propres régions, traitées image par image
+        return [merge_detections(detect_obstacles_yolo(frame), detect_obstacles_mapillary(frame)) for frame in frames]
+    
+    results = []
+    
+    for start in range(0, len(frames), batch_size):
+        batch = frames[start:start + batch_size]
+        
+        # 1. YOLO: un seul appel pour tout le lot (letterbox par image)
+        if yolo is not None:
+            with _model_locks["yolo"], stage("yolo_forward"):
+                yolo_results = yolo(batch, verbose=False)
+            with stage("yolo_postprocess"):
+                yolo_batch = [_yolo_result_to_obstacles(result) for result in yolo_results]
+        else:
+            yolo_batch = [DetectionSet() for _ in batch]
+        
+        # 2. Mask2Former: un passage par groupe de même résolution
+        # (évite le padding du processor entre images de tailles différentes)
+        mapillary_batch = [DetectionSet() for _ in batch]
+        if mapillary_model is not None and processor is not None:
+            groups = {}
+            for index, frame in enumerate(batch):
+                groups.setdefault(frame.shape[:2], []).append(index)
+            
+            for indices in groups.values():
+                seg_maps = _segment_frames([batch[i] for i in indices])
+                for index, seg_map in zip(indices, seg_maps):
+                    mapillary_batch[index] = obstacles_from_seg_map(seg_map, batch[index].shape)
+        
+        # 3. Fusion par image
+        for yolo_obs, mapillary_obs in zip(yolo_batch, mapillary_batch):
+            results.append(merge_detections(yolo_obs, mapillary_obs))
+    
+    return results
+
+def detect_obstacles_batch(frames, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Pipeline complet de détection sur plusieurs images, par lots.
+    
+    Chaque lot ne coûte qu'un passage YOLO et un passage Mask2Former (au lieu
+    d'un par image). Les images déjà en cache ne sont pas recalculées.
+    Retourne une liste d'obstacles fusionnés par image, dans le même ordre que `frames`.
+    """
+    frames = list(frames)
+    batch_size = max(1, int(batch_size))
+    _ensure_models()
+    if not _detection_cache_active():
+        return _run_models_batch(frames, batch_size)
+    
+    with stage("cache_lookup"):
+        fingerprint = detection_config_fingerprint()
+        keys = [DetectionCache.make_key(frame, fingerprint) for frame in frames]
+        results = [detection_cache.get(key) for key in keys]
+    
+    missing = [i for i, cached in enumerate(results) if cached is None]
+    computed = _run_models_batch([frames[i] for i in missing], batch_size)
+    for index, merged_obs in zip(missing, computed):
+        detection_cache.put(keys[index], merged_obs)
+        results[index] = merged_obs
+    
+    return results
+
 # ---------------------------------------------------------
 # EXPORT JSON ET ANNOTATION (Adaptées)
 # ---------------------------------------------------------
 
-def export_detections_json(image_filename, obstacles):
-    """Exporte les détections en JSON pour les métadonnées de sortie."""
+def build_detections_report(image_filename, obstacles):
+    """Construit en mémoire le rapport de détection (contenu du JSON de sortie)."""
+    obstacles = DetectionSet.from_obstacles(obstacles)
     
     detections = {
         'image': "annotated_" + image_filename,
         'total_obstacles': len(obstacles),
         # Calcul du décompte par niveau de priorité
-        'by_priority': {
-            'critical': len([o for o in obstacles if o['priority'] == 1]),
-            'important': len([o for o in obstacles if o['priority'] == 2]),
-            'moderate': len([o for o in obstacles if o['priority'] == 3])
-        },
-        'detections': []
+        'by_priority': obstacles.by_priority(),
+        # Couleurs converties de BGR (OpenCV) à RGB (standard JSON/Web)
+        'detections': obstacles.report_detections(DEFAULT_PRIORITY_COLORS)
     }
     
-    for obs in obstacles:
-        # Conversion de la couleur BGR (OpenCV) à RGB (standard JSON/Web)
-        color_bgr = obs.get('color', get_color_for_priority(obs['priority']))
-        color_rgb = [int(color_bgr[2]), int(color_bgr[1]), int(color_bgr[0])] 
+    return detections
 
-        detections['detections'].append({
-            'class': obs['class'],
-            'bbox': [int(x) for x in obs['bbox']],
-            'confidence': float(obs['confidence']),
-            'priority': int(obs['priority']),
-            'source': obs.get('source', 'unknown'),
-            'color': color_rgb # Couleur RGB pour le JSON
-        })
-    
+def pack_detections(obstacles):
+    """Détections au format binaire compact (voir detection_set.py)."""
+    return DetectionSet.from_obstacles(obstacles).pack(DEFAULT_PRIORITY_COLORS)
+
+def detections_json_path(image_filename):
+    """Chemin du rapport JSON associé à une image."""
     json_file_name = image_filename.replace('.jpg', '.json').replace('.png', '.json').replace('.jpeg', '.json')
-    json_path = os.path.join(JSON_DIR, json_file_name) 
+    return os.path.join(JSON_DIR, json_file_name)
+
+def export_detections_json(image_filename, obstacles):
+    """Exporte les détections en JSON pour les métadonnées de sortie."""
+    detections = build_detections_report(image_filename, obstacles)
+    json_path = detections_json_path(image_filename)
     
-    with open(json_path, 'w') as f:
+    with stage("json_export"), open(json_path, 'w') as f:
         json.dump(detections, f, indent=2)
     
     return json_path
@@ -361,54 +973,48 @@ def get_color_for_priority(priority):
     }
     return colors.get(priority, (255, 255, 255))
 
-def annotate_frame(frame, obstacles):
-    """Dessine les boîtes englobantes et les statistiques sur l'image (pour l'utilisateur)."""
-    annotated = frame.copy()
-    
-    stats = {1: 0, 2: 0, 3: 0}
-    stats_by_source = {"yolo": 0, "mapillary": 0}
-    
-    for obs in obstacles:
-        x1, y1, x2, y2 = obs['bbox']
-        priority = obs['priority']
-        label = obs['class']
-        source = obs.get('source', 'unknown')
-        
-        # Couleur : utilise la couleur spécifique Mapillary si elle existe, sinon la couleur par défaut
-        color = obs.get('color', get_color_for_priority(priority))
-        
-        # Épaisseur dépendante de la priorité (P1 = plus visible)
-        thickness = 4 if priority == 1 else (3 if priority == 2 else 2)
-        
-        cv2.rectangle(annotated, (x1, y1), (x2, y2), color, thickness)
-        
-        text = f"{label} P{priority}"
-        font_scale = 0.5
-        font_thickness = 2
-        
-        # Affichage du texte de la détection (label + priorité)
-        (text_w, text_h), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)
-        cv2.rectangle(annotated, (x1, y1 - text_h - 10), (x1 + text_w + 5, y1), color, -1)
-        cv2.putText(annotated, text, (x1 + 2, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 
-                     font_scale, (255, 255, 255), font_thickness)
-        
-        stats[priority] += 1
-        stats_by_source[source] += 1
-    
-    # Affichage des statistiques sur l'image (Tableau de bord de détection)
-    info_y = 30
-    cv2.rectangle(annotated, (10, 10), (350, 150), (0, 0, 0), -1)
-    cv2.putText(annotated, f"Obstacles critiques (P1): {stats[1]}", (20, info_y), 
-                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-    cv2.putText(annotated, f"Obstacles importants (P2): {stats[2]}", (20, info_y + 30), 
-                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
-    cv2.putText(annotated, f"Obstacles moderes (P3): {stats[3]}", (20, info_y + 60), 
-                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-    
-    cv2.putText(annotated, f"YOLO: {stats_by_source['yolo']} | Mapillary: {stats_by_source['mapillary']}", 
-                 (20, info_y + 100), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-    
-    return annotated
+# Couleurs par défaut des détections sans couleur propre (YOLO)
+DEFAULT_PRIORITY_COLORS = {p: get_color_for_priority(p) for p in (1, 2, 3)}
+
+# Étiquettes et tableau de bord pré-rendus en cache (voir annotation_renderer.py)
+renderer = AnnotationRenderer(DEFAULT_PRIORITY_COLORS)
+
+def stored_seg_map(frame):
+    """
+    Carte de segmentation plein cadre déjà stockée pour cette image et son id2label,
+    ou None (stockage désactivé, image jamais segmentée, ou segmentée par ROI/tuiles).
+    """
+    if not SEG_MAP_STORE_ENABLED:
+        return None
+    model_id = seg_map_model_id()
+    seg_map = seg_map_store.get(model_id, hash_frame(frame), frame.shape)
+    id2label = seg_map_store.load_labels(model_id)
+    if seg_map is None or id2label is None:
+        return None
+    return seg_map, id2label
+
+def annotate_frame(frame, obstacles, seg_map=None, id2label=None, out=None, in_place=False):
+    """
+    Dessine les boîtes englobantes et les statistiques sur l'image (pour l'utilisateur).
+    seg_map: carte de segmentation superposée en transparence (id2label du modèle par défaut);
+    out: tampon de sortie réutilisé; in_place: dessine directement dans `frame`.
+    """
+    with stage("annotate"):
+        overlay = None
+        if seg_map is not None:
+            id2label = id2label or mapillary_model.config.id2label
+            overlay = (seg_map, *segmentation_palette(id2label, MAPILLARY_OBSTACLES))
+        return renderer.render(frame, obstacles, overlay=overlay, overlay_alpha=SEG_OVERLAY_ALPHA,
+                               out=out, in_place=in_place)
+
+def annotate_frame_jpeg(frame, obstacles, quality=90, **kwargs):
+    """Image annotée encodée directement en octets JPEG (sans écriture disque)."""
+    annotated = annotate_frame(frame, obstacles, **kwargs)
+    with stage("encode"):
+        ok, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Échec de l'encodage JPEG de l'image annotée")
+    return buffer.tobytes()
 
 # Les fonctions process_images() et process_videos() sont supprimées car elles ne sont plus 
 # nécessaires pour l'API Flask. Le traitement est déclenché par l'appel HTTP.
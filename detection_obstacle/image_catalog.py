@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from detection_cache import hash_frame
+from image_decoding import decode_image, image_dimensions
+
+# ---------------------------------------------------------
+# CATALOGUE DES IMAGES (index incrémental + vignettes)
+# ---------------------------------------------------------
+# /api/images ne relit plus le dossier à chaque requête: le catalogue garde en
+# mémoire (et sur disque, pour les redémarrages) une entrée par image avec sa
+# taille, sa date, ses dimensions et le hash de ses pixels.
+#
+#  - démarrage: l'index sauvegardé est servi aussitôt; le premier parcours du
+#    dossier a lieu dans le thread de fond ("scanning" dans /api/images)
+#  - rafraîchissement: le dossier n'est relu que si sa date de modification a
+#    changé (ajout, suppression, renommage), et au plus tard toutes les
+#    CATALOG_SCAN_INTERVAL secondes (fichiers remplacés sur place); seules les
+#    images nouvelles ou modifiées sont réanalysées
+#  - dimensions: lues dans l'en-tête JPEG/PNG, sans décodage
+#  - hash des pixels (même clé que le cache de détection): calculé par un thread
+#    de fond, image par image; il permet de savoir si un résultat est en cache
+#  - présence en cache: mémorisée par image pour une version du cache de
+#    détection (cached_version), recalculée seulement quand celle-ci change
+#  - vignettes: réduites au décodage (IMREAD_REDUCED_*) à la première demande,
+#    puis servies depuis le disque; leur nom dépend de la taille et de la date
+#    du fichier source, une image modifiée obtient donc une nouvelle vignette
+#    (celles des images modifiées ou supprimées sont effacées à la relecture)
+
+# Extensions d'images cataloguées
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Vérification de la date du dossier au plus toutes les N secondes (entre deux requêtes)
+CATALOG_CHECK_INTERVAL = 2
+# Relecture complète du dossier au plus tard toutes les N secondes
+CATALOG_SCAN_INTERVAL = 60
+# Calcul des hash de pixels en arrière-plan (indique les résultats en cache)
+CATALOG_HASHING = True
+# Sauvegarde de l'index tous les N hash calculés
+CATALOG_SAVE_EVERY = 200
+# Pagination de /api/images
+CATALOG_PAGE_SIZE = 100
+CATALOG_MAX_PAGE_SIZE = 1000
+CATALOG_SORTS = ("natural", "name", "mtime")
+# Vignettes: tailles autorisées (plus grand côté, pixels) et qualité JPEG
+THUMBNAIL_SIZES = (128, 256, 512)
+THUMBNAIL_DEFAULT_SIZE = 256
+THUMBNAIL_QUALITY = 80
+
+# Octets lus pour trouver les dimensions dans l'en-tête (EXIF compris)
+_HEADER_BYTES = 64 * 1024
+_INDEX_VERSION = 1
+_NUMBER = re.compile(r"\d+")
+
+
+def _natural_key(name):
+    """Tri par premier nombre du nom (même ordre que l'ancienne liste du viewer), puis par nom."""
+    match = _NUMBER.search(name)
+    return int(match.group()) if match else 0, name
+
+
+def _read_dimensions(path):
+    """(largeur, hauteur) lues dans l'en-tête du fichier, ou (None, None)."""
+    try:
+        with open(path, 'rb') as f:
+            size = image_dimensions(f.read(_HEADER_BYTES))
+    except OSError:
+        size = None
+    return size if size is not None else (None, None)
+
+
+class ImageCatalog:
+    """Index des images d'un dossier: pagination, filtres, hash des pixels et vignettes en cache."""
+
+    def __init__(self, images_dir, catalog_dir):
+        self.images_dir = images_dir
+        self.index_path = os.path.join(catalog_dir, "index.json")
+        self.thumbnails_dir = os.path.join(catalog_dir, "thumbnails")
+        self._entries = {} # nom -> {'size', 'mtime_ns', 'width', 'height', 'hash', 'readable'}
+        self._sorted = {} # tri -> noms triés (invalidé à chaque changement)
+        self._cached_flags = {} # nom -> résultat en cache, valable pour _cached_version
+        self._cached_version = None
+        self._lock = threading.Lock()
+        self._scan_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._initial_scan = threading.Event() # Premier parcours du dossier terminé
+        self._thread = None
+        self._dir_mtime = None
+        self._last_check = 0.0
+        self._last_scan = 0.0
+        self.stats_counters = {'scans': 0, 'indexed': 0, 'hashed': 0, 'thumbnails_created': 0, 'thumbnail_hits': 0,
+                               'thumbnails_pruned': 0}
+        os.makedirs(self.thumbnails_dir, exist_ok=True)
+        self._load()
+
+    # --- Persistance -------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get('version') != _INDEX_VERSION or data.get('images_dir') != os.path.abspath(self.images_dir):
+            return
+        self._entries = {
+            name: {'size': size, 'mtime_ns': mtime_ns, 'width': width, 'height': height,
+                   'hash': frame_hash, 'readable': readable}
+            for name, (size, mtime_ns, width, height, frame_hash, readable) in data['entries'].items()
+        }
+
+    def save(self):
+        """Écrit l'index sur disque (écriture atomique)."""
+        with self._lock:
+            entries = {
+                name: [e['size'], e['mtime_ns'], e['width'], e['height'], e['hash'], e['readable']]
+                for name, e in self._entries.items()
+            }
+        payload = json.dumps({'version': _INDEX_VERSION, 'images_dir': os.path.abspath(self.images_dir),
+                              'entries': entries})
+        tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[WARN] Écriture de l'index des images impossible ({self.index_path}): {e}")
+
+    # --- Rafraîchissement --------------------------------------------
+
+    def start(self):
+        """Démarre le thread de fond (premier parcours du dossier, puis calcul des hash) sans l'attendre."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._background, name="image-catalog", daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def scanning(self):
+        """Vrai tant que le premier parcours du dossier n'est pas terminé (index sauvegardé servi)."""
+        return not self._initial_scan.is_set()
+
+    def wait_scanned(self, timeout=None):
+        """Attend la fin du premier parcours du dossier; retourne False si le délai est dépassé."""
+        return self._initial_scan.wait(timeout)
+
+    def _background(self):
+        try:
+            self.refresh(force=True)
+        except Exception as e:
+            print(f"[WARN] Parcours initial du dossier d'images impossible ({self.images_dir}): {e}")
+        finally:
+            self._initial_scan.set()
+        if CATALOG_HASHING:
+            self._wakeup.set()
+            self._hash_worker()
+
+    def refresh(self, force=False):
+        """Relit le dossier si sa date a changé ou si la dernière relecture est trop ancienne."""
+        if not force and self.scanning:
+            return # Premier parcours en cours dans le thread de fond
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_check < CATALOG_CHECK_INTERVAL:
+                return
+            self._last_check = now
+        try:
+            dir_mtime = os.stat(self.images_dir).st_mtime_ns
+        except OSError:
+            dir_mtime = None
+        if not force and dir_mtime == self._dir_mtime and now - self._last_scan < CATALOG_SCAN_INTERVAL:
+            return
+        # Une seule relecture à la fois: les autres requêtes servent l'index courant
+        if not self._scan_lock.acquire(blocking=force):
+            return
+        try:
+            self._scan()
+            self._dir_mtime = dir_mtime
+            self._last_scan = now
+        finally:
+            self._scan_lock.release()
+
+    def _scan(self):
+        found = {}
+        try:
+            with os.scandir(self.images_dir) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file():
+                        stat = entry.stat()
+                        found[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            print(f"[WARN] Lecture du dossier d'images impossible ({self.images_dir}): {e}")
+
+        with self._lock:
+            current = dict(self._entries)
+        # Seules les images nouvelles ou modifiées sont réanalysées (en-tête uniquement)
+        updates = {}
+        for name, (size, mtime_ns) in found.items():
+            entry = current.get(name)
+            if entry is None or (entry['size'], entry['mtime_ns']) != (size, mtime_ns):
+                width, height = _read_dimensions(os.path.join(self.images_dir, name))
+                updates[name] = {'size': size, 'mtime_ns': mtime_ns, 'width': width, 'height': height,
+                                 'hash': None, 'readable': True}
+        removed = current.keys() - found.keys()
+
+        with self._lock:
+            self.stats_counters['scans'] += 1
+            if not updates and not removed:
+                return
+            for name in removed:
+                self._entries.pop(name, None)
+            self._entries.update(updates)
+            for name in removed | updates.keys():
+                self._cached_flags.pop(name, None)
+            self._sorted = {}
+            self.stats_counters['indexed'] += len(updates)
+        self.save()
+        self._wakeup.set()
+        if removed or updates.keys() & current.keys():
+            self._prune_thumbnails()
+
+    def _thumbnail_key(self, name, size, mtime_ns, thumbnail_size):
+        return hashlib.blake2b(f"{name}|{size}|{mtime_ns}|{thumbnail_size}".encode(), digest_size=16).hexdigest()
+
+    def _prune_thumbnails(self):
+        """Supprime les vignettes qui ne correspondent plus à aucune image du catalogue (modifiée ou supprimée)."""
+        with self._lock:
+            files = [(name, e['size'], e['mtime_ns']) for name, e in self._entries.items()]
+        valid = {f"{self._thumbnail_key(name, size, mtime_ns, thumbnail_size)}.jpg"
+                 for name, size, mtime_ns in files for thumbnail_size in THUMBNAIL_SIZES}
+        removed = 0
+        try:
+            with os.scandir(self.thumbnails_dir) as entries:
+                stale = [entry.path for entry in entries if entry.name.endswith('.jpg') and entry.name not in valid]
+        except OSError:
+            return
+        for path in stale:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.stats_counters['thumbnails_pruned'] += removed
+
+    def _hash_worker(self):
+        """Calcule le hash des pixels des images qui n'en ont pas encore (une à la fois)."""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                pending = [(name, e['size'], e['mtime_ns']) for name, e in self._entries.items()
+                           if e['hash'] is None and e['readable']]
+            for count, (name, size, mtime_ns) in enumerate(pending, 1):
+                self._hash_image(name, size, mtime_ns)
+                if count % CATALOG_SAVE_EVERY == 0:
+                    self.save()
+            if pending:
+                self.save()
+
+    def _hash_image(self, name, size, mtime_ns):
+        path = os.path.join(self.images_dir, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        # Même décodage que cv2.imread (routes de détection): même hash que la clé du cache
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        frame_hash = hash_frame(frame) if frame is not None else None
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or (entry['size'], entry['mtime_ns']) != (size, mtime_ns):
+                return # Image modifiée ou supprimée entre-temps: elle sera retraitée
+            entry['hash'] = frame_hash
+            entry['readable'] = frame is not None
+            self._cached_flags.pop(name, None)
+            if frame is not None:
+                entry['height'], entry['width'] = frame.shape[:2]
+            self.stats_counters['hashed'] += 1
+
+    # --- Consultation ------------------------------------------------
+
+    def _sorted_names(self, sort):
+        """Noms triés (sous verrou), mémorisés jusqu'au prochain changement de l'index."""
+        names = self._sorted.get(sort)
+        if names is None:
+            if sort == "mtime":
+                names = sorted(self._entries, key=lambda name: (self._entries[name]['mtime_ns'], name))
+            elif sort == "name":
+                names = sorted(self._entries)
+            else:
+                names = sorted(self._entries, key=_natural_key)
+            self._sorted[sort] = names
+        return names
+
+    def _is_cached(self, name, is_cached):
+        """Présence en cache de l'image (sous verrou), mémorisée pour la version courante du cache."""
+        flag = self._cached_flags.get(name)
+        if flag is None:
+            frame_hash = self._entries[name]['hash']
+            flag = bool(is_cached and frame_hash and is_cached(frame_hash))
+            if frame_hash is not None: # Image pas encore hashée: réévaluée à la prochaine requête
+                self._cached_flags[name] = flag
+        return flag
+
+    def query(self, offset=0, limit=CATALOG_PAGE_SIZE, search=None, sort="natural", descending=False,
+              cached=None, is_cached=None, cached_version=None):
+        """
+        Page de l'index: images dont le nom contient `search`, triées, filtrées par
+        présence d'un résultat en cache (cached=True/False, via is_cached(hash)).
+        La présence en cache est mémorisée par image tant que cached_version ne change pas.
+        Retourne {'total', 'offset', 'limit', 'items', 'indexing'}.
+        """
+        self.refresh()
+        with self._lock:
+            if cached_version is None or cached_version != self._cached_version:
+                self._cached_flags = {}
+                self._cached_version = cached_version
+            names = self._sorted_names(sort)
+            if search:
+                search = search.lower()
+                names = [name for name in names if search in name.lower()]
+            if descending:
+                names = names[::-1]
+            if cached is not None:
+                names = [name for name in names if self._is_cached(name, is_cached) == cached]
+            # Seule la page demandée est copiée
+            page = [
+                {'name': name, 'width': e['width'], 'height': e['height'], 'size': e['size'],
+                 'mtime': e['mtime_ns'] / 1e9, 'hash': e['hash'], 'cached': self._is_cached(name, is_cached)}
+                for name, e in ((name, self._entries[name]) for name in names[offset:offset + limit])
+            ]
+            pending = sum(1 for e in self._entries.values() if e['hash'] is None and e['readable'])
+            total_images = len(self._entries)
+
+        return {
+            'total': len(names),
+            'offset': offset,
+            'limit': limit,
+            'items': page,
+            'indexing': {'images': total_images, 'pending_hashes': pending if CATALOG_HASHING else None,
+                         'scanning': self.scanning}
+        }
+
+    def thumbnail(self, name, size=THUMBNAIL_DEFAULT_SIZE):
+        """
+        Chemin de la vignette JPEG de l'image (plus grand côté = size), créée au besoin.
+        Lève FileNotFoundError si l'image n'existe pas, ValueError si elle est illisible.
+        """
+        if os.path.basename(name) != name or not name.lower().endswith(IMAGE_EXTENSIONS):
+            raise FileNotFoundError(name)
+        path = os.path.join(self.images_dir, name)
+        stat = os.stat(path)
+        key = self._thumbnail_key(name, stat.st_size, stat.st_mtime_ns, size)
+        thumbnail_path = os.path.join(self.thumbnails_dir, f"{key}.jpg")
+        if os.path.exists(thumbnail_path):
+            with self._lock:
+                self.stats_counters['thumbnail_hits'] += 1
+            return thumbnail_path
+
+        with open(path, 'rb') as f:
+            frame, _ = decode_image(f.read(), max_side=size)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+        if not ok:
+            raise ValueError(f"Échec de l'encodage de la vignette de {name}")
+        tmp_path = f"{thumbnail_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.tobytes())
+        os.replace(tmp_path, thumbnail_path)
+        with self._lock:
+            self.stats_counters['thumbnails_created'] += 1
+        return thumbnail_path
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats['images'] = len(self._entries)
+            stats['scanning'] = self.scanning
+            stats['pending_hashes'] = sum(1 for e in self._entries.values() if e['hash'] is None and e['readable'])
+        return stats
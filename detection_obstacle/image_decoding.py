@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+# ---------------------------------------------------------
+# DÉCODAGE EN MÉMOIRE DES IMAGES ENVOYÉES (POST /api/detect)
+# ---------------------------------------------------------
+# Les clients caméra envoient directement les octets JPEG/PNG: l'image est
+# décodée depuis le tampon de la requête (cv2.imdecode), sans fichier temporaire.
+#
+# Avec une taille cible (max_side = plus grand côté), un JPEG est réduit
+# pendant le décodage (IMREAD_REDUCED_COLOR_2/4/8: décodage DCT à 1/2, 1/4 ou
+# 1/8 de la résolution, bien moins coûteux qu'un décodage complet suivi d'un
+# redimensionnement); la réduction restante se fait ensuite par INTER_AREA.
+
+# Taille maximale d'une image envoyée (octets)
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+_JPEG_REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _jpeg_dimensions(data):
+    """(largeur, hauteur) lues dans le segment SOF du JPEG, sans décodage."""
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF: # Octets de remplissage
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8: # Marqueurs sans longueur
+            i += 2
+            continue
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC): # SOF0..SOF15
+            height = int.from_bytes(data[i + 5:i + 7], 'big')
+            width = int.from_bytes(data[i + 7:i + 9], 'big')
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], 'big')
+    return None
+
+
+def image_dimensions(data):
+    """(largeur, hauteur) d'un JPEG ou d'un PNG lues dans l'en-tête, ou None."""
+    if data[:2] == b'\xff\xd8':
+        return _jpeg_dimensions(data)
+    if data[:8] == _PNG_SIGNATURE and data[12:16] == b'IHDR':
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    return None
+
+
+def decode_image(data, max_side=None):
+    """
+    Décode une image JPEG/PNG depuis des octets, réduite si besoin pour que son
+    plus grand côté ne dépasse pas `max_side`.
+    Retourne (image BGR, (largeur, hauteur) d'origine). Lève ValueError si illisible.
+    """
+    if not data:
+        raise ValueError("Corps de requête vide (octets JPEG/PNG attendus)")
+    size = image_dimensions(data)
+    flags = cv2.IMREAD_COLOR
+    if max_side and size is not None and data[:2] == b'\xff\xd8':
+        for factor, reduced_flag in _JPEG_REDUCED_FLAGS:
+            if max(size) // factor >= max_side:
+                flags = reduced_flag
+                break
+
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if frame is None:
+        raise ValueError("Image illisible (JPEG ou PNG attendu)")
+
+    height, width = frame.shape[:2]
+    if size is None:
+        size = (width, height)
+    elif (size[0] > size[1]) != (width > height) and size[0] != size[1]:
+        size = (size[1], size[0]) # Orientation EXIF appliquée au décodage
+
+    if max_side and max(height, width) > max_side:
+        ratio = max_side / max(height, width)
+        target = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        frame = cv2.resize(frame, target, interpolation=cv2.INTER_AREA)
+    return frame, size
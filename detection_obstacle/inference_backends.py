@@ -0,0 +1,239 @@
+import json
+import os
+
+# ---------------------------------------------------------
+# BACKENDS D'INFÉRENCE (PyTorch eager / ONNX Runtime / TorchScript)
+# ---------------------------------------------------------
+# Le backend "torch" (PyTorch eager) reste celui par défaut. Les backends
+# "onnx" et "torchscript" exportent les modèles une seule fois dans
+# ressources/models/ puis réutilisent les fichiers exportés.
+#
+#  - YOLO: export et exécution délégués à Ultralytics (format onnx / torchscript).
+#  - Mask2Former: export du réseau (pixel_values -> logits); le processor
+#    Hugging Face reste utilisé pour le pré- et post-traitement.
+#
+# torch, onnxruntime et transformers sont importés à la demande (démarrage rapide).
+
+BACKENDS = ("torch", "onnx", "torchscript")
+
+# Réglages des threads ONNX Runtime (None = choix automatique d'ONNX Runtime)
+ONNX_INTRA_OP_THREADS = None
+ONNX_INTER_OP_THREADS = 1
+ONNX_OPSET = 17
+
+# Résolution de l'image factice utilisée pour l'export (axes hauteur/largeur dynamiques)
+EXPORT_DUMMY_SIZE = (512, 512)
+# Le traçage fige les branches de Swin (padding, découpage en fenêtres) à la forme de l'image
+# factice: le modèle exporté est comparé au modèle eager sur ces tailles d'image (hauteur, largeur),
+# prétraitées par le processor, et abandonné (retour au backend torch) si les logits divergent
+EXPORT_VALIDATION_SIZES = ((1080, 1920), (720, 1280), (1200, 675))
+EXPORT_VALIDATION_TOLERANCE = 1e-2 # Écart absolu maximal des logits
+
+
+def check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend d'inférence inconnu: {backend} (attendu: {', '.join(BACKENDS)})")
+
+
+# ---------------------------------------------------------
+# YOLO
+# ---------------------------------------------------------
+
+def yolo_artifact_path(weights_path, backend):
+    """Chemin du modèle YOLO exporté, à côté des poids .pt."""
+    root, _ = os.path.splitext(weights_path)
+    return f"{root}.onnx" if backend == "onnx" else f"{root}.torchscript"
+
+
+def load_yolo_backend(weights_path, backend, model=None):
+    """
+    Charge YOLO pour le backend demandé (export au premier appel si nécessaire).
+    `weights_path` doit pointer vers des poids .pt existants; `model` (YOLO eager déjà
+    chargé depuis ces poids) évite de les recharger pour l'export.
+    """
+    from ultralytics import YOLO
+
+    check_backend(backend)
+    if backend == "torch":
+        return model or YOLO(weights_path)
+
+    artifact = yolo_artifact_path(weights_path, backend)
+    if not os.path.exists(artifact):
+        print(f"[INFO] Export de YOLO au format {backend} vers {artifact}...")
+        exported = (model or YOLO(weights_path)).export(format=backend, dynamic=True)
+        if os.path.abspath(str(exported)) != os.path.abspath(artifact):
+            os.replace(str(exported), artifact)
+    return YOLO(artifact, task="detect")
+
+
+# ---------------------------------------------------------
+# MASK2FORMER
+# ---------------------------------------------------------
+
+def mask2former_artifact_path(models_dir, model_name, backend):
+    """Chemin du Mask2Former exporté dans le répertoire des modèles."""
+    base = model_name.replace("/", "--")
+    suffix = ".onnx" if backend == "onnx" else ".torchscript.pt"
+    return os.path.join(models_dir, base + suffix)
+
+
+def _logits_module(model):
+    """Enveloppe le modèle HF pour n'exposer que les logits (entrée: pixel_values)."""
+    import torch
+
+    class Mask2FormerLogits(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, pixel_values):
+            outputs = self.inner(pixel_values=pixel_values)
+            return outputs.class_queries_logits, outputs.masks_queries_logits
+
+    return Mask2FormerLogits(model).eval()
+
+
+def export_mask2former(model, artifact, backend):
+    """Exporte Mask2Former (ONNX ou TorchScript) vers `artifact`."""
+    import torch
+
+    wrapper = _logits_module(model)
+    dummy = torch.randn(1, 3, *EXPORT_DUMMY_SIZE)
+    tmp_path = artifact + ".tmp"
+    print(f"[INFO] Export de Mask2Former au format {backend} vers {artifact}...")
+    with torch.no_grad():
+        if backend == "onnx":
+            torch.onnx.export(
+                wrapper, (dummy,), tmp_path,
+                input_names=["pixel_values"],
+                output_names=["class_queries_logits", "masks_queries_logits"],
+                dynamic_axes={"pixel_values": {0: "batch", 2: "height", 3: "width"}},
+                opset_version=ONNX_OPSET
+            )
+        else:
+            traced = torch.jit.trace(wrapper, (dummy,), strict=False)
+            traced.save(tmp_path)
+    os.replace(tmp_path, artifact)
+
+
+class _ExportedMask2Former:
+    """
+    Remplaçant de Mask2FormerForUniversalSegmentation pour les modèles exportés:
+    même appel model(**inputs) et même attribut config, sortie compatible avec
+    processor.post_process_semantic_segmentation.
+    """
+
+    def __init__(self, config, run):
+        self.config = config
+        self._run = run
+
+    def __call__(self, pixel_values, **_ignored):
+        import torch
+        from transformers.models.mask2former.modeling_mask2former import (
+            Mask2FormerForUniversalSegmentationOutput
+        )
+
+        class_logits, mask_logits = self._run(pixel_values)
+        return Mask2FormerForUniversalSegmentationOutput(
+            class_queries_logits=torch.as_tensor(class_logits),
+            masks_queries_logits=torch.as_tensor(mask_logits)
+        )
+
+
+def validation_path(artifact):
+    """Fichier de résultat de la validation d'un Mask2Former exporté (à côté de l'export)."""
+    return artifact + ".validation.json"
+
+
+def validate_export(model, processor, run, sizes=EXPORT_VALIDATION_SIZES):
+    """
+    Compare les logits du modèle exporté (`run`) à ceux du modèle eager sur des images
+    aléatoires de tailles `sizes` (hauteur, largeur). Retourne l'écart absolu maximal
+    (infini si les formes des sorties diffèrent).
+    """
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    worst = 0.0
+    for height, width in sizes:
+        image = Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+        pixel_values = processor(images=[image], return_tensors="pt")["pixel_values"]
+        with torch.no_grad():
+            expected = model(pixel_values=pixel_values)
+        outputs = run(pixel_values)
+        for reference, output in zip((expected.class_queries_logits, expected.masks_queries_logits), outputs):
+            output = torch.as_tensor(output)
+            if output.shape != reference.shape:
+                return float("inf")
+            worst = max(worst, float((output - reference).abs().max()))
+    return worst
+
+
+def _onnx_session(artifact):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if ONNX_INTRA_OP_THREADS:
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    if ONNX_INTER_OP_THREADS:
+        options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+    return ort.InferenceSession(artifact, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_mapillary_backend(model_name, models_dir, backend):
+    """Retourne (processor, modèle) pour le backend demandé (export au premier appel si nécessaire)."""
+    from transformers import AutoConfig, AutoImageProcessor, Mask2FormerForUniversalSegmentation
+
+    check_backend(backend)
+    # Le 'processor' prépare l'image pour le modèle (normalisation, redimensionnement, etc.)
+    processor = AutoImageProcessor.from_pretrained(model_name, cache_dir=models_dir)
+    if backend == "torch":
+        model = Mask2FormerForUniversalSegmentation.from_pretrained(model_name, cache_dir=models_dir)
+        return processor, model
+
+    artifact = mask2former_artifact_path(models_dir, model_name, backend)
+    model = None
+    if not os.path.exists(artifact):
+        model = Mask2FormerForUniversalSegmentation.from_pretrained(model_name, cache_dir=models_dir)
+        export_mask2former(model, artifact, backend)
+
+    run = _exported_runner(artifact, backend)
+    if not os.path.exists(validation_path(artifact)):
+        # Export neuf (ou antérieur à la validation): comparaison au modèle eager sur des tailles réelles
+        if model is None:
+            model = Mask2FormerForUniversalSegmentation.from_pretrained(model_name, cache_dir=models_dir)
+        max_diff = validate_export(model.eval(), processor, run)
+        if not max_diff <= EXPORT_VALIDATION_TOLERANCE:
+            print(f"[WARN] Mask2Former exporté ({backend}) non fidèle hors {EXPORT_DUMMY_SIZE} "
+                  f"(écart des logits: {max_diff}): Mask2Former reste sur le backend torch.")
+            del run
+            os.remove(artifact)
+            return processor, model
+        with open(validation_path(artifact), "w", encoding="utf-8") as f:
+            json.dump({'sizes': EXPORT_VALIDATION_SIZES, 'max_abs_diff': max_diff}, f)
+        print(f"[OK] Mask2Former exporté validé sur {list(EXPORT_VALIDATION_SIZES)} (écart max {max_diff:.2e})")
+    del model
+
+    config = AutoConfig.from_pretrained(model_name, cache_dir=models_dir)
+    return processor, _ExportedMask2Former(config, run)
+
+
+def _exported_runner(artifact, backend):
+    """Fonction pixel_values -> (class_queries_logits, masks_queries_logits) du modèle exporté."""
+    if backend == "onnx":
+        session = _onnx_session(artifact)
+
+        def run(pixel_values):
+            return session.run(None, {"pixel_values": pixel_values.numpy()})
+    else:
+        import torch
+        scripted = torch.jit.load(artifact)
+
+        def run(pixel_values):
+            with torch.no_grad():
+                return scripted(pixel_values)
+
+    return run
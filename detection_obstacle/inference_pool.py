@@ -0,0 +1,272 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future
+
+from instrumentation import record_notes, record_stages
+
+# ---------------------------------------------------------
+# POOL DE PROCESSUS D'INFÉRENCE (mode production)
+# ---------------------------------------------------------
+# Un nombre fixe de processus charge chacun les modèles une seule fois et
+# consomme une file de tâches partagée. Les threads HTTP déposent les tâches
+# et attendent le résultat: /api/images et les fichiers statiques restent
+# réactifs pendant que les détections sont en file.
+#
+#  - contre-pression: file bornée, une tâche refusée lève PoolBusy (HTTP 503)
+#  - délai: une tâche non terminée à temps lève TimeoutError (HTTP 504);
+#    une tâche dont l'échéance est passée avant son démarrage n'est pas exécutée
+
+# Nombre de processus d'inférence (None = calculé selon les cœurs et la RAM)
+INFERENCE_WORKERS = None
+# Mémoire estimée par processus (YOLOv8m + Mask2Former Swin-Large), en Go
+MODEL_RAM_GB = 3.0
+# Threads torch minimum par processus
+MIN_THREADS_PER_WORKER = 2
+# Nombre maximal de tâches en attente dans la file
+JOB_QUEUE_SIZE = 16
+# Délai maximal d'une tâche (attente + exécution), en secondes
+JOB_TIMEOUT = 120
+
+
+class PoolBusy(Exception):
+    """La file de tâches est pleine (contre-pression)."""
+
+
+def _total_ram_bytes():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_worker_count():
+    """Nombre de processus adapté aux cœurs (MIN_THREADS_PER_WORKER chacun) et à la RAM."""
+    by_cpu = max(1, (os.cpu_count() or 1) // MIN_THREADS_PER_WORKER)
+    ram = _total_ram_bytes()
+    # On laisse ~1 Go au processus HTTP et au système
+    by_ram = max(1, int((ram / 1024 ** 3 - 1) // MODEL_RAM_GB)) if ram else 1
+    return max(1, min(by_cpu, by_ram))
+
+
+def _worker_main(worker_id, job_queue, result_queue, num_threads):
+    """Boucle d'un processus d'inférence: charge les modèles puis exécute les tâches."""
+    import torch
+    import detector_module as dm
+    from instrumentation import trace
+
+    torch.set_num_threads(num_threads)
+    dm._ensure_models()
+    # 'yolo' / 'mapillary': un seul modèle (tâches asynchrones, résultats YOLO publiés avant la segmentation)
+    # 'cascade': segmentation selon la politique de cascade, payload (image, obstacles YOLO, durée YOLO en ms),
+    #            résultat (obstacles Mapillary, décision)
+    # 'transient': image envoyée par un client, carte de segmentation non stockée
+    handlers = {
+        'detect': dm.detect_obstacles_combined,
+        'transient': dm.detect_obstacles_transient,
+        'batch': dm.detect_obstacles_batch,
+        'yolo': dm.detect_obstacles_yolo,
+        'mapillary': dm.detect_obstacles_mapillary,
+        'cascade': lambda payload: dm.cascade_segmentation(*payload),
+    }
+    result_queue.put(('ready', worker_id, dm.model_registry.status()))
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, kind, payload, deadline = job
+        if deadline is not None and time.time() > deadline:
+            result_queue.put(('expired', job_id, None))
+            continue
+        # Tâche en cours: si le processus meurt avant la fin, la Future échoue aussitôt
+        result_queue.put(('started', job_id, (worker_id, os.getpid())))
+        try:
+            # Les mesures par étape et les notes sont renvoyées avec le résultat (agrégées côté HTTP)
+            with trace() as t:
+                result = handlers[kind](payload)
+            result_queue.put(('done', job_id, (result, t.stages, t.notes)))
+        except Exception as e:
+            result_queue.put(('error', job_id, str(e)))
+
+
+class InferencePool:
+    """Pool fixe de processus possédant les modèles, alimenté par une file de tâches bornée."""
+
+    def __init__(self, num_workers=None, queue_size=None, job_timeout=None):
+        self.num_workers = num_workers or INFERENCE_WORKERS or default_worker_count()
+        self.queue_size = queue_size or JOB_QUEUE_SIZE
+        self.job_timeout = job_timeout or JOB_TIMEOUT
+        self.threads_per_worker = max(1, (os.cpu_count() or 1) // self.num_workers)
+
+        self._ctx = mp.get_context('spawn') # Pas de fork d'un processus contenant des threads
+        self._job_queue = self._ctx.Queue(maxsize=self.queue_size)
+        self._result_queue = self._ctx.Queue()
+        self._workers = {}
+        self._ready = {}
+        self._running = {} # worker_id -> job_id de la tâche en cours (thread de distribution uniquement)
+        self._orphaned = set() # Tâches annoncées par un processus déjà remplacé, sans résultat reçu
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stopping = False
+        self.stats_counters = {'submitted': 0, 'completed': 0, 'failed': 0,
+                               'rejected': 0, 'timed_out': 0, 'expired': 0, 'restarts': 0,
+                               'lost': 0}
+
+    # --- Cycle de vie -------------------------------------------------
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._job_queue, self._result_queue, self.threads_per_worker),
+            name=f"inference-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._ready[worker_id] = False
+
+    def start(self):
+        """Démarre les processus d'inférence et le thread de distribution des résultats."""
+        print(f"[INFO] Pool d'inférence: {self.num_workers} processus x {self.threads_per_worker} threads, "
+              f"file de {self.queue_size} tâches")
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+        threading.Thread(target=self._dispatch_results, name="inference-dispatch", daemon=True).start()
+        return self
+
+    def shutdown(self):
+        """Arrête proprement les processus (les tâches en attente sont abandonnées)."""
+        self._stopping = True
+        for _ in self._workers:
+            try:
+                self._job_queue.put_nowait(None)
+            except queue.Full:
+                break
+        for process in self._workers.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def _dispatch_results(self):
+        """Associe les résultats des processus aux Futures et relance les processus morts."""
+        last_check = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() - last_check > 1.0:
+                self._restart_dead_workers()
+                last_check = time.monotonic()
+            try:
+                status, key, value = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if status == 'ready':
+                self._ready[key] = True
+                continue
+            if status == 'started':
+                worker_id, pid = value
+                process = self._workers.get(worker_id)
+                if process is not None and process.pid == pid:
+                    self._running[worker_id] = key
+                else:
+                    # Message d'un processus déjà mort (et remplacé): son résultat, s'il a été envoyé,
+                    # suit immédiatement; sinon la tâche échoue à la prochaine vérification
+                    self._orphaned.add(key)
+                continue
+            self._orphaned.discard(key)
+            for worker_id, job_id in list(self._running.items()):
+                if job_id == key:
+                    del self._running[worker_id]
+
+            with self._lock:
+                future = self._futures.pop(key, None)
+                counter = {'done': 'completed', 'error': 'failed', 'expired': 'expired'}[status]
+                self.stats_counters[counter] += 1
+            if future is None or future.done():
+                continue # Tâche déjà abandonnée (délai dépassé côté HTTP)
+            if status == 'done':
+                future.set_result(value)
+            elif status == 'expired':
+                future.set_exception(TimeoutError("Tâche expirée avant son exécution"))
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _fail_lost_job(self, job_id):
+        """Fait échouer la tâche d'un processus mort pendant son exécution (sans attendre le délai)."""
+        with self._lock:
+            future = self._futures.pop(job_id, None)
+            self.stats_counters['lost'] += 1
+        if future is not None and not future.done():
+            future.set_exception(RuntimeError("Processus d'inférence arrêté pendant la détection"))
+
+    def _restart_dead_workers(self):
+        for job_id in self._orphaned:
+            self._fail_lost_job(job_id)
+        self._orphaned.clear()
+        for worker_id, process in list(self._workers.items()):
+            if not process.is_alive() and not self._stopping:
+                print(f"[WARN] Processus d'inférence {worker_id} arrêté (code {process.exitcode}), redémarrage.")
+                lost_job = self._running.pop(worker_id, None)
+                if lost_job is not None:
+                    self._fail_lost_job(lost_job)
+                self._spawn(worker_id)
+                with self._lock:
+                    self.stats_counters['restarts'] += 1
+
+    # --- Soumission ---------------------------------------------------
+
+    def submit(self, payload, kind='detect', timeout=None):
+        """Dépose une tâche; lève PoolBusy si la file est pleine. Retourne une Future."""
+        timeout = timeout or self.job_timeout
+        job_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._futures[job_id] = future
+        try:
+            self._job_queue.put_nowait((job_id, kind, payload, time.time() + timeout))
+        except queue.Full:
+            with self._lock:
+                self._futures.pop(job_id, None)
+                self.stats_counters['rejected'] += 1
+            raise PoolBusy("File de détection pleine, réessayez plus tard")
+        with self._lock:
+            self.stats_counters['submitted'] += 1
+        return future
+
+    def wait(self, future, timeout=None):
+        """Attend le résultat d'une tâche; lève TimeoutError si le délai est dépassé."""
+        try:
+            result, stages, notes = future.result(timeout=timeout or self.job_timeout)
+        except futures.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.stats_counters['timed_out'] += 1
+            raise TimeoutError("Délai de détection dépassé") from None
+        record_stages(stages)
+        record_notes(notes)
+        return result
+
+    def detect(self, frame, timeout=None, kind='detect'):
+        """Équivalent de detect_obstacles_combined(frame) (ou du handler `kind`), exécuté dans le pool."""
+        return self.wait(self.submit(frame, kind=kind, timeout=timeout), timeout)
+
+    def stats(self):
+        """État du pool (pour /api/health et /api/pool/stats)."""
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats['in_flight'] = len(self._futures)
+        try:
+            stats['queued'] = self._job_queue.qsize()
+        except NotImplementedError: # macOS
+            stats['queued'] = None
+        stats['workers'] = self.num_workers
+        stats['workers_alive'] = sum(p.is_alive() for p in self._workers.values())
+        stats['workers_ready'] = sum(self._ready.values())
+        stats['threads_per_worker'] = self.threads_per_worker
+        stats['queue_size'] = self.queue_size
+        return stats
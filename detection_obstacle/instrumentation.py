@@ -0,0 +1,233 @@
+import contextvars
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# ---------------------------------------------------------
+# INSTRUMENTATION PAR ÉTAPE (temps réel, temps CPU, pic mémoire)
+# ---------------------------------------------------------
+# Chaque étape du pipeline est entourée de `with stage("nom"):`. Les mesures
+# alimentent:
+#  - les agrégats du processus (histogrammes exposés par /api/metrics au
+#    format texte Prometheus);
+#  - la trace de la détection en cours (`with trace() as t:`), renvoyée dans
+#    le bloc "timings" de la réponse. La trace suit la requête dans les
+#    exécuteurs des modèles grâce à contextvars (voir submit_in_context).
+#
+# Le temps CPU est celui du processus pendant l'étape: il inclut les threads
+# internes de torch, et les étapes exécutées en parallèle se recouvrent.
+#
+# Étapes mesurées: image_decode, cache_lookup, yolo_forward, yolo_postprocess,
+# seg_map_lookup, mapillary_preprocess, mapillary_forward, mapillary_postprocess,
+# seg_map_store, region_extraction, merge, annotate, encode, json_export, disk_write.
+
+# Désactive toute mesure (coût négligeable, mais supprimable)
+METRICS_ENABLED = True
+# Bornes des histogrammes de durée (secondes)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Préfixe des métriques Prometheus
+METRICS_PREFIX = "navsight"
+
+_current_trace = contextvars.ContextVar("detection_trace", default=None)
+
+
+def peak_rss_bytes():
+    """Pic de mémoire résidente du processus (None si indisponible)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024 # Linux: en Ko
+    except ImportError: # Windows
+        try:
+            import psutil
+            return getattr(psutil.Process().memory_info(), "peak_wset", None)
+        except ImportError:
+            return None
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.wall_sum = 0.0
+        self.cpu_sum = 0.0
+
+    def observe(self, wall, cpu):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if wall <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.wall_sum += wall
+        self.cpu_sum += cpu
+
+
+class StageMetrics:
+    """Agrégats thread-safe par étape, exportables au format Prometheus."""
+
+    def __init__(self):
+        self._stages = {}
+        self._detections = _Histogram()
+        self._lock = threading.Lock()
+
+    def observe(self, name, wall, cpu):
+        with self._lock:
+            self._stages.setdefault(name, _Histogram()).observe(wall, cpu)
+
+    def observe_detection(self, wall, cpu):
+        with self._lock:
+            self._detections.observe(wall, cpu)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._detections = _Histogram()
+
+    def snapshot(self):
+        """Moyennes par étape (ms) pour un affichage rapide."""
+        with self._lock:
+            return {
+                name: {
+                    'count': h.count,
+                    'wall_ms_mean': round(1000 * h.wall_sum / h.count, 3),
+                    'cpu_ms_mean': round(1000 * h.cpu_sum / h.count, 3)
+                }
+                for name, h in sorted(self._stages.items())
+            }
+
+    def prometheus_text(self):
+        """Export au format texte Prometheus (version 0.0.4)."""
+        prefix = METRICS_PREFIX
+        lines = []
+
+        def histogram(metric, help_text, series):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, h in series:
+                sep = "," if labels else ""
+                for bound, count in zip(LATENCY_BUCKETS, h.buckets):
+                    lines.append(f'{metric}_bucket{{{labels}{sep}le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric}_sum{suffix} {h.wall_sum:.6f}")
+                lines.append(f"{metric}_count{suffix} {h.count}")
+
+        with self._lock:
+            stages = sorted(self._stages.items())
+            histogram(f"{prefix}_stage_duration_seconds", "Temps réel par étape du pipeline de détection.",
+                      [(f'stage="{name}"', h) for name, h in stages])
+            lines.append(f"# HELP {prefix}_stage_cpu_seconds_total Temps CPU du processus pendant chaque étape.")
+            lines.append(f"# TYPE {prefix}_stage_cpu_seconds_total counter")
+            for name, h in stages:
+                lines.append(f'{prefix}_stage_cpu_seconds_total{{stage="{name}"}} {h.cpu_sum:.6f}')
+            histogram(f"{prefix}_detection_duration_seconds", "Temps réel total par détection.",
+                      [("", self._detections)])
+
+        peak = peak_rss_bytes()
+        if peak is not None:
+            lines.append(f"# HELP {prefix}_process_peak_rss_bytes Pic de mémoire résidente du processus.")
+            lines.append(f"# TYPE {prefix}_process_peak_rss_bytes gauge")
+            lines.append(f"{prefix}_process_peak_rss_bytes {peak}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
+
+
+class Trace:
+    """Mesures des étapes d'une détection (ou d'un lot)."""
+
+    def __init__(self):
+        self.stages = {}
+        self.totals = {} # Rempli à la fermeture de la trace
+        self.notes = {} # Informations de la détection hors mesures (ex: chemin de la cascade)
+        self._lock = threading.Lock() # Les modèles alimentent la trace depuis leurs threads
+
+    def add(self, name, wall, cpu, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0, 'calls': 0})
+            entry['wall_ms'] += 1000 * wall
+            entry['cpu_ms'] += 1000 * cpu
+            entry['calls'] += calls
+
+    def as_dict(self):
+        """Bloc "timings" de la réponse de détection."""
+        with self._lock:
+            stages = {name: {'wall_ms': round(e['wall_ms'], 3), 'cpu_ms': round(e['cpu_ms'], 3), 'calls': e['calls']}
+                      for name, e in self.stages.items()}
+        result = {'stages': stages}
+        result.update(self.totals)
+        return result
+
+
+@contextmanager
+def stage(name):
+    """Mesure une étape (agrégats du processus + trace de la détection en cours)."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        metrics.observe(name, wall, cpu)
+        current = _current_trace.get()
+        if current is not None:
+            current.add(name, wall, cpu)
+
+
+def note(name, value):
+    """Attache une information (sérialisable) à la trace en cours; ajoutée telle quelle à la réponse."""
+    current = _current_trace.get()
+    if current is not None:
+        with current._lock:
+            current.notes[name] = value
+
+
+@contextmanager
+def trace():
+    """Ouvre la trace d'une détection; `t.as_dict()` donne le bloc "timings"."""
+    current = Trace()
+    token = _current_trace.set(current)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        if METRICS_ENABLED:
+            metrics.observe_detection(wall, cpu)
+        peak = peak_rss_bytes()
+        current.totals = {
+            'total_ms': round(1000 * wall, 3),
+            'cpu_ms': round(1000 * cpu, 3),
+            'peak_rss_mb': round(peak / 1024 ** 2, 1) if peak is not None else None
+        }
+
+
+def record_stages(stages):
+    """
+    Reporte des mesures faites ailleurs (processus du pool d'inférence) dans les
+    agrégats de ce processus et dans la trace en cours. `stages` vient de Trace.stages.
+    """
+    current = _current_trace.get()
+    for name, entry in stages.items():
+        wall, cpu = entry['wall_ms'] / 1000, entry['cpu_ms'] / 1000
+        if METRICS_ENABLED:
+            metrics.observe(name, wall, cpu)
+        if current is not None:
+            current.add(name, wall, cpu, calls=entry['calls'])
+
+
+def record_notes(notes):
+    """Reporte dans la trace en cours les notes faites ailleurs (processus du pool d'inférence)."""
+    for name, value in notes.items():
+        note(name, value)
+
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit en conservant la trace courante (contextvars) dans le thread exécutant."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
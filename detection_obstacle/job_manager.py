@@ -0,0 +1,273 @@
+import itertools
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# ---------------------------------------------------------
+# TÂCHES DE DÉTECTION ASYNCHRONES
+# ---------------------------------------------------------
+# Une détection prend plusieurs secondes sur CPU: plutôt que de garder la
+# connexion HTTP ouverte, l'API crée une tâche et répond immédiatement avec son
+# identifiant. Des threads de fond exécutent les tâches (file bornée); chaque
+# tâche publie une suite d'événements numérotés (progression, résultats
+# partiels, résultat final) que le client suit en SSE ou par interrogation.
+#
+#  - contre-pression: file bornée, une tâche refusée lève JobQueueFull (HTTP 503)
+#  - déduplication: une tâche identique (même clé) encore en file ou en cours
+#    est réutilisée au lieu d'en créer une nouvelle
+#  - annulation: une tâche en file n'est jamais exécutée; une tâche en cours
+#    s'arrête au prochain point de contrôle (entre deux étapes du pipeline)
+
+# Nombre de tâches exécutées simultanément (les modèles occupent déjà tous les cœurs)
+JOB_WORKERS = 1
+# Nombre maximal de tâches en attente
+JOB_QUEUE_SIZE = 32
+# Durée de conservation d'une tâche terminée (secondes) et nombre maximal conservé
+JOB_TTL = 600
+JOB_HISTORY = 200
+
+# États d'une tâche
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    """La file des tâches est pleine (le client doit réessayer plus tard)."""
+
+
+class JobCancelled(Exception):
+    """Levée dans une tâche annulée, à un point de contrôle."""
+
+
+class Job:
+    """Tâche de fond: état, événements numérotés et résultat."""
+
+    def __init__(self, key, fn, args, meta=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.meta = meta or {}
+        self.state = QUEUED
+        self.progress_value = 0.0
+        self.partial = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self._fn = fn
+        self._args = args
+        self._cancel = threading.Event()
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.emit(QUEUED, {'job_id': self.id})
+
+    # --- Événements --------------------------------------------------
+
+    def emit(self, event, data):
+        """Publie un événement (réveille les clients en attente)."""
+        with self._cond:
+            self.events.append({'id': next(self._seq), 'event': event, 'data': data})
+            self._cond.notify_all()
+
+    def progress(self, step, value):
+        """Étape en cours et avancement estimé (0 à 1)."""
+        self.progress_value = value
+        self.emit('progress', {'step': step, 'progress': round(value, 3)})
+
+    def publish_partial(self, data):
+        """Résultat partiel (ex: détections YOLO avant la segmentation)."""
+        self.partial = data
+        self.emit('partial', data)
+
+    def events_after(self, last_id, timeout=None):
+        """Événements d'identifiant > last_id, en attendant au plus `timeout` s'il n'y en a aucun."""
+        with self._cond:
+            if not self._has_after(last_id) and not self.finished:
+                self._cond.wait(timeout)
+            return [event for event in self.events if event['id'] > last_id]
+
+    def _has_after(self, last_id):
+        return bool(self.events) and self.events[-1]['id'] > last_id
+
+    # --- Annulation --------------------------------------------------
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def raise_if_cancelled(self):
+        """Point de contrôle: interrompt la tâche si son annulation a été demandée."""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def _request_cancel(self):
+        """Demande l'annulation; une tâche encore en file est terminée immédiatement."""
+        with self._cond:
+            self._cancel.set()
+            if self.state == QUEUED:
+                self._finish(CANCELLED) # Ignorée par le thread d'exécution lorsqu'il la retire de la file
+
+    # --- Exécution ---------------------------------------------------
+
+    def _finish(self, state, result=None, error=None):
+        with self._cond:
+            if self.finished:
+                return
+            self.state = state
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            if state == DONE:
+                self.progress_value = 1.0
+                self.events.append({'id': next(self._seq), 'event': 'result', 'data': result})
+            elif state == FAILED:
+                self.events.append({'id': next(self._seq), 'event': 'failed', 'data': {'error': error}})
+            else:
+                self.events.append({'id': next(self._seq), 'event': CANCELLED, 'data': {'job_id': self.id}})
+            self._cond.notify_all()
+
+    def _run(self):
+        with self._cond:
+            if self.finished:
+                return # Annulée pendant son attente en file
+            self.state = RUNNING
+            self.started_at = time.time()
+        self.emit(RUNNING, {'job_id': self.id})
+        try:
+            result = self._fn(self, *self._args)
+        except JobCancelled:
+            self._finish(CANCELLED)
+        except Exception as e:
+            print(f"[ERREUR] Tâche {self.id}: {e}")
+            self._finish(FAILED, error=str(e))
+        else:
+            self._finish(DONE, result=result)
+        finally:
+            # Sortie par une BaseException (SystemExit, KeyboardInterrupt...): la tâche échoue
+            # quand même (sans effet si elle est déjà terminée)
+            self._finish(FAILED, error="Tâche interrompue")
+
+    def snapshot(self, include_events_after=None):
+        """État de la tâche (pour l'interrogation périodique)."""
+        data = {
+            'job_id': self.id,
+            'state': self.state,
+            'progress': round(self.progress_value, 3),
+            'meta': self.meta,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'partial': self.partial,
+            'result': self.result,
+            'error': self.error,
+            'last_event_id': self.events[-1]['id'] if self.events else -1
+        }
+        if include_events_after is not None:
+            data['events'] = [event for event in self.events if event['id'] > include_events_after]
+        return data
+
+
+class JobManager:
+    """Threads d'exécution alimentés par une file bornée, avec déduplication et annulation."""
+
+    def __init__(self, num_workers=None, queue_size=None):
+        self.num_workers = num_workers or JOB_WORKERS
+        self._queue = queue.Queue(maxsize=queue_size or JOB_QUEUE_SIZE)
+        self._jobs = OrderedDict()
+        self._active = {} # clé -> tâche en file ou en cours
+        self._threads = []
+        self._lock = threading.Lock()
+        self.stats_counters = {'submitted': 0, 'deduplicated': 0, 'rejected': 0,
+                               'completed': 0, 'failed': 0, 'cancelled': 0}
+
+    def start(self):
+        self.ensure_workers(self.num_workers)
+        return self
+
+    def ensure_workers(self, count):
+        """Porte le nombre de threads d'exécution à `count` (ex: un par processus du pool d'inférence)."""
+        with self._lock:
+            self.num_workers = max(self.num_workers, count)
+            while len(self._threads) < self.num_workers:
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job._run()
+            except BaseException as e:
+                # Le thread d'exécution continue: les tâches suivantes ne restent pas en file
+                print(f"[ERREUR] Tâche {job.id} interrompue: {e!r}")
+            finally:
+                with self._lock:
+                    if self._active.get(job.key) is job:
+                        del self._active[job.key]
+                    self.stats_counters[{DONE: 'completed', FAILED: 'failed', CANCELLED: 'cancelled'}[job.state]] += 1
+
+    def _prune(self):
+        """Oublie les tâches terminées trop anciennes ou en surnombre (sous verrou)."""
+        now = time.time()
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        excess = max(0, len(self._jobs) - JOB_HISTORY)
+        for i, job_id in enumerate(finished):
+            if i < excess or now - self._jobs[job_id].finished_at > JOB_TTL:
+                del self._jobs[job_id]
+
+    def submit(self, key, fn, *args, meta=None):
+        """
+        Crée une tâche exécutant fn(job, *args), ou retourne la tâche identique en
+        cours. Retourne (tâche, créée). Lève JobQueueFull si la file est pleine.
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and not existing.cancel_requested:
+                self.stats_counters['deduplicated'] += 1
+                return existing, False
+
+            job = Job(key, fn, args, meta)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.stats_counters['rejected'] += 1
+                raise JobQueueFull("File des tâches pleine, réessayez plus tard") from None
+            self._prune()
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self.stats_counters['submitted'] += 1
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Demande l'annulation; retourne la tâche (None si inconnue)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if self._active.get(job.key) is job:
+                del self._active[job.key] # Une nouvelle demande identique crée une nouvelle tâche
+        if not job.finished:
+            job._request_cancel()
+        return job
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters)
+            states = [job.state for job in self._jobs.values()]
+        stats.update({state: states.count(state) for state in (QUEUED, RUNNING)})
+        stats['queue_size'] = self._queue.maxsize
+        stats['workers'] = len(self._threads)
+        stats['retained'] = len(states)
+        return stats
@@ -0,0 +1,198 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# MOTEUR DE FUSION DES DÉTECTIONS (NMS vectorisé et Weighted Box Fusion)
+# ---------------------------------------------------------
+# Conventions identiques à l'ancien non_maximum_suppression de detector_module:
+# coordonnées pixels inclusives (aire = (x2 - x1 + 1) * (y2 - y1 + 1)) et
+# suppression des boîtes dont l'IoU est strictement supérieur au seuil.
+
+# Nombre de boîtes traitées par bloc: borne la mémoire des matrices d'IoU (bloc x N)
+NMS_BLOCK_SIZE = 256
+# Au-delà de ce nombre de paires candidates (boîtes très larges), le NMS passe en mode dense par blocs
+MAX_CANDIDATE_PAIRS = 5_000_000
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Matrice d'IoU (len(a) x len(b)) entre deux ensembles de boîtes [x1, y1, x2, y2]."""
+    boxes_a = np.asarray(boxes_a)
+    boxes_b = np.asarray(boxes_b)
+    areas_a = (boxes_a[:, 2] - boxes_a[:, 0] + 1) * (boxes_a[:, 3] - boxes_a[:, 1] + 1)
+    areas_b = (boxes_b[:, 2] - boxes_b[:, 0] + 1) * (boxes_b[:, 3] - boxes_b[:, 1] + 1)
+
+    xx1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    yy1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    xx2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    yy2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+
+    w = np.maximum(0.0, xx2 - xx1 + 1)
+    h = np.maximum(0.0, yy2 - yy1 + 1)
+    inter = w * h
+    return inter / (areas_a[:, None] + areas_b[None, :] - inter)
+
+
+def _offset_by_class(boxes, class_ids):
+    """
+    Décale les boîtes de chaque classe dans une zone disjointe (astuce de batched_nms):
+    deux boîtes de classes différentes ne se chevauchent alors jamais.
+    """
+    span = boxes.max() - min(boxes.min(), 0) + 2
+    offsets = np.asarray(class_ids, dtype=boxes.dtype)[:, None] * span
+    return boxes + offsets
+
+
+def _overlap_pairs(boxes, threshold):
+    """
+    Paires (i, j) de boîtes dont l'IoU dépasse le seuil, par balayage sur l'axe x:
+    seules les boîtes dont les intervalles [x1, x2] se recouvrent sont comparées.
+    Retourne None si le nombre de paires candidates dépasse MAX_CANDIDATE_PAIRS.
+    """
+    by_x = np.argsort(boxes[:, 0], kind='stable')
+    x1, y1, x2, y2 = (np.ascontiguousarray(boxes[by_x, k]) for k in range(4))
+    # Pour chaque boîte, les suivantes (dans l'ordre des x1) qui commencent avant sa fin
+    stops = np.searchsorted(x1, x2, side='right')
+    counts = np.maximum(stops - np.arange(len(by_x)) - 1, 0)
+    total = int(counts.sum())
+    if total > MAX_CANDIDATE_PAIRS:
+        return None
+
+    first = np.repeat(np.arange(len(by_x)), counts)
+    # Position de chaque paire dans sa série: 1, 2, ..., counts[i]
+    second = np.arange(total) - np.repeat(np.cumsum(counts) - counts - np.arange(len(by_x)) - 1, counts)
+
+    # Filtre entier bon marché: recouvrement sur l'axe y
+    y_overlap = (np.minimum(y2[first], y2[second]) >= np.maximum(y1[first], y1[second]))
+    first, second = first[y_overlap], second[y_overlap]
+
+    # Même formule que l'ancienne boucle pour l'IoU (résultats identiques)
+    w = np.maximum(0.0, np.minimum(x2[first], x2[second]) - np.maximum(x1[first], x1[second]) + 1)
+    h = np.maximum(0.0, np.minimum(y2[first], y2[second]) - np.maximum(y1[first], y1[second]) + 1)
+    inter = w * h
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    overlapping = inter / (areas[first] + areas[second] - inter) > threshold
+    return by_x[first[overlapping]], by_x[second[overlapping]]
+
+
+def _dense_nms(sorted_boxes, threshold, block_size):
+    """NMS par blocs sur des matrices d'IoU denses (boîtes déjà triées par score)."""
+    n = len(sorted_boxes)
+    suppressed = np.zeros(n, dtype=bool)
+    kept = []
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        # Seules les boîtes encore en lice du bloc sont examinées
+        candidates = np.flatnonzero(~suppressed[start:end]) + start
+        if candidates.size == 0:
+            continue
+
+        # 1. Résolution gloutonne à l'intérieur du bloc (matrice candidats x candidats)
+        block_overlap = iou_matrix(sorted_boxes[candidates], sorted_boxes[candidates]) > threshold
+        alive = np.ones(candidates.size, dtype=bool)
+        for j in range(candidates.size):
+            if alive[j]:
+                alive[j + 1:] &= ~block_overlap[j, j + 1:]
+        kept_block = candidates[alive]
+        kept.append(kept_block)
+
+        # 2. Suppression des boîtes suivantes (encore en lice) par les boîtes conservées du bloc
+        remaining = np.flatnonzero(~suppressed[end:]) + end
+        if remaining.size:
+            rest_overlap = iou_matrix(sorted_boxes[kept_block], sorted_boxes[remaining]) > threshold
+            suppressed[remaining[rest_overlap.any(axis=0)]] = True
+
+    return np.concatenate(kept) if kept else np.zeros(0, dtype=np.int64)
+
+
+def nms(boxes, scores, threshold=0.5, class_ids=None, block_size=NMS_BLOCK_SIZE):
+    """
+    NMS glouton vectorisé. Retourne les indices conservés, par score décroissant.
+
+    Avec class_ids (entiers), la suppression n'a lieu qu'entre boîtes de même classe.
+    Résultat identique à l'ancienne boucle (même ordre de tri, même formule d'IoU).
+    """
+    boxes = np.asarray(boxes)
+    scores = np.asarray(scores)
+    if len(boxes) == 0:
+        return []
+    if class_ids is not None:
+        boxes = _offset_by_class(boxes, class_ids)
+
+    # Tri des détections par score décroissant
+    order = scores.argsort()[::-1]
+    sorted_boxes = boxes[order]
+
+    pairs = _overlap_pairs(sorted_boxes, threshold)
+    if pairs is None:
+        # Scènes très denses (trop de paires candidates): matrices d'IoU par blocs
+        return order[_dense_nms(sorted_boxes, threshold, block_size)].tolist()
+
+    # Graphe de chevauchement orienté du meilleur score (rang le plus petit) vers le moins bon
+    first, second = pairs
+    source = np.minimum(first, second)
+    target = np.maximum(first, second)
+    by_source = np.argsort(source, kind='stable')
+    source, target = source[by_source], target[by_source]
+    bounds = np.searchsorted(source, np.arange(len(order) + 1))
+
+    # Parcours glouton: seules les boîtes ayant des voisins coûtent une opération NumPy
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for rank in range(len(order)):
+        if suppressed[rank]:
+            continue
+        keep.append(rank)
+        lo, hi = bounds[rank], bounds[rank + 1]
+        if hi > lo:
+            suppressed[target[lo:hi]] = True
+
+    return order[keep].tolist()
+
+
+def weighted_box_fusion(boxes, scores, threshold=0.55, class_ids=None):
+    """
+    Weighted Box Fusion: au lieu de supprimer les boîtes redondantes, les fusionne
+    en une boîte moyenne pondérée par les scores.
+
+    Retourne (fused_boxes, fused_scores, clusters) où clusters[k] est la liste des
+    indices d'origine fusionnés dans la boîte k (le premier est le meilleur score).
+    """
+    boxes = np.asarray(boxes, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(boxes) == 0:
+        return np.zeros((0, 4)), np.zeros(0), []
+    if class_ids is None:
+        class_ids = np.zeros(len(boxes), dtype=np.int64)
+    class_ids = np.asarray(class_ids)
+
+    order = np.argsort(-scores, kind='stable')
+    fused_boxes = np.zeros((len(boxes), 4))
+    weighted_sums = np.zeros((len(boxes), 4))
+    score_sums = np.zeros(len(boxes))
+    cluster_classes = np.zeros(len(boxes), dtype=class_ids.dtype)
+    clusters = []
+
+    for i in order:
+        n_clusters = len(clusters)
+        match = -1
+        if n_clusters:
+            # Comparaison vectorisée avec toutes les boîtes fusionnées de la même classe
+            ious = iou_matrix(boxes[i:i + 1], fused_boxes[:n_clusters])[0]
+            ious[cluster_classes[:n_clusters] != class_ids[i]] = -1.0
+            best = int(np.argmax(ious))
+            if ious[best] > threshold:
+                match = best
+
+        if match < 0:
+            match = n_clusters
+            clusters.append([])
+            cluster_classes[match] = class_ids[i]
+
+        clusters[match].append(int(i))
+        weighted_sums[match] += boxes[i] * scores[i]
+        score_sums[match] += scores[i]
+        fused_boxes[match] = weighted_sums[match] / max(score_sums[match], 1e-12)
+
+    n_clusters = len(clusters)
+    fused_scores = np.array([score_sums[k] / len(clusters[k]) for k in range(n_clusters)])
+    return fused_boxes[:n_clusters], fused_scores, clusters
@@ -0,0 +1,105 @@
+import threading
+import time
+
+# ---------------------------------------------------------
+# REGISTRE DES MODÈLES (chargement paresseux / en arrière-plan)
+# ---------------------------------------------------------
+# Chaque modèle est enregistré avec sa fonction de chargement. Le chargement a
+# lieu soit à la première utilisation, soit dans un thread de préchauffage
+# lancé au démarrage du serveur, ce qui permet à Flask de répondre
+# immédiatement pendant que les poids sont chargés.
+
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class _ModelEntry:
+    """État de chargement d'un modèle."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self.done = threading.Event()
+
+
+class ModelRegistry:
+    """Registre thread-safe de modèles chargés à la demande ou en arrière-plan."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """Enregistre un modèle; `loader()` retourne l'objet chargé ou lève une exception."""
+        self._entries[name] = _ModelEntry(name, loader)
+
+    def _load(self, entry):
+        """Charge un modèle (une seule fois, même en cas d'appels concurrents)."""
+        with self._lock:
+            if entry.state != PENDING:
+                return
+            entry.state = LOADING
+
+        start = time.perf_counter()
+        try:
+            entry.value = entry.loader()
+            entry.state = READY
+        except Exception as e:
+            print(f"[ERREUR] Échec du chargement du modèle '{entry.name}': {e}")
+            entry.error = str(e)
+            entry.state = FAILED
+        entry.load_seconds = round(time.perf_counter() - start, 2)
+        entry.done.set()
+
+    def reset(self, name):
+        """Oublie le modèle chargé: il sera rechargé à la prochaine utilisation."""
+        with self._lock:
+            self._entries[name] = _ModelEntry(name, self._entries[name].loader)
+
+    def start_background(self, names=None):
+        """Lance le préchauffage des modèles dans des threads d'arrière-plan (non bloquant)."""
+        for name in names or list(self._entries):
+            entry = self._entries[name]
+            if entry.state == PENDING:
+                threading.Thread(
+                    target=self._load, args=(entry,), name=f"warmup-{name}", daemon=True
+                ).start()
+
+    def get(self, name, wait=True, timeout=None):
+        """
+        Retourne le modèle `name`, ou None s'il a échoué ou n'est pas prêt.
+        Avec wait=True, charge le modèle si nécessaire et attend la fin du chargement.
+        """
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.value
+        if not wait:
+            return None
+
+        if entry.state == PENDING:
+            self._load(entry)
+        entry.done.wait(timeout)
+        return entry.value if entry.state == READY else None
+
+    def is_ready(self, name):
+        return self._entries[name].state == READY
+
+    def any_ready(self):
+        return any(entry.state == READY for entry in self._entries.values())
+
+    def status(self):
+        """État de chaque modèle (pour /api/health)."""
+        return {
+            name: {
+                'state': entry.state,
+                'load_seconds': entry.load_seconds,
+                'error': entry.error
+            }
+            for name, entry in self._entries.items()
+        }
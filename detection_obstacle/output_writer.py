@@ -0,0 +1,184 @@
+import json
+import os
+import queue
+import threading
+
+import cv2
+
+from instrumentation import stage
+
+# ---------------------------------------------------------
+# ÉCRITURE ASYNCHRONE DES SORTIES (images annotées, rapports JSON)
+# ---------------------------------------------------------
+# Les routes de détection construisent la réponse en mémoire et la renvoient
+# immédiatement; l'annotation, l'encodage de l'image et l'écriture du JSON sont
+# confiés à un thread d'écriture alimenté par une file bornée.
+#
+#  - par lots: le thread vide la file (jusqu'à WRITER_BATCH_SIZE tâches) et
+#    synchronise le disque une seule fois par dossier et par lot
+#  - atomique: écriture dans un fichier temporaire, fsync, puis os.replace
+#  - contre-pression: si la file est pleine, la tâche est écrite dans le thread
+#    appelant (aucune sortie n'est perdue)
+
+# Nombre maximal de tâches en attente d'écriture
+WRITER_QUEUE_SIZE = 64
+# Nombre maximal de tâches écrites par lot
+WRITER_BATCH_SIZE = 16
+# Synchronisation disque (fsync) des fichiers écrits
+WRITER_FSYNC = True
+# Qualité JPEG des images annotées
+ANNOTATED_JPEG_QUALITY = 90
+
+
+def encode_image(filename, frame):
+    """Encode l'image au format de `filename` (JPEG qualité ANNOTATED_JPEG_QUALITY ou PNG)."""
+    with stage("encode"):
+        return _encode_image(filename, frame)
+
+
+def _encode_image(filename, frame):
+    if filename.lower().endswith(('.jpg', '.jpeg')):
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, ANNOTATED_JPEG_QUALITY])
+    else:
+        ok, buffer = cv2.imencode(os.path.splitext(filename)[1] or '.png', frame)
+    if not ok:
+        raise ValueError(f"Échec de l'encodage de l'image {filename}")
+    return buffer.tobytes()
+
+
+def _write_atomic(path, data, fsync):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with stage("disk_write"):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return # Windows: pas de fsync de dossier
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class OutputWriter:
+    """Thread d'écriture des sorties de détection, alimenté par une file bornée."""
+
+    def __init__(self, queue_size=WRITER_QUEUE_SIZE, batch_size=WRITER_BATCH_SIZE, fsync=WRITER_FSYNC):
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {} # chemin -> [Event, nb d'écritures en file] (fichiers pas encore écrits)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats_counters = {'written': 0, 'batches': 0, 'inline_writes': 0, 'errors': 0, 'fsync_errors': 0}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="output-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    # --- Soumission ---------------------------------------------------
+
+    def submit(self, path, produce):
+        """
+        Planifie l'écriture de `path`; `produce()` retourne le contenu (bytes) et
+        est appelé dans le thread d'écriture (encodage hors du chemin de la requête).
+        """
+        with self._lock:
+            self._pending.setdefault(path, [threading.Event(), 0])[1] += 1
+        try:
+            self._queue.put_nowait((path, produce))
+        except queue.Full:
+            # Contre-pression: écriture synchrone plutôt que perte de la sortie
+            self._write_batch([(path, produce)])
+            with self._lock:
+                self.stats_counters['inline_writes'] += 1
+
+    def submit_image(self, path, frame, annotate=None):
+        """Écrit l'image (annotée par `annotate(frame)` dans le thread d'écriture si fourni)."""
+        def produce():
+            image = annotate(frame) if annotate else frame
+            return encode_image(path, image)
+        self.submit(path, produce)
+
+    def submit_json(self, path, data):
+        """Écrit `data` en JSON indenté (même format que export_detections_json)."""
+        def produce():
+            with stage("json_export"):
+                return json.dumps(data, indent=2).encode('utf-8')
+        self.submit(path, produce)
+
+    def wait_for(self, path, timeout=None):
+        """Attend que `path` soit écrit s'il est en file; retourne False en cas de délai dépassé."""
+        with self._lock:
+            pending = self._pending.get(path)
+        return pending[0].wait(timeout) if pending is not None else True
+
+    def flush(self, timeout=None):
+        """Attend l'écriture de toutes les tâches en file."""
+        with self._lock:
+            events = [event for event, _ in self._pending.values()]
+        return all(event.wait(timeout) for event in events)
+
+    # --- Thread d'écriture -------------------------------------------
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        directories = set()
+        written = errors = fsync_errors = 0
+        for path, produce in batch:
+            try:
+                _write_atomic(path, produce(), self.fsync)
+                directories.add(os.path.dirname(path))
+                written += 1
+            except Exception as e:
+                print(f"[ERREUR] Écriture de {path}: {e}")
+                errors += 1
+        if self.fsync:
+            # Une synchronisation par dossier et par lot rend les os.replace durables
+            for directory in directories:
+                try:
+                    _fsync_dir(directory)
+                except OSError as e:
+                    # Fichiers écrits mais renommages pas forcément durables: le thread continue
+                    print(f"[ERREUR] Synchronisation du dossier {directory}: {e}")
+                    fsync_errors += 1
+
+        with self._lock:
+            for path, _ in batch:
+                pending = self._pending.get(path)
+                if pending is None:
+                    continue
+                pending[1] -= 1
+                if pending[1] <= 0: # Dernière écriture en file pour ce chemin
+                    del self._pending[path]
+                    pending[0].set()
+            self.stats_counters['written'] += written
+            self.stats_counters['errors'] += errors
+            self.stats_counters['fsync_errors'] += fsync_errors
+            self.stats_counters['batches'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.stats_counters)
+            stats['pending'] = len(self._pending)
+        stats['queued'] = self._queue.qsize()
+        return stats
@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+from detection_set import DetectionSet
+
+# ---------------------------------------------------------
+# EXTRACTION DES RÉGIONS D'OBSTACLES (carte de segmentation -> obstacles)
+# ---------------------------------------------------------
+# Remplace l'ancienne boucle "un masque plein cadre + findContours par classe".
+# La carte de segmentation est parcourue une seule fois via une table de
+# correspondance (LUT) classe -> obstacle ; seules les classes présentes sont
+# ensuite analysées, uniquement dans leur boîte englobante, et les petits
+# fragments sont écartés par un filtre vectorisé avant tout calcul d'aire.
+
+# Confiance arbitrairement haute pour la segmentation (identique à l'ancienne boucle)
+SEGMENTATION_CONFIDENCE = 0.95
+
+
+def build_obstacle_lut(id2label, obstacles_config):
+    """
+    Construit la table de correspondance ID de classe -> index d'obstacle.
+
+    L'index 0 est réservé aux classes ignorées. Les index suivent l'ordre de
+    parcours de id2label, ce qui conserve l'ordre de sortie de l'ancienne boucle.
+    Retourne (lut, slots) où slots[i - 1] = (class_name, info) pour l'index i.
+    """
+    max_id = max((int(class_id) for class_id in id2label), default=0)
+    lut = np.zeros(max_id + 1, dtype=np.uint8)
+    slots = []
+    for class_id, class_name in id2label.items():
+        if class_name in obstacles_config:
+            slots.append((class_name, obstacles_config[class_name]))
+            lut[int(class_id)] = len(slots)
+
+    return lut, slots
+
+
+def _contour_boxes(contours):
+    """Calcule (vectorisé) les boîtes (x, y, w, h) de tous les contours en un seul appel NumPy."""
+    lengths = np.fromiter((len(cnt) for cnt in contours), dtype=np.int64, count=len(contours))
+    points = np.concatenate(contours).reshape(-1, 2)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    mins = np.minimum.reduceat(points, starts, axis=0)
+    maxs = np.maximum.reduceat(points, starts, axis=0)
+    return mins[:, 0], mins[:, 1], maxs[:, 0] - mins[:, 0] + 1, maxs[:, 1] - mins[:, 1] + 1
+
+
+def extract_obstacle_regions(seg_map, id2label, obstacles_config, min_area_threshold):
+    """
+    Extrait les obstacles d'une carte de segmentation en une seule passe.
+
+    Retourne un DetectionSet contenant exactement les mêmes obstacles (et dans le
+    même ordre) que l'ancienne boucle par classe basée sur cv2.findContours / cv2.contourArea.
+    """
+    lut, slots = build_obstacle_lut(id2label, obstacles_config)
+    if not slots:
+        return DetectionSet()
+
+    # 1. Passe unique : ID de classe -> index d'obstacle (0 = ignoré)
+    seg_map = np.asarray(seg_map)
+    if seg_map.size and int(seg_map.max()) >= lut.size:
+        # Les IDs absents de id2label sont ignorés
+        lut = np.concatenate([lut, np.zeros(int(seg_map.max()) + 1 - lut.size, dtype=np.uint8)])
+    obstacle_map = lut[seg_map]
+
+    # 2. Histogramme des index : les classes absentes de l'image ne coûtent plus rien
+    counts = cv2.calcHist([obstacle_map], [0], None, [len(slots) + 1], [0, len(slots) + 1]).ravel()
+
+    height, width = obstacle_map.shape
+    boxes, names, priorities, colors = [], [], [], []
+    for slot in np.flatnonzero(counts[1:]) + 1:
+        class_name, info = slots[slot - 1]
+        min_area = min_area_threshold[info['priority']]
+
+        # Recadrage sur la boîte de la classe, avec une marge d'un pixel :
+        # les contours obtenus sont identiques à ceux calculés sur le plein cadre
+        mask = (obstacle_map == slot).view(np.uint8)
+        bx, by, bw, bh = cv2.boundingRect(mask)
+        ox, oy = max(bx - 1, 0), max(by - 1, 0)
+        crop = mask[oy:min(by + bh + 1, height), ox:min(bx + bw + 1, width)]
+        contours, _ = cv2.findContours(crop, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            continue
+
+        # 3. Statistiques vectorisées : l'aire d'un contour ne dépasse jamais (w - 1) * (h - 1),
+        # ce qui élimine les fragments sans appeler cv2.contourArea
+        xs, ys, ws, hs = _contour_boxes(contours)
+        candidates = np.flatnonzero((ws - 1) * (hs - 1) > min_area)
+
+        for i in candidates:
+            area = cv2.contourArea(contours[i])
+
+            # POINT DE DÉTECTION CONCRET MAPILLARY: Filtrage par aire minimale
+            if area > min_area:
+                x, y = int(xs[i]) + ox, int(ys[i]) + oy
+                boxes.append((x, y, x + int(ws[i]), y + int(hs[i])))
+                names.append(class_name)
+                priorities.append(info['priority'])
+                colors.append(info['color'])
+
+    return DetectionSet.from_columns(
+        boxes, np.full(len(boxes), SEGMENTATION_CONFIDENCE), names, priorities, 'mapillary', colors
+    )
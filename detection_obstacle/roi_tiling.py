@@ -0,0 +1,116 @@
+import numpy as np
+
+# ---------------------------------------------------------
+# RÉGION D'INTÉRÊT (ROI) ET TUILAGE
+# ---------------------------------------------------------
+# Le résultat ne sert qu'à avertir un piéton: le ciel et les façades au-dessus
+# de l'horizon n'apportent rien. Avant chaque modèle, l'image peut être:
+#  - recadrée sous l'horizon ("horizon": on retire une bande en haut);
+#  - limitée à la bande basse ("lower_band", segmentation: sol, trottoirs,
+#    bordures, plaques d'égout);
+#  - découpée en tuiles chevauchantes pour les très grandes images, afin que
+#    les petits obstacles (bordures, plaques) ne disparaissent pas lorsque le
+#    modèle réduit l'image à sa résolution d'entrée.
+#
+# Les détections sont ramenées en coordonnées plein cadre. Pour YOLO, les
+# doublons entre tuiles sont supprimés (intersection / plus petite aire, même
+# classe). Pour la segmentation, les cartes des tuiles sont recollées avant
+# l'extraction des régions: un obstacle à cheval sur deux tuiles reste une seule région.
+
+ROI_MODES = ("full", "horizon", "lower_band")
+
+
+def roi_bounds(frame_shape, mode, horizon_ratio, lower_band_ratio):
+    """Rectangle (x0, y0, x1, y1) traité par le modèle pour ce mode de ROI."""
+    height, width = frame_shape[:2]
+    if mode == "horizon":
+        top = int(round(height * horizon_ratio))
+    elif mode == "lower_band":
+        top = int(round(height * (1.0 - lower_band_ratio)))
+    elif mode == "full":
+        top = 0
+    else:
+        raise ValueError(f"Mode de ROI inconnu: {mode} (attendu: {', '.join(ROI_MODES)})")
+    return 0, min(max(0, top), height - 1), width, height
+
+
+def axis_tiles(length, tile_size, overlap):
+    """
+    Découpe un axe en tuiles chevauchantes, la dernière alignée sur le bord.
+    Retourne [(début, fin, début_cœur, fin_cœur)]: les cœurs partitionnent l'axe
+    (frontière au milieu de chaque chevauchement) et servent au recollage.
+    """
+    if length <= tile_size:
+        return [(0, length, 0, length)]
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    starts = list(range(0, length - tile_size, stride)) + [length - tile_size]
+    tiles = []
+    for i, start in enumerate(starts):
+        end = start + tile_size
+        core_start = 0 if i == 0 else (start + starts[i - 1] + tile_size) // 2
+        core_end = length if i == len(starts) - 1 else (starts[i + 1] + end) // 2
+        tiles.append((start, end, core_start, core_end))
+    return tiles
+
+
+def tile_grid(bounds, tile_size, overlap):
+    """
+    Tuiles couvrant `bounds` = (x0, y0, x1, y1), en coordonnées plein cadre.
+    Chaque tuile: {'box': (x0, y0, x1, y1), 'core': (x0, y0, x1, y1)}.
+    """
+    bx0, by0, bx1, by1 = bounds
+    tiles = []
+    for ys, ye, cys, cye in axis_tiles(by1 - by0, tile_size, overlap):
+        for xs, xe, cxs, cxe in axis_tiles(bx1 - bx0, tile_size, overlap):
+            tiles.append({
+                'box': (bx0 + xs, by0 + ys, bx0 + xe, by0 + ye),
+                'core': (bx0 + cxs, by0 + cys, bx0 + cxe, by0 + cye)
+            })
+    return tiles
+
+
+def dedupe_tile_detections(obstacles, ios_threshold):
+    """
+    Supprime les doublons entre tuiles: une boîte est retirée si une boîte de même
+    classe et de meilleur score en recouvre au moins `ios_threshold` de sa surface
+    (intersection / plus petite aire: une boîte tronquée au bord d'une tuile est
+    bien reconnue comme doublon de la boîte entière de la tuile voisine).
+    Prend et retourne un DetectionSet (ordre d'origine conservé).
+    """
+    if len(obstacles) < 2:
+        return obstacles
+    order = np.argsort(-obstacles.merge_scores(), kind="stable")
+    boxes = obstacles.boxes.astype(np.float64)
+    areas = np.maximum(0, boxes[:, 2] - boxes[:, 0]) * np.maximum(0, boxes[:, 3] - boxes[:, 1])
+    classes = obstacles.class_ids
+
+    kept = []
+    for i in order:
+        if kept:
+            k = np.array(kept)
+            same = classes[k] == classes[i]
+            if same.any():
+                k = k[same]
+                iw = np.minimum(boxes[k, 2], boxes[i, 2]) - np.maximum(boxes[k, 0], boxes[i, 0])
+                ih = np.minimum(boxes[k, 3], boxes[i, 3]) - np.maximum(boxes[k, 1], boxes[i, 1])
+                inter = np.maximum(0, iw) * np.maximum(0, ih)
+                smaller = np.maximum(np.minimum(areas[k], areas[i]), 1e-9)
+                if (inter / smaller >= ios_threshold).any():
+                    continue
+        kept.append(i)
+    return obstacles.take(sorted(kept))
+
+
+def stitch_seg_maps(tiles, seg_maps, bounds):
+    """
+    Recolle les cartes de segmentation des tuiles (chacune à la taille de sa tuile)
+    en une carte couvrant `bounds`; chaque tuile n'écrit que son cœur.
+    """
+    bx0, by0, bx1, by1 = bounds
+    dtype = np.result_type(*[np.asarray(m).dtype for m in seg_maps])
+    canvas = np.zeros((by1 - by0, bx1 - bx0), dtype=dtype)
+    for tile, seg_map in zip(tiles, seg_maps):
+        tx0, ty0, _, _ = tile['box']
+        cx0, cy0, cx1, cy1 = tile['core']
+        canvas[cy0 - by0:cy1 - by0, cx0 - bx0:cx1 - bx0] = seg_map[cy0 - ty0:cy1 - ty0, cx0 - tx0:cx1 - tx0]
+    return canvas
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# ---------------------------------------------------------
+# STOCKAGE PERSISTANT DES CARTES DE SEGMENTATION (Mask2Former)
+# ---------------------------------------------------------
+# Seule l'extraction des régions (contours, seuils d'aire, classes retenues)
+# dépend de MAPILLARY_OBSTACLES et MIN_AREA_THRESHOLD; la carte de segmentation
+# brute ne dépend que de l'image et du modèle. Elle est donc conservée sur disque
+# (un .npy compact en uint8 par image) et relue en memmap:
+#  - une détection sur une image déjà segmentée saute le passage Mask2Former;
+#  - le mode "re-seuillage" (batch_runner.py --rethreshold) reconstruit les
+#    obstacles de tout un jeu de données sans aucun modèle.
+#
+# Organisation: <racine>/<id du modèle>/<hash[:2]>/<hash>_<H>x<W>.npy
+# où H x W est la taille de l'image d'origine (la carte peut être plus petite,
+# profil "fast"), nécessaire pour remettre les boîtes à l'échelle.
+#
+# Taille bornée (max_disk_bytes): au-delà, les cartes les moins récemment
+# utilisées sont supprimées (labels.json et les autres fichiers sont conservés).
+
+
+def _compact(seg_map):
+    """Type entier le plus petit pouvant contenir les identifiants de classe."""
+    seg_map = np.asarray(seg_map)
+    max_id = int(seg_map.max()) if seg_map.size else 0
+    dtype = np.uint8 if max_id < 2 ** 8 else np.uint16
+    return np.ascontiguousarray(seg_map, dtype=dtype)
+
+
+class SegMapStore:
+    """Cartes de segmentation par (modèle, hash d'image), écrites une fois et relues en memmap."""
+
+    def __init__(self, root, max_disk_bytes=None):
+        self.root = root
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._labels = {}
+        self._disk_bytes = None # Taille totale des cartes, calculée au premier enregistrement
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'disk_evictions': 0}
+
+    def path(self, model_id, frame_hash, frame_shape):
+        height, width = frame_shape[:2]
+        return os.path.join(self.root, model_id, frame_hash[:2], f"{frame_hash}_{height}x{width}.npy")
+
+    def get(self, model_id, frame_hash, frame_shape):
+        """Carte stockée (memmap en lecture seule) ou None."""
+        path = self.path(model_id, frame_hash, frame_shape)
+        try:
+            seg_map = np.load(path, mmap_mode='r')
+            # Mise à jour de la date d'accès: l'éviction suit l'ordre LRU
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            seg_map = None
+        with self._lock:
+            self.stats['hits' if seg_map is not None else 'misses'] += 1
+        return seg_map
+
+    def put(self, model_id, frame_hash, frame_shape, seg_map):
+        """Enregistre la carte (écriture atomique); sans effet si elle existe déjà."""
+        path = self.path(model_id, frame_hash, frame_shape)
+        if os.path.exists(path):
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, _compact(seg_map))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats['writes'] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += os.path.getsize(path)
+        self._evict_disk()
+        return path
+
+    def _map_files(self):
+        """(date de modification, taille, chemin) de toutes les cartes stockées."""
+        files = []
+        for model_dir in os.scandir(self.root):
+            if not model_dir.is_dir():
+                continue
+            for prefix_dir in os.scandir(model_dir.path):
+                if not prefix_dir.is_dir():
+                    continue
+                for entry in os.scandir(prefix_dir.path):
+                    if entry.is_file() and entry.name.endswith('.npy'):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict_disk(self):
+        """Supprime les cartes les plus anciennes tant que la taille totale dépasse la borne."""
+        if self.max_disk_bytes is None:
+            return
+        with self._lock:
+            # Parcours complet seulement au premier appel et quand la borne est dépassée
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes:
+                return
+            files = self._map_files()
+            total = sum(size for _, size, _ in files)
+            if total > self.max_disk_bytes:
+                files.sort()
+                for _, size, path in files:
+                    if total <= self.max_disk_bytes:
+                        break
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    self.stats['disk_evictions'] += 1
+            self._disk_bytes = total
+
+    def save_labels(self, model_id, id2label):
+        """Enregistre id2label du modèle (nécessaire pour relire les cartes sans le modèle)."""
+        path = os.path.join(self.root, model_id, "labels.json")
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(class_id): label for class_id, label in id2label.items()}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load_labels(self, model_id):
+        """id2label enregistré pour ce modèle (clés entières), ou None."""
+        if model_id in self._labels:
+            return self._labels[model_id]
+        path = os.path.join(self.root, model_id, "labels.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                labels = {int(class_id): label for class_id, label in json.load(f).items()}
+        except FileNotFoundError:
+            return None
+        self._labels[model_id] = labels
+        return labels
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,98 @@
+"""
+Tests de l'API et des modules sans poids de modèles: les modèles factices de
+benchmarks/bench_stages.py remplacent YOLO et Mask2Former.
+
+Lancement (depuis detection_obstacle/):
+    python -m pytest -q tests
+"""
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_stages # noqa: E402
+
+bench_stages.install_stub_models()
+
+import detector_module as dm # noqa: E402
+from detection_cache import DetectionCache # noqa: E402
+from inference_pool import PoolBusy # noqa: E402
+from seg_map_store import SegMapStore # noqa: E402
+
+
+class BoundedPool:
+    """
+    Pool d'inférence synchrone (dans ce processus) avec la même file bornée que
+    InferencePool: une tâche déposée alors que queue_size tâches attendent lève PoolBusy.
+    """
+
+    def __init__(self, num_workers=2, queue_size=16):
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.handlers = {
+            'detect': dm.detect_obstacles_combined,
+            'transient': dm.detect_obstacles_transient,
+            'batch': dm.detect_obstacles_batch,
+            'yolo': dm.detect_obstacles_yolo,
+            'mapillary': dm.detect_obstacles_mapillary,
+            'cascade': lambda payload: dm.cascade_segmentation(*payload),
+        }
+        self.jobs = [] # (kind, payload) de chaque tâche déposée
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def submit(self, payload, kind='detect', timeout=None):
+        if self.in_flight >= self.queue_size:
+            raise PoolBusy("File de détection pleine, réessayez plus tard")
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.jobs.append((kind, payload))
+        future = Future()
+        future.set_result(self.handlers[kind](payload))
+        return future
+
+    def wait(self, future, timeout=None):
+        self.in_flight -= 1
+        return future.result()
+
+    def detect(self, frame, timeout=None, kind='detect'):
+        return self.wait(self.submit(frame, kind=kind))
+
+    def stats(self):
+        return {'workers': self.num_workers, 'workers_ready': self.num_workers}
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    """Cache de détection et cartes de segmentation dans un dossier temporaire."""
+    import app
+    cache = DetectionCache(str(tmp_path / "cache"))
+    monkeypatch.setattr(dm, "detection_cache", cache)
+    monkeypatch.setattr(app, "detection_cache", cache)
+    monkeypatch.setattr(dm, "seg_map_store", SegMapStore(str(tmp_path / "seg_maps")))
+    return cache
+
+
+@pytest.fixture
+def client(stores):
+    import app
+    return app.app.test_client()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Mode production: détections confiées à un BoundedPool."""
+    import app
+    bounded = BoundedPool()
+    monkeypatch.setattr(app, "inference_pool", bounded)
+    return bounded
+
+
+@pytest.fixture
+def image_names():
+    return sorted(f for f in os.listdir(dm.IMAGES_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png')))
@@ -0,0 +1,30 @@
+from conftest import dm
+
+
+def test_batch_larger_than_pool_queue(client, pool, image_names):
+    """Plus d'images que la file du pool: tâches 'batch' de batch_size images, jamais de PoolBusy."""
+    filenames = (image_names * 2)[:pool.queue_size + 7]
+    response = client.post('/api/detect_batch?image=base64&persist=0',
+                           json={'filenames': filenames, 'batch_size': 4})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [result['image'] for result in body['results']] == [f"annotated_{name}" for name in filenames]
+    assert body['errors'] == {}
+    assert {kind for kind, _ in pool.jobs} == {'batch'}
+    assert [len(frames) for _, frames in pool.jobs] == [4] * 5 + [3]
+    assert pool.max_in_flight < pool.queue_size
+
+
+def test_batch_pool_matches_in_process(client, pool, image_names, monkeypatch):
+    """Les lots confiés au pool donnent les mêmes obstacles que detect_obstacles_batch dans ce processus."""
+    import app
+    filenames = image_names[:6]
+    pooled = client.post('/api/detect_batch?image=base64&persist=0', json={'filenames': filenames, 'batch_size': 4})
+    monkeypatch.setattr(app, "inference_pool", None)
+    dm.detection_cache.clear()
+    local = client.post('/api/detect_batch?image=base64&persist=0', json={'filenames': filenames, 'batch_size': 4})
+
+    def obstacles(response):
+        return [result['detections'] for result in response.get_json()['results']]
+    assert obstacles(pooled) == obstacles(local)
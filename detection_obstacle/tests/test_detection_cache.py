@@ -0,0 +1,51 @@
+import os
+
+import detection_cache
+from detection_cache import DetectionCache
+
+OBSTACLES = [{'bbox': [0, 0, 10, 10], 'class': 'Curb', 'confidence': 0.95, 'priority': 1,
+              'source': 'mapillary', 'color': [0, 0, 255]}]
+
+
+def entry_size(tmp_path):
+    probe = DetectionCache(str(tmp_path / "probe"))
+    probe.put("probe", OBSTACLES)
+    return os.path.getsize(os.path.join(probe.cache_dir, "probe.json"))
+
+
+def disk_keys(cache):
+    return sorted(name[:-len('.json')] for name in os.listdir(cache.cache_dir) if name.endswith('.json'))
+
+
+def test_disk_eviction_is_lru_without_rescanning(tmp_path, monkeypatch):
+    """Éviction des moins récemment utilisés; le dossier n'est parcouru qu'à la création du cache."""
+    size = entry_size(tmp_path)
+    cache = DetectionCache(str(tmp_path / "cache"), max_memory_entries=1, max_disk_bytes=3 * size)
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(detection_cache.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+
+    for key in ("a", "b", "c"):
+        cache.put(key, OBSTACLES)
+    cache.put("other", OBSTACLES)
+    assert disk_keys(cache) == ["b", "c", "other"]
+
+    # Mémoire bornée à une entrée: "b" est relu depuis le disque et devient le plus récemment utilisé
+    assert cache.get("b") is not None
+    cache.put("d", OBSTACLES)
+    assert disk_keys(cache) == ["b", "d", "other"]
+    assert cache.get_stats()['disk_evictions'] == 2
+    assert scans == []
+
+
+def test_index_loaded_from_existing_files(tmp_path):
+    """Un cache recréé sur un dossier existant reprend sa taille et son ordre d'utilisation."""
+    size = entry_size(tmp_path)
+    first = DetectionCache(str(tmp_path / "cache"), max_disk_bytes=10 * size)
+    for key in ("a", "b"):
+        first.put(key, OBSTACLES)
+    os.utime(os.path.join(first.cache_dir, "a.json"), (1, 1)) # "a" plus ancien
+
+    second = DetectionCache(str(tmp_path / "cache"), max_disk_bytes=2 * size)
+    second.put("c", OBSTACLES)
+    assert disk_keys(second) == ["b", "c"]
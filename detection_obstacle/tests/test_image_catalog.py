@@ -0,0 +1,34 @@
+import os
+import shutil
+import threading
+
+import image_catalog
+from image_catalog import ImageCatalog
+
+from conftest import dm
+
+
+def test_start_does_not_wait_for_the_first_scan(tmp_path, monkeypatch, image_names):
+    """start() rend la main aussitôt; /api/images signale "scanning" jusqu'à la fin du premier parcours."""
+    images_dir = tmp_path / "images"
+    images_dir.mkdir()
+    for name in image_names[:3]:
+        shutil.copy(os.path.join(dm.IMAGES_DIR, name), images_dir)
+    release = threading.Event()
+    read_dimensions = image_catalog._read_dimensions
+
+    def slow_read_dimensions(path):
+        release.wait(10)
+        return read_dimensions(path)
+    monkeypatch.setattr(image_catalog, "_read_dimensions", slow_read_dimensions)
+
+    catalog = ImageCatalog(str(images_dir), str(tmp_path / "catalog")).start()
+    page = catalog.query()
+    assert page['indexing']['scanning'] is True
+    assert page['total'] == 0
+
+    release.set()
+    assert catalog.wait_scanned(10)
+    page = catalog.query()
+    assert page['indexing']['scanning'] is False
+    assert sorted(item['name'] for item in page['items']) == sorted(image_names[:3])
@@ -0,0 +1,31 @@
+import os
+import time
+
+import cv2
+
+from conftest import dm
+
+
+def wait_for_hashes(client, timeout=30):
+    """Attend que le catalogue ait calculé le hash des pixels de toutes les images."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = client.get('/api/images/stats').get_json()
+        if not stats['scanning'] and stats['pending_hashes'] == 0:
+            return
+        time.sleep(0.05)
+    raise AssertionError("Hash des images toujours en attente")
+
+
+def test_cached_flag_without_models_in_process(client, image_names, monkeypatch):
+    """Le processus HTTP sans modèles (pool, préchauffage) voit les résultats écrits avec les deux modèles."""
+    name = image_names[0]
+    dm.detect_obstacles_combined(cv2.imread(os.path.join(dm.IMAGES_DIR, name)))
+    wait_for_hashes(client)
+
+    monkeypatch.setattr(dm, "yolo", None)
+    monkeypatch.setattr(dm, "mapillary_model", None)
+    cached = client.get('/api/images?cached=1').get_json()
+    assert [item['name'] for item in cached['items']] == [name]
+    page = client.get(f'/api/images?limit={len(image_names)}').get_json()
+    assert {item['name'] for item in page['items'] if item['cached']} == {name}
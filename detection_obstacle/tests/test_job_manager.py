@@ -0,0 +1,30 @@
+import time
+
+from job_manager import JobManager
+
+
+class Interrupted(BaseException):
+    """Exception hors de la hiérarchie Exception (comme SystemExit ou KeyboardInterrupt)."""
+
+
+def wait_finished(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job.finished
+
+
+def test_worker_survives_base_exception():
+    """Une tâche sortie par une BaseException échoue; la tâche suivante est quand même exécutée."""
+    jobs = JobManager(num_workers=1).start()
+
+    def interrupted(job):
+        raise Interrupted("arrêt")
+
+    failed, _ = jobs.submit('interrupted', interrupted)
+    done, _ = jobs.submit('next', lambda job: {'ok': True})
+
+    assert wait_finished(failed) and failed.state == 'failed'
+    assert wait_finished(done) and done.state == 'done' and done.result == {'ok': True}
+    stats = jobs.stats()
+    assert stats['failed'] == 1 and stats['completed'] == 1
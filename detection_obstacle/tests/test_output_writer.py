@@ -0,0 +1,19 @@
+import output_writer
+from output_writer import OutputWriter
+
+
+def test_directory_fsync_error_does_not_stop_the_writer(tmp_path, monkeypatch):
+    """Une erreur de synchronisation du dossier est comptée; les écritures suivantes continuent."""
+    def failing_fsync_dir(directory):
+        raise OSError("fsync impossible")
+    monkeypatch.setattr(output_writer, "_fsync_dir", failing_fsync_dir)
+
+    writer = OutputWriter(batch_size=1, fsync=True).start()
+    for name in ("a.json", "b.json"):
+        writer.submit(str(tmp_path / name), lambda: b"{}")
+        assert writer.flush(timeout=10)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json", "b.json"]
+    stats = writer.stats()
+    assert stats['written'] == 2 and stats['fsync_errors'] == 2
+    assert writer._thread.is_alive()
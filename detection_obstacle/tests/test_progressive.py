@@ -0,0 +1,31 @@
+import os
+
+import cv2
+
+from conftest import dm
+
+
+def test_pool_progressive_detection_uses_the_cache(stores, pool, image_names):
+    """Tâches du viewer en mode pool: une image déjà détectée ne relance aucun modèle."""
+    import app
+    frame = cv2.imread(os.path.join(dm.IMAGES_DIR, image_names[0]))
+    partials = []
+
+    first = app.detect_frame_progressive(frame, partials.append)
+    assert [kind for kind, _ in pool.jobs] == ['yolo', 'mapillary']
+    assert len(partials) == 1
+
+    second = app.detect_frame_progressive(frame, partials.append)
+    assert len(pool.jobs) == 2 and len(partials) == 1
+    assert second.to_obstacles() == first.to_obstacles()
+
+
+def test_pool_progressive_detection_reads_detect_jobs(stores, pool, image_names):
+    """Un résultat écrit par une tâche 'detect' d'un processus d'inférence sert aussi le viewer."""
+    import app
+    frame = cv2.imread(os.path.join(dm.IMAGES_DIR, image_names[1]))
+    expected = app.detect_frame(frame)
+
+    result = app.detect_frame_progressive(frame, lambda obstacles: None)
+    assert [kind for kind, _ in pool.jobs] == ['detect']
+    assert result.to_obstacles() == expected.to_obstacles()
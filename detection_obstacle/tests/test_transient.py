@@ -0,0 +1,30 @@
+import os
+
+import cv2
+
+from conftest import dm
+
+
+def test_transient_detection_leaves_stores_untouched(stores, image_names):
+    """Une image envoyée ou de flux n'écrit ni dans le cache de détection ni dans les cartes stockées."""
+    frame = cv2.imread(os.path.join(dm.IMAGES_DIR, image_names[0]))
+    before = sorted(os.listdir(stores.cache_dir))
+
+    obstacles = dm.detect_obstacles_transient(frame)
+
+    assert sorted(os.listdir(stores.cache_dir)) == before
+    assert stores.get_stats()['misses'] == 0 and stores.get_stats()['memory_entries'] == 0
+    assert not os.path.exists(dm.seg_map_store.root)
+    assert obstacles.to_obstacles() == dm.detect_obstacles_combined(frame).to_obstacles()
+
+
+def test_upload_routes_skip_the_cache(client, stores, image_names):
+    """/api/detect et /api/detect_stream: aucun fichier écrit dans le cache."""
+    with open(os.path.join(dm.IMAGES_DIR, image_names[0]), 'rb') as f:
+        data = f.read()
+
+    assert client.post('/api/detect', data=data).status_code == 200
+    body = len(data).to_bytes(4, 'big') + data + (0).to_bytes(4, 'big')
+    response = client.post('/api/detect_stream', data=body)
+    assert response.status_code == 200 and b'"error"' not in response.data
+    assert os.listdir(stores.cache_dir) == []
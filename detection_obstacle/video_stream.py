@@ -0,0 +1,257 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from detector_module import (
+    detect_obstacles_yolo, detect_obstacles_mapillary, merge_detections, annotate_frame, transient_frames
+)
+from instrumentation import submit_in_context
+
+# ---------------------------------------------------------
+# PIPELINE DE DÉTECTION EN FLUX (vidéo / webcam)
+# ---------------------------------------------------------
+# Trois étages reliés par des files bornées:
+#   capture (cv2.VideoCapture) -> inférence -> annotation + encodage JPEG
+# YOLO tourne sur chaque image; Mask2Former (lourd) ne tourne que toutes les
+# SEGMENTATION_INTERVAL images ou lors d'un changement de scène, dans un thread
+# séparé. Entre deux segmentations, les obstacles Mapillary sont reportés.
+
+STREAM_QUEUE_SIZE = 4 # Taille des files entre les étages
+SEGMENTATION_INTERVAL = 10 # Mask2Former toutes les N images
+SCENE_CHANGE_THRESHOLD = 12.0 # Écart moyen (niveaux de gris) déclenchant une nouvelle segmentation
+STREAM_JPEG_QUALITY = 80
+STATS_WINDOW = 100 # Nombre d'images utilisées pour le calcul des FPS et de la latence
+
+# Marqueur de fin de flux dans les files
+_END = object()
+
+
+def _scene_signature(frame):
+    """Miniature en niveaux de gris utilisée pour détecter les changements de scène."""
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+def read_frames(source, frame_stride=1):
+    """Générateur d'images depuis une vidéo (chemin) ou une webcam (index entier)."""
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise IOError(f"Impossible d'ouvrir la source vidéo: {source}")
+    try:
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if index % frame_stride == 0:
+                yield frame
+            index += 1
+    finally:
+        capture.release()
+
+
+class StreamPipeline:
+    """Pipeline capture -> inférence -> encodage, avec statistiques de FPS et de latence."""
+
+    def __init__(self, source, segmentation_interval=SEGMENTATION_INTERVAL,
+                 scene_change_threshold=SCENE_CHANGE_THRESHOLD, frame_stride=1,
+                 queue_size=STREAM_QUEUE_SIZE, jpeg_quality=STREAM_JPEG_QUALITY):
+        self.source = source
+        self.segmentation_interval = max(1, int(segmentation_interval))
+        self.scene_change_threshold = scene_change_threshold
+        self.frame_stride = max(1, int(frame_stride))
+        self.jpeg_quality = jpeg_quality
+        # Source en direct (webcam): on privilégie la latence en jetant les images en retard
+        self.live = isinstance(source, int)
+
+        self._captured = queue.Queue(maxsize=queue_size)
+        self._inferred = queue.Queue(maxsize=queue_size)
+        self._encoded = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._threads = []
+        self._segmenter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-seg")
+        self._error = None
+
+        self._lock = threading.Lock()
+        self._done_times = deque(maxlen=STATS_WINDOW)
+        self._latencies = deque(maxlen=STATS_WINDOW)
+        self._counters = {'captured': 0, 'dropped': 0, 'processed': 0, 'segmentations': 0,
+                          'segmentation_errors': 0}
+
+    # --- Étages -------------------------------------------------------
+
+    def _put(self, q, item):
+        """Ajoute dans une file bornée en restant interruptible par stop()."""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Lit dans une file en restant interruptible par stop() (retourne _END à l'arrêt)."""
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _capture_stage(self):
+        try:
+            for frame in read_frames(self.source, self.frame_stride):
+                if self._stop.is_set():
+                    break
+                item = (time.perf_counter(), frame)
+                self._counters['captured'] += 1
+                if self.live and self._captured.full():
+                    # Saut d'image: on remplace la plus ancienne image en attente
+                    try:
+                        self._captured.get_nowait()
+                        self._counters['dropped'] += 1
+                    except queue.Empty:
+                        pass
+                if not self._put(self._captured, item):
+                    break
+        except Exception as e:
+            print(f"[ERREUR] Capture vidéo: {e}")
+            self._error = str(e)
+        finally:
+            self._put(self._captured, _END)
+
+    def _inference_stage(self):
+        carried_obstacles = [] # Obstacles Mapillary reportés entre deux segmentations
+        pending_segmentation = None
+        last_signature = None
+        frames_since_segmentation = self.segmentation_interval
+        try:
+            while True:
+                item = self._get(self._captured)
+                if item is _END:
+                    break
+                captured_at, frame = item
+
+                # 1. Récupération d'une segmentation terminée (non bloquant)
+                if pending_segmentation is not None and pending_segmentation.done():
+                    try:
+                        carried_obstacles = pending_segmentation.result()
+                    except Exception as e:
+                        # Une segmentation en échec n'arrête pas le flux: les obstacles précédents restent reportés
+                        print(f"[WARN] Segmentation vidéo en échec: {e}")
+                        self._counters['segmentation_errors'] += 1
+                    pending_segmentation = None
+
+                # 2. Décision: nouvelle segmentation (intervalle atteint ou changement de scène)
+                signature = _scene_signature(frame)
+                scene_changed = (
+                    last_signature is not None
+                    and float(np.mean(np.abs(signature - last_signature))) > self.scene_change_threshold
+                )
+                if pending_segmentation is None and (
+                    frames_since_segmentation >= self.segmentation_interval or scene_changed
+                ):
+                    # Images du flux: cartes de segmentation non stockées (contexte suivi dans le thread)
+                    with transient_frames():
+                        pending_segmentation = submit_in_context(self._segmenter, detect_obstacles_mapillary, frame)
+                    last_signature = signature
+                    frames_since_segmentation = 0
+                    self._counters['segmentations'] += 1
+                frames_since_segmentation += 1
+
+                # 3. YOLO sur chaque image, fusion avec les obstacles reportés
+                obstacles = merge_detections(detect_obstacles_yolo(frame), carried_obstacles)
+                if not self._put(self._inferred, (captured_at, frame, obstacles)):
+                    break
+        except Exception as e:
+            print(f"[ERREUR] Inférence vidéo: {e}")
+            self._error = str(e)
+        finally:
+            self._put(self._inferred, _END)
+
+    def _encode_stage(self):
+        # Tampon d'annotation réutilisé d'une image à l'autre (l'image capturée peut
+        # encore être lue par la segmentation en arrière-plan: pas de dessin sur place)
+        buffer = None
+        try:
+            while True:
+                item = self._get(self._inferred)
+                if item is _END:
+                    break
+                captured_at, frame, obstacles = item
+                if buffer is None or buffer.shape != frame.shape:
+                    buffer = np.empty_like(frame)
+                annotated = annotate_frame(frame, obstacles, out=buffer)
+                ok, jpeg = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if not ok:
+                    continue
+
+                done_at = time.perf_counter()
+                with self._lock:
+                    self._done_times.append(done_at)
+                    self._latencies.append(done_at - captured_at)
+                    self._counters['processed'] += 1
+                if not self._put(self._encoded, (jpeg.tobytes(), obstacles)):
+                    break
+        except Exception as e:
+            print(f"[ERREUR] Encodage vidéo: {e}")
+            self._error = str(e)
+        finally:
+            self._put(self._encoded, _END)
+
+    # --- Contrôle -----------------------------------------------------
+
+    def start(self):
+        """Démarre les trois étages dans des threads dédiés."""
+        for target, name in ((self._capture_stage, "stream-capture"),
+                             (self._inference_stage, "stream-inference"),
+                             (self._encode_stage, "stream-encode")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Arrête le pipeline (les étages se terminent à la prochaine image)."""
+        self._stop.set()
+        self._segmenter.shutdown(wait=False, cancel_futures=True)
+
+    def results(self):
+        """Générateur de (jpeg_bytes, obstacles) jusqu'à la fin du flux ou stop()."""
+        try:
+            while True:
+                try:
+                    item = self._encoded.get(timeout=0.5)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        break
+                    continue
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self.stop()
+
+    def stats(self):
+        """FPS soutenu et latence de bout en bout (capture -> JPEG) sur la fenêtre récente."""
+        with self._lock:
+            done_times = list(self._done_times)
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+
+        fps = 0.0
+        if len(done_times) > 1 and done_times[-1] > done_times[0]:
+            fps = (len(done_times) - 1) / (done_times[-1] - done_times[0])
+        stats['fps'] = round(fps, 2)
+        if latencies:
+            stats['latency_ms_mean'] = round(1000 * sum(latencies) / len(latencies), 1)
+            stats['latency_ms_p95'] = round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1)
+        stats['running'] = not self._stop.is_set()
+        stats['error'] = self._error
+        return stats
@@ -0,0 +1,66 @@
+"""
+Point d'entrée de production: un seul processus HTTP multi-threadé et un pool
+fixe de processus d'inférence qui possèdent les modèles (voir inference_pool.py).
+
+Lancement (depuis detection_obstacle/):
+    python wsgi.py                              # waitress si installé, sinon serveur Flask threadé
+    gunicorn -w 1 --threads 8 -b 0.0.0.0:5000 wsgi:app
+
+Garder un seul processus HTTP (-w 1): chaque processus HTTP créerait son propre
+pool et chargerait les modèles autant de fois. La concurrence HTTP vient des threads.
+
+Envoi d'images (POST /api/detect, /api/detect_stream): waitress reçoit tout le
+corps de la requête avant d'appeler l'application (gardé en mémoire jusqu'à
+MAX_UPLOAD_BYTES, voir inbuf_overflow); /api/detect_stream ne renvoie donc ses
+résultats au fil de l'eau qu'avec gunicorn (gthread) ou le serveur Flask.
+
+Variables d'environnement: INFERENCE_WORKERS, JOB_QUEUE_SIZE, JOB_TIMEOUT, HTTP_THREADS.
+"""
+import atexit
+import os
+
+from inference_pool import InferencePool
+from image_decoding import MAX_UPLOAD_BYTES
+
+# Threads HTTP (requêtes d'API et fichiers statiques servis en parallèle)
+HTTP_THREADS = int(os.environ.get("HTTP_THREADS", 8))
+
+
+def _env_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def create_pool():
+    """Démarre le pool d'inférence et le branche sur l'application Flask."""
+    pool = InferencePool(
+        num_workers=_env_int("INFERENCE_WORKERS"),
+        queue_size=_env_int("JOB_QUEUE_SIZE"),
+        job_timeout=_env_int("JOB_TIMEOUT")
+    ).start()
+    configure_inference_pool(pool)
+    atexit.register(pool.shutdown)
+    return pool
+
+
+# Les processus d'inférence (contexte spawn) ré-importent ce script sous le nom __mp_main__
+# quand il est lancé par `python wsgi.py` (multiprocessing.parent_process() vaut encore None
+# à ce moment-là): seul le processus principal, ou le worker gunicorn qui importe "wsgi",
+# construit l'application et démarre le pool
+if __name__ != '__mp_main__':
+    from app import app, configure_inference_pool
+    pool = create_pool()
+
+
+if __name__ == '__main__':
+    print("\n" + "="*50)
+    print("SERVEUR DE PRODUCTION DÉMARRÉ")
+    print("Accédez à l'interface holographique sur: http://127.0.0.1:5000")
+    print("="*50 + "\n")
+    try:
+        from waitress import serve
+        # Corps de requête gardés en mémoire (pas de fichier temporaire) jusqu'à MAX_UPLOAD_BYTES
+        serve(app, host='0.0.0.0', port=5000, threads=HTTP_THREADS, inbuf_overflow=MAX_UPLOAD_BYTES)
+    except ImportError:
+        print("[INFO] waitress non installé: serveur Flask threadé (pip install waitress conseillé).")
+        app.run(host='0.0.0.0', port=5000, threaded=True)